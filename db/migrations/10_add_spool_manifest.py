@@ -0,0 +1,43 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_10():
+    """
+    Adds the `spool` table: the manifest of clips held in the local
+    store-and-forward spool (see src/spool.py).
+
+    One row per fully written clip file. A row is only inserted after the
+    file has been fsync'd and atomically renamed into place, so after a crash
+    every row points at a complete clip; half-written `.part` files and
+    files without a row are reconciled when the spool starts.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 10_add_spool_manifest.py...')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spool (
+                event_id TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                spooled_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+
+        conn.commit()
+        logging.info('Migration 10_add_spool_manifest.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 10: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_10()
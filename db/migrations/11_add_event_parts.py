@@ -0,0 +1,45 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_11():
+    """
+    Adds the `event_parts` table for events uploaded in parts (progressive
+    capture and segmented downloads, see src/progressive.py).
+
+    One row per recording range uploaded to Drive as a separate part. Parts
+    sit on a fixed grid from the event start, so a later upload only fetches
+    the part numbers that have no row yet. Rows can exist before the event
+    itself is inserted on its `end` message.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 11_add_event_parts.py...')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_parts (
+                event_id TEXT NOT NULL,
+                part INTEGER NOT NULL,
+                start_ts REAL NOT NULL,
+                end_ts REAL NOT NULL,
+                uploaded_at REAL NOT NULL,
+                PRIMARY KEY (event_id, part)
+            )
+        ''')
+
+        conn.commit()
+        logging.info('Migration 11_add_event_parts.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 11: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_11()
@@ -0,0 +1,40 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_12():
+    """
+    Adds `snapshot_uploaded` and `snapshot_tries` to the `events` table.
+
+    With UPLOAD_SNAPSHOTS enabled the event's snapshot.jpg is uploaded by the
+    snapshot fast lane (src/snapshot_lane.py) ahead of the clip. Its state is
+    kept apart from `uploaded` / `tries`, which stay about the clip only:
+    snapshot_uploaded is 1 once uploaded and 2 if Frigate has no snapshot.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 12_add_snapshot_state.py...')
+        for column in ('snapshot_uploaded', 'snapshot_tries'):
+            try:
+                cursor.execute(f'ALTER TABLE events ADD COLUMN {column} INTEGER DEFAULT 0')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column {column} already exists in events table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 12_add_snapshot_state.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 12: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_12()
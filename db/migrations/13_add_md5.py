@@ -0,0 +1,40 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_13():
+    """
+    Adds `md5` columns to `events`, `event_parts` and `spool`.
+
+    Clips are hashed while they are downloaded from Frigate; the spool keeps
+    the hash next to the file, and after the upload it is compared with the
+    md5Checksum Drive computed. `events.md5` / `event_parts.md5` hold the
+    verified hash of what is on Drive, so audits need no re-download.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 13_add_md5.py...')
+        for table in ('events', 'event_parts', 'spool'):
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN md5 TEXT')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column md5 already exists in {table} table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 13_add_md5.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 13: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_13()
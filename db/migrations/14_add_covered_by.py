@@ -0,0 +1,44 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_14():
+    """
+    Adds `covered_by` to the `events` table, plus an index on it.
+
+    With COALESCE_EVENTS enabled, overlapping events of one camera are
+    uploaded as a single recording-range clip under the earliest event (the
+    leader, see src/coalescer.py). Every other event of the group points at
+    its leader through covered_by. It is not uploaded on its own and is
+    marked uploaded together with the leader. If the leader is deleted or
+    given up, covered_by is cleared again.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 14_add_covered_by.py...')
+        try:
+            cursor.execute('ALTER TABLE events ADD COLUMN covered_by TEXT')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                logging.warning('Column covered_by already exists in events table. Skipping.')
+            else:
+                raise
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_covered_by ON events (covered_by) WHERE covered_by IS NOT NULL'
+        )
+        conn.commit()
+        logging.info('Migration 14_add_covered_by.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 14: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_14()
@@ -0,0 +1,39 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_15():
+    """
+    Adds `drive_account` columns to `events` and `event_parts`.
+
+    With several Drive accounts configured (DRIVE_ACCOUNTS), uploads are
+    spread across them; the column records which account holds the file
+    (NULL for uploads from before this migration, all on the first account).
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 15_add_drive_account.py...')
+        for table in ('events', 'event_parts'):
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN drive_account TEXT')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column drive_account already exists in {table} table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 15_add_drive_account.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 15: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_15()
@@ -0,0 +1,57 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_16():
+    """
+    Adds the Drive file record of uploads and the `sync_cursors` table.
+
+    `drive_file_id` / `drive_parent_id` on `events` and `event_parts` hold the
+    Drive file an upload created and the folder it was put in. The Drive
+    reconciliation job (src/drive_reconcile.py) follows Drive's changes feed
+    and sets `drive_drift` when such a file was trashed, deleted, moved or
+    modified in Drive ('trashed', 'deleted', 'moved', 'modified'; NULL =
+    as uploaded).
+
+    `sync_cursors` keeps one resumable position per incremental feed, keyed
+    by source (for Drive: the changes page token of each account).
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 16_add_drive_sync.py...')
+        for table in ('events', 'event_parts'):
+            for column in ('drive_file_id', 'drive_parent_id', 'drive_drift'):
+                try:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+                except sqlite3.OperationalError as e:
+                    if 'duplicate column name' in str(e):
+                        logging.warning(f'Column {column} already exists in {table} table. Skipping.')
+                    else:
+                        raise
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table}_drive_file_id ON {table} (drive_file_id) '
+                f'WHERE drive_file_id IS NOT NULL'
+            )
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                source TEXT PRIMARY KEY,
+                page_token TEXT,
+                updated_at REAL
+            )
+        ''')
+        conn.commit()
+        logging.info('Migration 16_add_drive_sync.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 16: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_16()
@@ -0,0 +1,47 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_17():
+    """
+    Adds the event-listing position to `sync_cursors`.
+
+    The periodic Frigate listing (src/event_sync.py) no longer derives its
+    `after` watermark from MAX(events.start_time). It keeps its own cursor:
+    `last_start_time` / `last_event_id` of the last completed sync, and the
+    `resume_*` columns while a sync is under way (the `before` of the next
+    page and the watermark reached so far), checkpointed after every page,
+    so an interrupted sync resumes instead of starting over.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 17_add_event_sync_cursor.py...')
+        columns = (
+            ('last_start_time', 'REAL'), ('last_event_id', 'TEXT'),
+            ('resume_before', 'REAL'), ('resume_start_time', 'REAL'), ('resume_event_id', 'TEXT'),
+            ('resume_hold', 'REAL'),
+        )
+        for column, column_type in columns:
+            try:
+                cursor.execute(f'ALTER TABLE sync_cursors ADD COLUMN {column} {column_type}')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column {column} already exists in sync_cursors table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 17_add_event_sync_cursor.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 17: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_17()
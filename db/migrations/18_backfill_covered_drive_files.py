@@ -0,0 +1,40 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_18():
+    """
+    Copies the Drive file of each coalesced upload onto the events it covers.
+
+    Covered events used to get only `md5` and `drive_account` of the shared
+    file, so the changes-feed reconciliation (src/drive_reconcile.py) could
+    not match them. New coalesced uploads record `drive_file_id` /
+    `drive_parent_id` on every member; this fills them in for older ones.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 18_backfill_covered_drive_files.py...')
+        cursor.execute(
+            'UPDATE events SET '
+            'drive_file_id = (SELECT l.drive_file_id FROM events l WHERE l.event_id = events.covered_by), '
+            'drive_parent_id = (SELECT l.drive_parent_id FROM events l WHERE l.event_id = events.covered_by), '
+            'drive_drift = (SELECT l.drive_drift FROM events l WHERE l.event_id = events.covered_by) '
+            'WHERE covered_by IS NOT NULL AND uploaded = 1 AND drive_file_id IS NULL'
+        )
+        logging.info(f'Recorded the shared Drive file on {cursor.rowcount} covered events.')
+        conn.commit()
+        logging.info('Migration 18_backfill_covered_drive_files.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 18: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_18()
@@ -0,0 +1,49 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_5():
+    """
+    Adds a per-event clip-availability cache to the `events` table:
+
+      - clip_available:  1 = Frigate served the clip, 0 = Frigate reported it
+                         gone (404 / "No recordings found"), NULL = unknown.
+      - clip_checked_at: Unix timestamp of the last observation. Entries older
+                         than CLIP_AVAILABILITY_TTL_SECONDS are re-probed by the
+                         daily health report.
+      - clip_size:       Content-Length reported by Frigate, if any.
+
+    The cache is refreshed both by the health report's prober and as a side
+    effect of normal upload attempts, so the report rarely has to hit Frigate.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 5_add_clip_availability.py...')
+        for column, sql_type in (
+            ('clip_available', 'INTEGER'),
+            ('clip_checked_at', 'REAL'),
+            ('clip_size', 'INTEGER'),
+        ):
+            try:
+                cursor.execute(f'ALTER TABLE events ADD COLUMN {column} {sql_type}')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column {column} already exists in events table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 5_add_clip_availability.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 5: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_5()
@@ -0,0 +1,53 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_6():
+    """
+    Adds a per-event retry schedule to the `events` table.
+
+      - next_attempt_at: Unix timestamp before which the retry loop must not
+        touch the event. Computed after every failed attempt from `tries` and
+        `last_error_kind` (exponential backoff with jitter, see
+        src/retry_policy.py).
+      - idx_pending_due: partial index serving select_not_uploaded_yet()
+            WHERE uploaded = 0 AND retry = 1 AND next_attempt_at <= ?
+
+    Existing rows are backfilled with `created + 5 minutes`, which matches the
+    grace period the old selector applied, so the current backlog is due at once.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 6_add_next_attempt_at.py...')
+        try:
+            cursor.execute('ALTER TABLE events ADD COLUMN next_attempt_at REAL')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                logging.warning('Column next_attempt_at already exists in events table. Skipping.')
+            else:
+                raise
+        cursor.execute(
+            'UPDATE events SET next_attempt_at = CAST(strftime("%s", created) AS REAL) + 300 '
+            'WHERE next_attempt_at IS NULL'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_pending_due '
+            'ON events (next_attempt_at) '
+            'WHERE uploaded = 0 AND retry = 1'
+        )
+        conn.commit()
+        logging.info('Migration 6_add_next_attempt_at.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 6: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_6()
@@ -0,0 +1,39 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_7():
+    """
+    Stores the Frigate camera and label of each event in the `events` table.
+
+    The upload queue scores work by label and camera weight; with these columns
+    the retry dispatcher can score pending events without fetching them from
+    Frigate first. Existing rows stay NULL and are scored with weight 0.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 7_add_event_camera_label.py...')
+        for column in ('camera', 'label'):
+            try:
+                cursor.execute(f'ALTER TABLE events ADD COLUMN {column} TEXT')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' in str(e):
+                    logging.warning(f'Column {column} already exists in events table. Skipping.')
+                else:
+                    raise
+        conn.commit()
+        logging.info('Migration 7_add_event_camera_label.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 7: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_7()
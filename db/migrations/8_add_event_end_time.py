@@ -0,0 +1,39 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_8():
+    """
+    Stores the Frigate end_time of each event in the `events` table.
+
+    Together with `start_time` and the observed `clip_size` this lets the
+    upload queue estimate the transfer cost of pending events (duration x
+    learned bytes per second) without asking Frigate. Existing rows stay NULL
+    and fall back to the HEAD-known size or the default estimate.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 8_add_event_end_time.py...')
+        try:
+            cursor.execute('ALTER TABLE events ADD COLUMN end_time REAL')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                logging.warning('Column end_time already exists in events table. Skipping.')
+            else:
+                raise
+        conn.commit()
+        logging.info('Migration 8_add_event_end_time.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 8: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_8()
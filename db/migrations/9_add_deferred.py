@@ -0,0 +1,39 @@
+import logging
+import sqlite3
+
+from src.database import DB_PATH
+
+
+def apply_migration_9():
+    """
+    Adds the `deferred` flag to the `events` table.
+
+    Set while a large clip waits for the next off-peak upload window (see
+    src/upload_windows.py); its next_attempt_at then points at the window
+    opening. Deferring does not count as an attempt, and get_health_stats()
+    reports these events separately instead of as aging backlog.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        logging.info('Running migration 9_add_deferred.py...')
+        try:
+            cursor.execute('ALTER TABLE events ADD COLUMN deferred INTEGER DEFAULT 0')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                logging.warning('Column deferred already exists in events table. Skipping.')
+            else:
+                raise
+        conn.commit()
+        logging.info('Migration 9_add_deferred.py finished successfully.')
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during migration 9: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+# Run the migration
+apply_migration_9()
@@ -1,14 +1,13 @@
 import json
 import logging
 import os
-import requests
 import sqlite3
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
-import socket
 
 # Erstelle das Log-Verzeichnis, falls es nicht existiert
 os.makedirs('logs', exist_ok=True)
@@ -72,9 +71,22 @@ from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from src import database, google_drive
-from src.frigate_api import fetch_all_events, fetch_event, check_frigate_reachable, EventNotFoundError, ClipNotAvailableError, ClipTooLargeError, FrigateUnreachableError
-from src.google_drive import cleanup_old_files_on_drive, service
+from src import circuit_breaker, connectivity, database, google_drive, rate_limiter, retry_policy, upload_queue, upload_windows
+from src.frigate_api import fetch_events_page, fetch_event, check_frigate_reachable, check_clip_available, frigate_circuit, frigate_clip_limiter, EventNotFoundError, ClipNotAvailableError, ClipTooLargeError, FrigateUnreachableError
+from src.dispatcher import Dispatcher
+from src.upload_queue import SOURCE_LISTING, SOURCE_MQTT, SOURCE_RETRY, WorkItem, work_queue
+from src.coalescer import coalescer
+from src.drive_accounts import accounts_from_env
+from src.drive_credentials import credential_manager
+from src.drive_governor import drive_governor
+from src.drive_reconcile import drive_reconciler
+from src.env import int_from_env, parse_bool_env
+from src.event_sync import event_sync
+from src.faststart import faststart
+from src.progressive import progressive_capture
+from src.snapshot_lane import snapshot_lane
+from src.spool import SpoolPrefetcher, spool
+from src.google_drive import cleanup_old_files_on_all_accounts, drive_accounts, start_drive_init
 from src.healthcheck import HealthState, start_healthcheck_server
 from src.mattermost_handler import MattermostHandler, send_mattermost_notification
 
@@ -98,6 +110,16 @@ HEALTH_REPORT_TIME = os.getenv('HEALTH_REPORT_TIME', '09:00')
 HEALTHCHECK_BIND = os.getenv('HEALTHCHECK_BIND', '0.0.0.0')
 HEALTHCHECK_PORT_RAW = os.getenv('HEALTHCHECK_PORT', '8080')
 HEALTHCHECK_TOKEN = os.getenv('HEALTHCHECK_TOKEN', '').strip()
+# Clip-availability cache used by the daily health report. Observations older
+# than the TTL are re-probed with at most CLIP_PROBE_CONCURRENCY parallel HEADs.
+CLIP_AVAILABILITY_TTL_SECONDS = int_from_env('CLIP_AVAILABILITY_TTL_SECONDS', 21600)
+CLIP_PROBE_CONCURRENCY = int_from_env('CLIP_PROBE_CONCURRENCY', 4, minimum=1)
+# How often the dispatcher lists new events on Frigate (catch-up for missed
+# MQTT messages). Retries are dispatched as soon as they are due, independently.
+FRIGATE_POLL_INTERVAL_SECONDS = int_from_env('FRIGATE_POLL_INTERVAL_SECONDS', 600)
+# Threads draining the priority upload queue. Drive uploads are serialised per
+# Drive account anyway; more workers only overlap Frigate fetches with uploads.
+UPLOAD_WORKERS = int_from_env('UPLOAD_WORKERS', 1, minimum=1)
 
 
 def _parse_healthcheck_port(value, default=8080):
@@ -174,10 +196,9 @@ def validate_config():
         if not value or not str(value).strip():
             errors.append(f"CONFIG ERROR: {name} is not set or empty.")
 
-    # --- Google Drive variables (read directly via os.getenv because
-    #     google_drive.py initialises the service on module import, so we
-    #     cannot rely on its module-level attributes being reachable before
-    #     a potential import crash.)
+    # --- Google Drive variables (read directly via os.getenv: the Drive
+    #     clients are only built later, in the background, by
+    #     start_drive_init(), so nothing has looked at the files yet.)
     _service_file = os.getenv('SERVICE_ACCOUNT_FILE', '').strip()
     if not _service_file:
         errors.append("CONFIG ERROR: SERVICE_ACCOUNT_FILE is not set.")
@@ -186,6 +207,12 @@ def validate_config():
             f"CONFIG ERROR: SERVICE_ACCOUNT_FILE does not exist: {_service_file}"
         )
 
+    for _account in accounts_from_env(_service_file, None):
+        if _account.service_account_file != _service_file and not os.path.isfile(_account.service_account_file or ''):
+            errors.append(
+                f"CONFIG ERROR: DRIVE_ACCOUNTS file does not exist: {_account.service_account_file}"
+            )
+
     _upload_dir = os.getenv('UPLOAD_DIR', '').strip()
     if not _upload_dir:
         errors.append("CONFIG ERROR: UPLOAD_DIR is not set.")
@@ -232,33 +259,63 @@ def validate_config():
     _max_clip = os.getenv('MAX_CLIP_SIZE', '').strip()
     logging.info(f"  MAX_CLIP_SIZE={_max_clip or '(unlimited)'}")
     logging.info(f"  MAX_RETRY_ATTEMPTS={MAX_RETRY_ATTEMPTS}")
+    logging.info(f"  RETRY_BACKOFF_MAX_SECONDS={retry_policy.RETRY_BACKOFF_MAX_SECONDS}")
+    logging.info(f"  FRIGATE_POLL_INTERVAL_SECONDS={FRIGATE_POLL_INTERVAL_SECONDS}")
+    logging.info(f"  UPLOAD_WORKERS={UPLOAD_WORKERS}")
+    logging.info(
+        f"  FRIGATE_CLIP_CONCURRENCY: initial={frigate_clip_limiter.limit}, "
+        f"max={int(frigate_clip_limiter.max_limit)}, TTFB target={frigate_clip_limiter.ttfb_target}s"
+    )
+    logging.info(f"  FRIGATE_DOWNLOAD_RATE_LIMIT={rate_limiter.frigate_download_bucket.rate:.0f} B/s (0 = unlimited)")
+    logging.info(f"  DRIVE_UPLOAD_RATE_LIMIT={rate_limiter.drive_upload_bucket.rate:.0f} B/s (0 = unlimited)")
+    logging.info(f"  UPLOAD_PRIORITY_WEIGHTS={work_queue.weights.as_dict()}")
+    logging.info(f"  FRIGATE_RETENTION_DAYS={upload_queue.FRIGATE_RETENTION_DAYS}")
+    logging.info(f"  UPLOAD_DEADLINE_WINDOW_HOURS={upload_queue.UPLOAD_DEADLINE_WINDOW_HOURS}")
     logging.info(f"  SKIP_EVENTS_LONGER_THAN_SECONDS={SKIP_EVENTS_LONGER_THAN_SECONDS}")
+    logging.info(f"  UPLOAD_WINDOWS={upload_windows.policy.describe()}")
+    logging.info(f"  DEFER_CLIPS_LARGER_THAN={upload_windows.policy.min_bytes or '(off)'}")
+    logging.info(f"  DEFER_EVENTS_LONGER_THAN_SECONDS={upload_windows.policy.min_seconds or '(off)'}")
+    logging.info(f"  PROGRESSIVE_CAPTURE_SEGMENT_SECONDS={progressive_capture.segment_seconds or '(off)'}")
+    logging.info(f"  PROGRESSIVE_CAPTURE_PADDING_SECONDS={progressive_capture.padding_seconds}")
+    logging.info(
+        f"  SEGMENTED_DOWNLOAD_THRESHOLD_SECONDS={progressive_capture.split_threshold or '(off)'} "
+        f"(parts of {progressive_capture.part_seconds}s, {progressive_capture.split_concurrency} at a time)"
+    )
+    logging.info(f"  UPLOAD_SNAPSHOTS={snapshot_lane.enabled}")
+    logging.info(f"  FASTSTART_REMUX={faststart.mode}")
+    logging.info(
+        f"  COALESCE_EVENTS={coalescer.enabled} (gap {coalescer.gap_seconds:g}s, "
+        f"max span {coalescer.max_span_seconds:g}s)"
+    )
+    logging.info(
+        f"  DRIVE_ACCOUNTS={len(drive_accounts.accounts)} account(s), "
+        f"DRIVE_ACCOUNT_STRATEGY={drive_accounts.strategy}"
+    )
+    logging.info(f"  DRIVE_ACCOUNT_DAILY_QUOTA={drive_accounts.daily_quota_bytes or '(off)'}")
+    logging.info(
+        f"  DRIVE_TOKEN_REFRESH_MARGIN_SECONDS={credential_manager.refresh_margin_seconds:g}"
+        f"{'' if credential_manager.refresh_margin_seconds else ' (refresh on demand)'}"
+    )
+    logging.info(f"  EVENT_SYNC_OVERLAP_SECONDS={event_sync.overlap_seconds:g}")
+    logging.info(f"  DRIVE_RECONCILE_INTERVAL_MINUTES={drive_reconciler.interval_minutes:g} (0 = off)")
+    logging.info(
+        f"  DRIVE_API_QUERIES_PER_MINUTE={drive_governor.queries.rate * 60:.0f}, "
+        f"DRIVE_API_WRITES_PER_SECOND={drive_governor.writes.rate:g} (0 = unlimited)"
+    )
+    logging.info(f"  SPOOL_DIR={spool.directory}")
+    logging.info(f"  SPOOL_MAX_SIZE={spool.max_bytes} bytes{'' if spool.enabled else ' (spool disabled)'}")
     logging.info(f"  DB_RETENTION_DAYS={os.getenv('DB_RETENTION_DAYS', '30')}")
     logging.info(f"  GDRIVE_RETENTION_DAYS={os.getenv('GDRIVE_RETENTION_DAYS', '0')}")
     logging.info(f"  HEALTH_REPORT_TIME={HEALTH_REPORT_TIME}")
     logging.info(f"  HEALTH_REPORT_ONLY_ON_ISSUES={HEALTH_REPORT_ONLY_ON_ISSUES}")
+    logging.info(f"  CLIP_AVAILABILITY_TTL_SECONDS={CLIP_AVAILABILITY_TTL_SECONDS}")
+    logging.info(f"  CLIP_PROBE_CONCURRENCY={CLIP_PROBE_CONCURRENCY}")
     logging.info(f"  HEALTHCHECK_BIND={HEALTHCHECK_BIND}")
     logging.info(f"  HEALTHCHECK_PORT={HEALTHCHECK_PORT}")
     logging.info(f"  HEALTHCHECK_TOKEN={'***' if HEALTHCHECK_TOKEN else '(none)'}")
     logging.info(f"  MATTERMOST_WEBHOOK_URL={'***' if MATTERMOST_WEBHOOK_URL else '(none)'}")
 
 
-def parse_bool_env(value, default=False):
-    """
-    Parses a boolean env var. Accepts the usual suspects (case-insensitive):
-      true/false, yes/no, on/off, 1/0, y/n, t/f.
-    Returns `default` for None or unrecognised values.
-    """
-    if value is None:
-        return default
-    v = value.strip().lower()
-    if v in ('1', 'true', 'yes', 'on', 'y', 't'):
-        return True
-    if v in ('0', 'false', 'no', 'off', 'n', 'f', ''):
-        return False
-    return default
-
-
 # When True, suppress the Mattermost message of an OK Daily Health Report
 # (WARNING / CRITICAL reports are always sent). Default: False (send always).
 HEALTH_REPORT_ONLY_ON_ISSUES = parse_bool_env(os.getenv('HEALTH_REPORT_ONLY_ON_ISSUES'), default=False)
@@ -311,9 +368,18 @@ def on_message(client, userdata, msg):
     end_time = event.get('after', {}).get('end_time', None)
     has_clip = event.get('after', {}).get('has_clip', False)
 
+    if event_type == 'end':
+        progressive_capture.finish(event.get('after', {}).get('id'))
     if event_type == 'end' and end_time is not None and has_clip is True:
         event_data = event['after']
-        handle_single_event(event_data)
+        # The snapshot goes first, through its own lane.
+        snapshot_lane.put(event_data)
+        # Never upload on the MQTT network thread: hand the event to the
+        # priority queue so keepalives keep flowing during long uploads.
+        enqueue_event(event_data, SOURCE_MQTT)
+    elif event_type in ('new', 'update') and end_time is None and has_clip is True and progressive_capture.enabled:
+        # Long event still in progress: upload finished segments as parts.
+        progressive_capture.observe(event['after'])
     else:
         logging.debug(f"Received a MQTT message but event type, end_time or has_clip doesn't interest us. Wait for "
                       f"the full message. Skipping...")
@@ -338,21 +404,37 @@ def get_max_retries_for_event(event_data):
     end_time = event_data.get('end_time') or 0
     start_time = event_data.get('start_time') or 0
     duration_sec = end_time - start_time
+    # Segmented downloads keep every uploaded part, so each retry makes
+    # progress instead of starting the whole clip over.
+    if progressive_capture.uses_parts(event_data['id'], duration_sec):
+        return MAX_RETRY_ATTEMPTS
     if duration_sec > 3 * 3600:       # > 3 hours
-        return 3   # 3 retries × 10 min = 30 min total wait
+        return 3
     elif duration_sec > 1 * 3600:     # > 1 hour
-        return 10  # 10 retries × 10 min = 100 min total wait
+        return 10
     return MAX_RETRY_ATTEMPTS
 
 
+def record_event(event_data):
+    """Insert an event into the database unless it is known already."""
+    if database.is_event_exists(event_data['id']):
+        return
+    database.insert_event(
+        event_data['id'], event_data['start_time'],
+        camera=event_data.get('camera'), label=event_data.get('label'), end_time=event_data.get('end_time'),
+    )
+    # Let the dispatcher account for the new event's retry deadline.
+    dispatcher.wake("new_event")
+
+
 def handle_single_event(event_data, skip_wait=False, online=None):
     """
     Handles a single event. Uploads the video to Google Drive if available and updates the database.
     :param event_data:
     :param skip_wait: If True, skip the 5-second wait (useful for retrying old events).
-    :param online: Tri-state. If True/False, skip the per-event internet() check and use
-        the provided value (callers in batch jobs should pre-check once). If None, fall
-        back to calling internet() inline (used by the MQTT single-event path).
+    :param online: Tri-state. If True/False, use the provided value (callers in batch
+        jobs check once at job start). If None, read the connectivity monitor's cached
+        flag via internet() (used by the MQTT single-event path; never blocks).
     :return: bool. False if an upload was attempted in this call and failed for
         potentially-network reasons (caller may want to re-check connectivity).
         True otherwise (skipped, succeeded, hard-fail like ClipNotAvailable, etc.).
@@ -366,8 +448,11 @@ def handle_single_event(event_data, skip_wait=False, online=None):
     event_max_retries = get_max_retries_for_event(event_data)
     duration_sec = int((end_time or 0) - start_time)
 
-    if not database.is_event_exists(event_id):
-        database.insert_event(event_id, start_time)
+    record_event(event_data)
+    # Catches events that did not come through on_message (listing, retries).
+    # No-op unless UPLOAD_SNAPSHOTS is on, and for snapshots the lane has
+    # queued or finished already; skipped if the snapshot is already on Drive.
+    snapshot_lane.put(event_data)
 
     # Duration filter: skip events that exceed SKIP_EVENTS_LONGER_THAN_SECONDS.
     # Checked here so it applies on both the MQTT path and the retry-loop path,
@@ -394,14 +479,26 @@ def handle_single_event(event_data, skip_wait=False, online=None):
             )
         return True
 
+    if end_time is None:
+        # Still running: its 'end' message or the listing queues it again.
+        # Until then it must not be due on every dispatcher pass.
+        database.update_next_attempt_at(event_id, time.time() + retry_policy.IN_PROGRESS_RECHECK_SECONDS)
+        return True
+
     if online is None:
         online = internet()
+    if not online:
+        # Store-and-forward: pull the clip into the spool while offline.
+        spool_prefetcher.wake()
+        postpone_for_outage(event_id)
 
     if end_time is not None and has_clip is True and online is True:
         if database.select_retry(event_id) == 0:
             logging.debug(f"Event {event_id} is marked as non-retriable. Skipping upload.")
         else:
             uploaded_status = database.select_event_uploaded(event_id)
+            if (uploaded_status == 0 or uploaded_status is None) and _defer_to_upload_window(event_data, recorded_at):
+                return True
             if uploaded_status == 0 or uploaded_status is None:
                 # Wait a few seconds to give Frigate time to finish writing the file to disk
                 if not skip_wait:
@@ -416,6 +513,7 @@ def handle_single_event(event_data, skip_wait=False, online=None):
                         f"Removing from database. Reason: {e}"
                     )
                     database.delete_event(event_id)
+                    spool.discard(event_id)
                     return True
                 except ClipTooLargeError as e:
                     logging.warning(
@@ -423,13 +521,24 @@ def handle_single_event(event_data, skip_wait=False, online=None):
                         f"Reason: {e} Marking as non-retriable."
                     )
                     database.update_event_retry(event_id, 0, last_error_kind=google_drive.ERR_CLIP_TOO_LARGE)
+                    spool.discard(event_id)
                     return True
                 if success:
                     logging.info(f"Video {event_id} (recorded {recorded_at}) successfully uploaded.")
                     database.update_event(event_id, 1)
+                    spool.discard(event_id)
                 else:
                     database.update_event(event_id, 0, last_error_kind=error_kind)
+                    # Let the connectivity monitor confirm its state right away
+                    # instead of at its next regular probe.
+                    connectivity.monitor.request_probe()
                     tries = database.select_tries(event_id)
+                    # Per-event backoff: the retry loop only selects events whose
+                    # next_attempt_at has passed.
+                    database.update_next_attempt_at(
+                        event_id, retry_policy.compute_next_attempt_at(tries, error_kind)
+                    )
+                    dispatcher.wake("rescheduled")
                     msg = (
                         f"Failed to upload video {event_id} (recorded {recorded_at}). "
                         f"Attempt {tries}/{event_max_retries}."
@@ -501,6 +610,37 @@ def handle_single_event(event_data, skip_wait=False, online=None):
     return True
 
 
+def _defer_to_upload_window(event_data, recorded_at):
+    """
+    Apply the off-peak upload-window policy. Returns True if the event was
+    deferred: it is flagged in the DB and its next attempt moved to the next
+    window opening, without counting an attempt. Small clips, and large clips
+    while a window is open, return False and are uploaded right away.
+    """
+    policy = upload_windows.policy
+    if not policy.enabled:
+        return False
+    event_id = event_data['id']
+    if database.select_event_part_numbers(event_id):
+        # Partly uploaded in parts already (progressive capture / segments).
+        return False
+    start_time, end_time = event_data.get('start_time'), event_data.get('end_time')
+    duration = (end_time - start_time) if end_time and start_time else None
+    size = database.select_clip_size(event_id) or work_queue.estimate_clip_bytes(event_data.get('camera'), duration)
+    if not policy.applies_to(duration, size):
+        return False
+    if policy.is_open():
+        database.update_event_deferred(event_id, False)
+        return False
+    opens_at = policy.next_open()
+    database.update_event_deferred(event_id, True, next_attempt_at=opens_at.timestamp())
+    logging.info(
+        f"Deferring event {event_id} (recorded {recorded_at}, ~{size / (1024 * 1024):.0f} MB) "
+        f"to the upload window opening at {opens_at.strftime('%Y-%m-%d %H:%M')}."
+    )
+    return True
+
+
 # --- Edge-triggered Frigate-reachability notifications -----------------------
 # Module-level state to avoid spamming Mattermost while Frigate stays down.
 # A notification is sent ONCE when Frigate transitions reachable -> unreachable
@@ -563,53 +703,116 @@ def _notify_frigate_recovered_once():
     )
 
 
+def _on_frigate_circuit_change(old_state, new_state):
+    """
+    Circuit-breaker listener: drives the edge-triggered Mattermost messages.
+    Opening the circuit is the outage signal, closing it is the recovery
+    signal; half-open trials are not reported.
+    """
+    if new_state == circuit_breaker.STATE_OPEN:
+        _notify_frigate_unreachable_once()
+    elif new_state == circuit_breaker.STATE_CLOSED:
+        _notify_frigate_recovered_once()
+        release_outage_postponed()
+        dispatcher.wake("frigate_recovered")
+
+
+frigate_circuit.add_listener(_on_frigate_circuit_change)
+
+
 def handle_all_events():
     logging.info("=== handle_all_events started ===")
 
-    # One internet check at job start instead of one per event. Uploads will fail
-    # naturally if connectivity drops mid-loop; we re-check after each failure below.
-    online = internet()
-    if not online:
-        logging.warning("No internet connectivity at handle_all_events start. Skipping job.")
-        logging.info("=== handle_all_events completed (skipped, offline) ===")
-        return
+    # No internet check: listing only needs Frigate. While offline the
+    # workers just record the new events and the spool prefetcher pulls
+    # their clips; uploads follow once connectivity returns.
 
-    # One Frigate reachability check at job start. fetch_all_events would
-    # eventually return None on its own, but only after several long retries.
-    # Skipping early keeps logs clean and the job slot free.
-    if not check_frigate_reachable(FRIGATE_URL):
-        logging.warning("Frigate not reachable at handle_all_events start. Skipping job.")
-        _notify_frigate_unreachable_once()
+    # Consult the Frigate circuit breaker (no network I/O). fetch_events_page
+    # would eventually return None on its own, but only after several long
+    # retries. Skipping early keeps logs clean and the job slot free.
+    if not frigate_circuit.allow_request():
+        logging.warning("Frigate circuit is open at handle_all_events start. Skipping job.")
         logging.info("=== handle_all_events completed (skipped, Frigate unreachable) ===")
         return
-    # Frigate is reachable; if we previously notified about an outage, send recovery.
-    _notify_frigate_recovered_once()
 
-    latest_start_time = database.get_latest_event_start_time()
-    logging.debug(f"Fetching all events from Frigate since {latest_start_time}...")
-    all_events = fetch_all_events(FRIGATE_URL, after=latest_start_time, batch_size=100)
+    new_events = event_sync.run(
+        lambda after, before, limit: fetch_events_page(FRIGATE_URL, after=after, before=before, limit=limit),
+        enqueue_listing_page,
+    )
 
-    if all_events is None:
+    if new_events is None:
         # This indicates a connection error after retries
         logging.error("Failed to fetch events from Frigate after multiple retries.")
-    elif not all_events:
+    elif not new_events:
         # This is the normal case where there are no new events
         logging.info("No new events to process from Frigate API.")
     else:
-        # Process the fetched events
-        logging.info(f"Received {len(all_events)} new events from Frigate API.")
-        i = 1
-        for event in all_events:
-            logging.debug(f"Handling event #{i}: {event['id']} in handle_all_events")
-            ok = handle_single_event(event, online=True)
-            if ok is False and not internet():
-                logging.warning(
-                    f"Lost internet connectivity after event {event.get('id')}. "
-                    f"Aborting handle_all_events loop after {i} of {len(all_events)} events."
-                )
-                break
-            i = i + 1
-        logging.info(f"=== handle_all_events completed. Processed {i - 1} new events. ===")
+        logging.info(f"=== handle_all_events completed. {new_events} new events. ===")
+
+
+def enqueue_listing_page(events):
+    """
+    One page of the periodic listing (see src/event_sync.py): drop the events
+    the database knows already, with one bulk lookup, record the rest and
+    hand them to the priority queue; the upload workers decide the order
+    together with MQTT events and due retries. Events are recorded before the
+    page is checkpointed, so after a crash the retry dispatcher has them.
+    Known events that were in progress when recorded and have ended since
+    get their end_time recorded and are queued again, once. Returns the
+    number of new events.
+    """
+    known = database.select_event_end_times(event['id'] for event in events)
+    ended = {
+        event['id']: event['end_time'] for event in events
+        if event['id'] in known and known[event['id']] is None and event.get('end_time') is not None
+    }
+    new = [event for event in events if event['id'] not in known or event['id'] in ended]
+    if not new:
+        return 0
+    if ended:
+        # Before queuing: the next listing must see them as ended, not again as new.
+        database.update_event_end_times(ended.items())
+    logging.info(f"Received {len(new)} new events from Frigate API.")
+    work_queue.update_bitrates(database.get_learned_bitrates())
+    to_queue = coalesce_new_events(new) if coalescer.enabled else new
+    for event in to_queue:
+        if event['id'] not in known:
+            database.insert_event(
+                event['id'], event['start_time'],
+                camera=event.get('camera'), label=event.get('label'), end_time=event.get('end_time'),
+            )
+    dispatcher.wake("new_event")
+    queued = sum(1 for event in to_queue if enqueue_event(event, SOURCE_LISTING))
+    logging.info(f"Queued {queued} of {len(new)} new events.")
+    return len(new)
+
+
+def coalesce_new_events(events):
+    """
+    COALESCE_EVENTS: group the new, finished events of a listing that overlap
+    on the same camera (see src/coalescer.py). Each group is recorded with its
+    members covered by the leader; returns the events to enqueue, i.e.
+    everything but the covered members.
+    """
+    known = database.select_existing_event_ids(event['id'] for event in events)
+    candidates = [
+        event for event in events
+        if event['id'] not in known and event.get('end_time') is not None and not work_queue.contains(event['id'])
+    ]
+    covered = set()
+    for group in coalescer.group(candidates):
+        if len(group) < 2:
+            continue
+        leader, members = group[0], group[1:]
+        for event in group:
+            record_event(event)
+        database.update_events_covered_by([member['id'] for member in members], leader['id'])
+        covered.update(member['id'] for member in members)
+        logging.info(
+            f"Coalescing {len(members)} overlapping events on camera {leader.get('camera')} "
+            f"into the upload of event {leader['id']}."
+        )
+    return [event for event in events if event['id'] not in covered]
 
 
 # MQTT Reconnect settings
@@ -675,82 +878,223 @@ def mqtt_handler():
 def handle_not_uploaded_events():
     logging.info("=== handle_not_uploaded_events started ===")
 
-    # One internet check at job start. Saves up to (event_count × 3s) timeouts
-    # in case of a full outage. The loop re-checks on individual failures below
-    # to handle the rare race where connectivity drops mid-job.
+    # Cached connectivity flag at job start (no network I/O). The upload
+    # workers re-read it per item to handle connectivity dropping mid-drain.
     if not internet():
         logging.warning("No internet connectivity at handle_not_uploaded_events start. Skipping retry loop.")
         logging.info("=== handle_not_uploaded_events completed (skipped, offline) ===")
         return
 
-    # One Frigate reachability check at job start. Fails fast (10s) if the
-    # Frigate host is down (LXC restart, network outage, ...). The per-event
-    # check inside the loop still protects against transient busy moments.
-    if not check_frigate_reachable(FRIGATE_URL):
-        logging.warning("Frigate not reachable at handle_not_uploaded_events start. Skipping retry loop.")
-        _notify_frigate_unreachable_once()
+    # Consult the Frigate circuit breaker instead of pinging /api/version.
+    # The breaker is fed by every real Frigate call and by its background
+    # prober, so this costs no network I/O.
+    if not frigate_circuit.allow_request():
+        logging.warning("Frigate circuit is open at handle_not_uploaded_events start. Skipping retry loop.")
         logging.info("=== handle_not_uploaded_events completed (skipped, Frigate unreachable) ===")
         return
-    # Frigate is reachable; if we previously notified about an outage, send recovery.
-    _notify_frigate_recovered_once()
 
-    event_ids = database.select_not_uploaded_yet()
-    if not event_ids:
+    pending = database.select_not_uploaded_yet()
+    if not pending:
         logging.info("No pending events to retry.")
         logging.info("=== handle_not_uploaded_events completed ===")
         return
 
-    logging.info(f"Found {len(event_ids)} pending events to retry (oldest first).")
-    consecutive_timeouts = 0
-    processed = 0
-    for event_id in event_ids:
-        # Check reachability before every individual event so one slow/busy
-        # moment on Frigate does not abort the entire retry queue.
-        if not check_frigate_reachable(FRIGATE_URL):
-            consecutive_timeouts += 1
-            if consecutive_timeouts >= 3:
-                logging.warning("Frigate unreachable for 3 consecutive events. Aborting retry loop.")
-                break
-            logging.debug(f"Frigate not reachable for event {event_id}, skipping...")
-            continue
-        consecutive_timeouts = 0
+    # Only enqueue here; the upload workers fetch each event from Frigate right
+    # before processing it, in priority order. Events already queued or in
+    # flight are not added twice.
+    work_queue.update_bitrates(database.get_learned_bitrates())
+    queued = 0
+    for event_id, start_time, end_time, tries, camera, label, clip_size in pending:
+        item = WorkItem(
+            event_id=event_id,
+            source=SOURCE_RETRY,
+            camera=camera,
+            label=label,
+            start_time=start_time,
+            end_time=end_time,
+            size_bytes=clip_size,
+            tries=tries or 0,
+        )
+        if work_queue.put(item):
+            queued += 1
+    logging.info(
+        f"=== handle_not_uploaded_events completed. Queued {queued} of {len(pending)} "
+        f"due events (earliest due first). ==="
+    )
+
+
+def enqueue_event(event_data, source):
+    """Put a full Frigate event dict on the priority upload queue."""
+    item = WorkItem(
+        event_id=event_data['id'],
+        source=source,
+        event_data=event_data,
+        camera=event_data.get('camera'),
+        label=event_data.get('label'),
+        start_time=event_data.get('start_time'),
+        end_time=event_data.get('end_time'),
+    )
+    return work_queue.put(item)
+
+
+# Pending events a worker skipped during an outage (offline or Frigate circuit
+# open). They are postponed so the dispatcher does not queue them again on
+# every pass, and are due again as soon as the outage ends.
+_outage_postponed = set()
+_outage_postponed_lock = threading.Lock()
 
-        logging.info(f"Retrying event {event_id}...")
+
+def postpone_for_outage(event_id):
+    database.update_next_attempt_at(event_id, time.time() + retry_policy.OUTAGE_RECHECK_SECONDS)
+    with _outage_postponed_lock:
+        _outage_postponed.add(event_id)
+
+
+def release_outage_postponed():
+    """Make the events skipped during an outage due now (recovery listeners)."""
+    with _outage_postponed_lock:
+        event_ids = list(_outage_postponed)
+        _outage_postponed.clear()
+    if event_ids:
+        database.update_next_attempt_at_many(event_ids, time.time())
+
+
+def process_work_item(item):
+    """
+    Upload-worker entry point for one queue item. Retry items are fetched from
+    Frigate first; the connectivity flag and the Frigate circuit are consulted
+    before that so a dead link does not burn through the queue. Skipped items
+    stay due in the DB and are re-queued by the dispatcher after recovery.
+    Retry items of ended events whose clip is already spooled need neither
+    Frigate nor the event lookup: the DB row has everything the upload needs.
+    """
+    event_data = item.event_data
+    if event_data is None and item.camera and item.end_time is not None and spool.contains(item.event_id):
+        if not internet():
+            logging.debug(f"Skipping retry of spooled event {item.event_id}: offline.")
+            postpone_for_outage(item.event_id)
+            return
+        logging.info(f"Retrying event {item.event_id} from the spool...")
+        event_data = {
+            'id': item.event_id,
+            'camera': item.camera,
+            'label': item.label,
+            'start_time': item.start_time,
+            'end_time': item.end_time,
+            'has_clip': True,
+        }
+    if event_data is None:
+        if not internet() or not frigate_circuit.allow_request():
+            logging.debug(f"Skipping retry of event {item.event_id}: offline or Frigate circuit open.")
+            postpone_for_outage(item.event_id)
+            return
+        logging.info(f"Retrying event {item.event_id}...")
         try:
-            event_data = fetch_event(FRIGATE_URL, event_id)
-            ok = handle_single_event(event_data, skip_wait=True, online=True)
+            event_data = fetch_event(FRIGATE_URL, item.event_id)
         except EventNotFoundError:
-            logging.warning(f"Event {event_id} no longer exists on Frigate. Removing from database.")
-            database.delete_event(event_id)
-            processed += 1
-            continue
+            logging.warning(f"Event {item.event_id} no longer exists on Frigate. Removing from database.")
+            database.delete_event(item.event_id)
+            return
         except FrigateUnreachableError:
-            logging.warning(f"Frigate became unreachable during retry for event {event_id}. Skipping to next.")
+            logging.warning(f"Frigate became unreachable during retry for event {item.event_id}. Skipping.")
+            postpone_for_outage(item.event_id)
+            return
+        if item.end_time is None and event_data.get('end_time') is not None:
+            database.update_event_end_times([(item.event_id, event_data['end_time'])])
+    handle_single_event(event_data, skip_wait=item.source != SOURCE_MQTT)
+
+
+def run_housekeeping():
+    logging.info("=== Housekeeping job started ===")
+    database.cleanup_old_events()
+    # Clips of events that were given up on or aged out are not needed anymore.
+    spool.prune(database.select_not_uploaded_yet_retryable())
+    logging.info("=== Housekeeping job completed ===")
+
+
+def _spool_candidates():
+    """Pending events to prefetch, with their expected clip size in bytes."""
+    for event_id, camera, start_time, end_time, clip_size in database.select_spool_candidates():
+        # An upload worker is already fetching this one.
+        if work_queue.is_in_flight(event_id):
             continue
+        duration = end_time - start_time if start_time is not None and end_time is not None else None
+        yield event_id, clip_size or work_queue.estimate_clip_bytes(camera, duration)
 
-        processed += 1
 
-        # Race-condition safety net: an upload failed in this iteration. Verify
-        # internet is still up; if not, abort instead of burning through the
-        # entire backlog with guaranteed-failing uploads.
-        if ok is False and not internet():
-            logging.warning(
-                f"Lost internet connectivity after event {event_id}. "
-                f"Aborting retry loop after {processed} of {len(event_ids)} events."
-            )
-            break
-    logging.info(f"=== handle_not_uploaded_events completed. Retried {processed} of {len(event_ids)} events. ===")
+def prefetch_event(event_id):
+    """Spool fetch stage for one pending event. Failures are not counted as attempts."""
+    try:
+        google_drive.prefetch_clip(event_id, FRIGATE_URL)
+    except ClipNotAvailableError as e:
+        logging.warning(f"Clip for event {event_id} no longer available on Frigate. Removing from database. Reason: {e}")
+        database.delete_event(event_id)
+    except ClipTooLargeError as e:
+        logging.warning(f"Not spooling clip for event {event_id}. Reason: {e} Marking as non-retriable.")
+        database.update_event_retry(event_id, 0, last_error_kind=google_drive.ERR_CLIP_TOO_LARGE)
+
+
+# Fetch stage of the store-and-forward pipeline: keeps pulling pending clips
+# into the spool whenever Frigate is reachable, regardless of connectivity.
+spool_prefetcher = SpoolPrefetcher(
+    spool,
+    candidates=_spool_candidates,
+    fetch=prefetch_event,
+    can_run=frigate_circuit.allow_request,
+)
 
 
-def run_every_x_minutes():
-    logging.info("=== Periodic job started ===")
-    logging.info("Step 1/3: Cleaning up old events from database...")
-    database.cleanup_old_events()
-    logging.info("Step 2/3: Retrying old pending events (oldest first)...")
-    handle_not_uploaded_events()
-    logging.info("Step 3/3: Fetching and processing new events from Frigate API...")
-    handle_all_events()
-    logging.info("=== Periodic job completed ===")
+def upload_event_snapshot(event_data):
+    """
+    Snapshot fast lane: upload the event's snapshot unless it (or the clip)
+    is on Drive already or it failed too often. True on success, False to
+    retry, None if there is nothing to upload.
+    """
+    event_id = event_data['id']
+    record_event(event_data)
+    state = database.select_snapshot_state(event_id)
+    if state and (state[0] == 1 or state[1] or state[2] >= 2 * snapshot_lane.max_attempts):
+        return None
+    success, error_kind = google_drive.upload_snapshot(event_data, FRIGATE_URL)
+    if success is None:
+        logging.debug(f"Frigate has no snapshot for event {event_id}.")
+        database.update_snapshot_state(event_id, 2)
+        return None
+    database.update_snapshot_state(event_id, 1 if success else 0)
+    if not success:
+        logging.warning(f"Snapshot upload of event {event_id} failed ({error_kind}).")
+    return success
+
+
+def upload_progressive_part(event, part, start_ts, end_ts):
+    """Progressive capture: upload one finished segment of a running event."""
+    try:
+        success, _ = google_drive.upload_recording_part(event, part, start_ts, end_ts, FRIGATE_URL)
+        return success
+    except (ClipNotAvailableError, ClipTooLargeError) as e:
+        logging.warning(f"Could not capture part {part} of event {event['id']}: {e}")
+        return False
+
+
+def _can_dispatch():
+    """
+    Cheap gate for the dispatcher: the Frigate circuit. The listing runs while
+    offline too (see handle_all_events); the retry pass checks connectivity
+    itself and leaves due events for the post-recovery wake-up.
+    """
+    return frigate_circuit.allow_request()
+
+
+# Long-running dispatcher replacing the fixed 10-minute interval job. Retries
+# are dispatched as soon as their next_attempt_at passes, new events are listed
+# every FRIGATE_POLL_INTERVAL_SECONDS, and recovery signals wake it up at once.
+dispatcher = Dispatcher(
+    retry_pending=handle_not_uploaded_events,
+    fetch_new=handle_all_events,
+    next_due_at=database.get_next_attempt_at,
+    can_dispatch=_can_dispatch,
+    listing_interval=FRIGATE_POLL_INTERVAL_SECONDS,
+)
 
 
 def _get_uptime():
@@ -798,7 +1142,7 @@ def _get_db_size():
 def _get_subsystem_status(scheduler):
     """
     Return subsystem status dict for health report.
-    Keys: db (bool), scheduler (bool), mqtt (bool), mqtt_status (str)
+    Keys: db (bool), scheduler (bool), dispatcher (bool), mqtt (bool), mqtt_status (str)
     """
     # DB health: try a quick query
     try:
@@ -819,6 +1163,7 @@ def _get_subsystem_status(scheduler):
     return {
         "db": db_ok,
         "scheduler": scheduler_ok,
+        "dispatcher": dispatcher.is_alive(),
         "mqtt": mqtt_ok,
         "mqtt_status": mqtt_status,
     }
@@ -826,22 +1171,12 @@ def _get_subsystem_status(scheduler):
 
 def _check_clip_availability(event_id):
     """
-    Check if a clip is still available on Frigate via HEAD request.
+    Probe a single clip via HEAD and write the observation to the DB cache.
     Returns True if available, False if not (404/400), None on network error.
     """
-    try:
-        clip_url = f"{FRIGATE_URL}/api/events/{event_id}/clip.mp4"
-        response = requests.head(clip_url, timeout=10)
-        if response.status_code in (200, 206):
-            return True
-        elif response.status_code in (400, 404):
-            return False
-        else:
-            logging.debug(f"Unexpected status {response.status_code} for clip {event_id}")
-            return None
-    except (requests.RequestException, Timeout):
-        logging.debug(f"Network error checking clip {event_id}")
-        return None
+    available, size = check_clip_available(FRIGATE_URL, event_id)
+    database.update_clip_availability(event_id, available, size=size)
+    return available
 
 
 def _get_clip_availability_stats():
@@ -850,51 +1185,61 @@ def _get_clip_availability_stats():
     Events with retry=0 are non-retriable and should not be marked as "action required".
     Returns dict with counts: available, not_available, unknown (network error), non_retryable.
     Also returns the availability status of the oldest retryable event.
+
+    Reads the per-event availability cache first. Only events whose cached
+    observation is missing or older than CLIP_AVAILABILITY_TTL_SECONDS are
+    re-probed, with at most CLIP_PROBE_CONCURRENCY HEAD requests in flight so
+    a large backlog neither takes an hour nor floods Frigate with clip assembly.
     """
     event_ids = database.select_not_uploaded_yet_retryable()
     non_retryable = len(database.select_not_uploaded_yet_hard())
     if not event_ids:
         return {"available": 0, "not_available": 0, "unknown": 0, "non_retryable": non_retryable, "oldest_available": None}
 
-    available = 0
-    not_available = 0
-    unknown = 0
-    oldest_available = None
-
-    # Check the oldest event first (it's the one we display)
-    for i, event_id in enumerate(event_ids):
-        status = _check_clip_availability(event_id)
-        if status is True:
-            available += 1
-            if i == 0:  # oldest event
-                oldest_available = True
-        elif status is False:
-            not_available += 1
-            if i == 0:
-                oldest_available = False
-        else:  # None = network error
-            unknown += 1
-            if i == 0:
-                oldest_available = None
+    cached = database.select_clip_availability(event_ids)
+    now = time.time()
+    statuses = {}
+    stale = []
+    for event_id in event_ids:
+        available, checked_at = cached.get(event_id, (None, None))
+        if available is not None and checked_at is not None and now - checked_at < CLIP_AVAILABILITY_TTL_SECONDS:
+            statuses[event_id] = bool(available)
+        else:
+            stale.append(event_id)
+
+    if stale:
+        logging.debug(
+            f"Probing clip availability for {len(stale)} of {len(event_ids)} pending events "
+            f"({CLIP_PROBE_CONCURRENCY} in parallel); the rest is served from cache."
+        )
+        with ThreadPoolExecutor(max_workers=CLIP_PROBE_CONCURRENCY, thread_name_prefix="clip-probe") as pool:
+            for event_id, status in zip(stale, pool.map(_check_clip_availability, stale)):
+                statuses[event_id] = status
+
+    available = sum(1 for status in statuses.values() if status is True)
+    not_available = sum(1 for status in statuses.values() if status is False)
+    unknown = len(statuses) - available - not_available
 
     return {
         "available": available,
         "not_available": not_available,
         "unknown": unknown,
         "non_retryable": non_retryable,
-        "oldest_available": oldest_available,
+        # The oldest event is the one displayed in the report.
+        "oldest_available": statuses.get(event_ids[0]),
     }
 
 
 def _get_frigate_reachability_status():
     """
-    Return Frigate reachability status string based on _frigate_unreachable_since.
+    Return Frigate reachability status string based on _frigate_unreachable_since
+    (maintained by the circuit-breaker listener).
     """
     if _frigate_unreachable_since is None:
         return "reachable"
     else:
         downtime = _format_duration((datetime.now() - _frigate_unreachable_since).total_seconds())
-        return f"unreachable for {downtime}"
+        return f"unreachable for {downtime}, circuit {frigate_circuit.state}"
 
 
 def daily_health_report(scheduler):
@@ -961,6 +1306,7 @@ def daily_health_report(scheduler):
     # Subsystem status indicators
     db_icon = ":white_check_mark:" if subsystem["db"] else ":x:"
     scheduler_icon = ":white_check_mark:" if subsystem["scheduler"] else ":x:"
+    dispatcher_icon = ":white_check_mark:" if subsystem["dispatcher"] else ":x:"
     mqtt_icon = ":white_check_mark:" if subsystem["mqtt"] else ":x:"
     frigate_icon = ":white_check_mark:" if frigate_status == "reachable" else ":x:"
 
@@ -972,6 +1318,7 @@ def daily_health_report(scheduler):
         f"| Pending total | **{stats['pending_total']}** |\n"
         f"| thereof retryable (action required) | **{stats.get('pending_retryable', 0)}** |\n"
         f"| thereof non-retriable (gave up) | **{stats.get('pending_non_retryable', 0)}** |\n"
+        f"| thereof deferred to upload window | {stats.get('pending_deferred', 0)} |\n"
         f"| thereof under 1 day (normal) | {stats['pending_lt_1d']} |\n"
         f"| thereof 1–2 days | {stats['pending_1d_2d']} |\n"
         f"| thereof 2–3 days | {stats['pending_2d_3d']} |\n"
@@ -980,6 +1327,12 @@ def daily_health_report(scheduler):
         f"| Total uploaded ever | {stats['total_uploaded']} |\n"
     )
 
+    # Per-camera lag: which cameras the backlog belongs to.
+    if stats.get("pending_by_camera"):
+        text += "\n**Per-camera lag (retryable events):**\n"
+        for cam, count, age_hours in stats["pending_by_camera"]:
+            text += f"- {cam or 'unknown'}: **{count}** pending, oldest {age_hours} h\n"
+
     # Add clip availability statistics
     if stats.get("pending_retryable", 0) > 0:
         text += "\n**Clip Availability (retryable events):**\n"
@@ -992,6 +1345,7 @@ def daily_health_report(scheduler):
     text += "\n**Subsystem Status:**\n"
     text += f"- {db_icon} Database\n"
     text += f"- {scheduler_icon} Scheduler\n"
+    text += f"- {dispatcher_icon} Dispatcher\n"
     text += f"- {mqtt_icon} MQTT ({subsystem['mqtt_status']})\n"
     text += f"- {frigate_icon} Frigate ({frigate_status})\n"
 
@@ -1031,21 +1385,20 @@ def daily_health_report(scheduler):
     logging.info(f"Health report sent: {title}")
 
 
-def internet(host="8.8.8.8", port=53, timeout=3):
+def internet():
     """
-    Quick connectivity check: TCP-connect to a well-known DNS endpoint.
-    Returns True if reachable within `timeout` seconds, else False.
-
-    Uses socket.create_connection with a per-call timeout so it does NOT mutate
-    the process-wide socket default timeout (unlike socket.setdefaulttimeout()).
-    The socket is closed deterministically via the context manager.
+    Non-blocking connectivity check: returns the cached online/offline flag
+    maintained by the background connectivity monitor (src/connectivity.py).
     """
-    try:
-        with socket.create_connection((host, port), timeout=timeout):
-            return True
-    except OSError as ex:
-        logging.debug(f"Internet check failed: {ex}")
-        return False
+    return connectivity.monitor.is_online()
+
+
+def _on_connectivity_change(online):
+    """Wake the dispatcher immediately when connectivity comes back."""
+    if online:
+        logging.info("Connectivity restored. Waking the dispatcher.")
+        release_outage_postponed()
+        dispatcher.wake("connectivity_restored")
 
 
 def main():
@@ -1056,23 +1409,62 @@ def main():
 
     logging.debug("Initializing database...")
     init_db_and_run_migrations()
+    spool.start()
+
+    # Start the connectivity monitor before anything reads internet().
+    connectivity.monitor.add_listener(_on_connectivity_change)
+    connectivity.monitor.start()
+
+    # Active side of the Frigate circuit breaker: probes /api/version with
+    # backoff while the circuit is open or half-open, idles while closed.
+    frigate_circuit.start_prober(lambda: check_frigate_reachable(FRIGATE_URL))
+    spool_prefetcher.start()
+
+    # Opt-in: upload long events segment by segment while they are running.
+    progressive_capture.max_duration = SKIP_EVENTS_LONGER_THAN_SECONDS
+    progressive_capture.start(
+        upload_part=upload_progressive_part,
+        can_run=lambda: internet() and frigate_circuit.allow_request(),
+    )
+
+    # Opt-in: snapshots of new events ahead of their clips.
+    snapshot_lane.start(
+        upload=upload_event_snapshot,
+        can_run=lambda: internet() and frigate_circuit.allow_request(),
+    )
+
+    # Upload workers drain the priority queue fed by MQTT, the listing and
+    # the retry dispatcher.
+    work_queue.start_workers(UPLOAD_WORKERS, process_work_item)
 
     mqtt_thread = threading.Thread(target=mqtt_handler)
     mqtt_thread.daemon = True
     mqtt_thread.start()
 
-    scheduler = BackgroundScheduler()
-    # Run interval jobs shortly after startup so we don't wait a full interval
-    # before the first execution (especially important after container restarts).
-    # 90s gives MQTT/Google auth a moment to settle first.
+    # Credentials and the Drive clients are built in the background, retried
+    # until Google answers; ingestion and the spool do not wait for them.
+    start_drive_init()
+
+    # Start the dispatcher and the housekeeping jobs shortly after startup so
+    # we don't wait a full interval before the first execution (especially
+    # important after container restarts). 90s gives MQTT/Google auth a moment
+    # to settle first.
     initial_run = datetime.now() + timedelta(seconds=90)
-    scheduler.add_job(run_every_x_minutes, 'interval', minutes=10, next_run_time=initial_run)
-    scheduler.add_job(lambda: cleanup_old_files_on_drive(service), 'interval', days=1, next_run_time=initial_run)
+    dispatcher.start(initial_delay=90)
+
+    # APScheduler only runs housekeeping now; upload work is the dispatcher's.
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(run_housekeeping, 'interval', minutes=10, next_run_time=initial_run)
+    scheduler.add_job(cleanup_old_files_on_all_accounts, 'interval', days=1, next_run_time=initial_run)
+    if drive_reconciler.enabled:
+        scheduler.add_job(
+            drive_reconciler.run, 'interval', minutes=drive_reconciler.interval_minutes, next_run_time=initial_run
+        )
     health_hour, health_minute = parse_health_report_time(HEALTH_REPORT_TIME)
     scheduler.add_job(lambda: daily_health_report(scheduler), 'cron', hour=health_hour, minute=health_minute)
     scheduler.start()
     logging.info(
-        f"Scheduler started. First interval job run at {initial_run.strftime('%H:%M:%S')}. "
+        f"Dispatcher and scheduler started. First run at {initial_run.strftime('%H:%M:%S')}. "
         f"Daily health report scheduled at {health_hour:02d}:{health_minute:02d}."
     )
 
@@ -1086,6 +1478,22 @@ def main():
         db_path=database.DB_PATH,
         scheduler=scheduler,
         mqtt_is_connected=_mqtt_is_connected,
+        frigate_circuit=frigate_circuit,
+        frigate_clip_limiter=frigate_clip_limiter,
+        connectivity=connectivity.monitor,
+        dispatcher=dispatcher,
+        upload_queue=work_queue,
+        rate_limits=rate_limiter.limits,
+        spool=spool,
+        progressive_capture=progressive_capture,
+        snapshot_lane=snapshot_lane,
+        faststart=faststart,
+        coalescer=coalescer,
+        drive_accounts=drive_accounts,
+        drive_api=drive_governor,
+        drive_tokens=credential_manager,
+        drive_reconcile=drive_reconciler,
+        event_sync=event_sync,
         status_token=HEALTHCHECK_TOKEN or None,
     )
     health_server = None
@@ -1120,6 +1528,11 @@ def main():
         health_state.shutting_down.set()
         if health_server:
             health_server.shutdown()
+        dispatcher.stop()
+        spool_prefetcher.stop()
+        progressive_capture.stop()
+        snapshot_lane.stop()
+        credential_manager.stop()
         scheduler.shutdown()
 
 
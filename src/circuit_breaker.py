@@ -0,0 +1,178 @@
+"""
+Minimal thread-safe circuit breaker.
+
+Used to answer "is it worth talking to Frigate right now?" without any network
+I/O on the hot path. The breaker is fed passively by the outcome of real calls
+(`record_success()` / `record_failure()`) and actively by an optional background
+prober that only runs while the circuit is not closed.
+
+States:
+
+  closed     Normal operation. Consecutive failures are counted; reaching
+             `failure_threshold` opens the circuit.
+  open       Callers are told to skip the dependency. After `reset_timeout`
+             seconds the circuit moves to half-open. Every re-open doubles the
+             timeout (capped at `max_reset_timeout`).
+  half_open  Trial phase. Requests are allowed again; the first recorded
+             outcome (from real traffic or the prober) decides between closed
+             and open.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 600.0,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._current_reset_timeout = reset_timeout
+        self._opened_at: Optional[float] = None
+        self._state_changed_at = time.time()
+        self._listeners: list[Callable[[str, str], None]] = []
+        # Wakes the prober thread early when the circuit opens.
+        self._wake = threading.Event()
+        self._prober_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ queries
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open_locked()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """O(1), no I/O: True unless the circuit is open."""
+        return self.state != STATE_OPEN
+
+    def snapshot(self) -> dict:
+        """JSON-serialisable view for /status and the daily report."""
+        with self._lock:
+            self._maybe_half_open_locked()
+            now = time.time()
+            retry_in = None
+            if self._state == STATE_OPEN and self._opened_at is not None:
+                retry_in = max(0, round(self._opened_at + self._current_reset_timeout - now))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "state_age_seconds": round(now - self._state_changed_at),
+                "retry_in_seconds": retry_in,
+            }
+
+    # ---------------------------------------------------------------- feedback
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._current_reset_timeout = self.reset_timeout
+            transition = self._transition_locked(STATE_CLOSED)
+        self._notify(transition)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._maybe_half_open_locked()
+            self._consecutive_failures += 1
+            transition = None
+            if self._state == STATE_HALF_OPEN:
+                # Trial failed: back off harder before the next one.
+                self._current_reset_timeout = min(self._current_reset_timeout * 2, self.max_reset_timeout)
+                self._opened_at = time.time()
+                transition = self._transition_locked(STATE_OPEN)
+            elif self._state == STATE_CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = time.time()
+                transition = self._transition_locked(STATE_OPEN)
+        if transition:
+            self._wake.set()
+        self._notify(transition)
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """Register ``callback(old_state, new_state)``, invoked outside the lock."""
+        self._listeners.append(callback)
+
+    # ------------------------------------------------------------------ prober
+    def start_prober(self, probe: Callable[[], bool], idle_interval: float = 60.0) -> threading.Thread:
+        """
+        Start a daemon thread that actively probes the dependency while the
+        circuit is not closed. `probe` must return True/False and must not feed
+        the breaker itself. While closed, the thread just sleeps: real traffic
+        is the cheaper signal.
+        """
+        if self._prober_thread is not None:
+            return self._prober_thread
+
+        def _run():
+            while True:
+                state = self.state
+                if state == STATE_CLOSED:
+                    self._wake.wait(idle_interval)
+                    self._wake.clear()
+                    continue
+                if state == STATE_OPEN:
+                    with self._lock:
+                        wait = (self._opened_at or 0) + self._current_reset_timeout - time.time()
+                    if wait > 0:
+                        self._wake.wait(wait)
+                        self._wake.clear()
+                        continue
+                try:
+                    ok = bool(probe())
+                except Exception as e:
+                    logging.debug(f"Circuit '{self.name}' probe raised: {e}")
+                    ok = False
+                if ok:
+                    self.record_success()
+                else:
+                    self.record_failure()
+
+        self._prober_thread = threading.Thread(target=_run, name=f"{self.name}-circuit-prober", daemon=True)
+        self._prober_thread.start()
+        return self._prober_thread
+
+    # --------------------------------------------------------------- internals
+    def _maybe_half_open_locked(self) -> None:
+        if (
+            self._state == STATE_OPEN
+            and self._opened_at is not None
+            and time.time() - self._opened_at >= self._current_reset_timeout
+        ):
+            self._state = STATE_HALF_OPEN
+            self._state_changed_at = time.time()
+
+    def _transition_locked(self, new_state: str):
+        old_state = self._state
+        if old_state == new_state:
+            return None
+        self._state = new_state
+        self._state_changed_at = time.time()
+        return old_state, new_state
+
+    def _notify(self, transition) -> None:
+        if not transition:
+            return
+        old_state, new_state = transition
+        logging.info(f"Circuit '{self.name}': {old_state} -> {new_state}")
+        for callback in list(self._listeners):
+            try:
+                callback(old_state, new_state)
+            except Exception as e:
+                logging.error(f"Circuit '{self.name}' listener failed: {e}")
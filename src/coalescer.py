@@ -0,0 +1,100 @@
+"""
+Coalescing of overlapping events (COALESCE_EVENTS).
+
+Frigate often reports several events on one camera for the same stretch of
+time, e.g. a person and a car in the same scene. Uploaded one by one, the
+same minutes of video go to Drive two or three times. With coalescing on,
+`handle_all_events()` groups the new events of a listing per camera whose
+windows overlap or are at most COALESCE_GAP_SECONDS apart. Each group is
+uploaded once, as a recording-range clip from the first start to the last
+end, under the name of its earliest event (the leader). The other members
+are recorded as `covered_by` the leader and marked uploaded with it.
+
+Groups are capped at COALESCE_MAX_SPAN_SECONDS so a busy camera does not
+chain into one huge clip. Events that arrive over MQTT are still uploaded
+right away, one by one; only events picked up by the listing are grouped.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from src.env import float_from_env, parse_bool_env
+
+load_dotenv()
+
+
+class EventCoalescer:
+    def __init__(self, enabled: bool = False, gap_seconds: float = 5, max_span_seconds: float = 1800):
+        self.enabled = enabled
+        self.gap_seconds = gap_seconds
+        self.max_span_seconds = max_span_seconds
+
+        self._lock = threading.Lock()
+        self._groups = 0
+        self._events_covered = 0
+        self._seconds_saved = 0.0
+        self._bytes_saved = 0
+
+    def group(self, events: list) -> list:
+        """
+        Split finished events into groups of overlapping events per camera,
+        each sorted by start time. Singletons are returned as groups of one.
+        """
+        by_camera: dict = {}
+        for event in events:
+            by_camera.setdefault(event.get('camera'), []).append(event)
+        groups = []
+        for camera_events in by_camera.values():
+            camera_events.sort(key=lambda e: e['start_time'])
+            current = [camera_events[0]]
+            group_end = camera_events[0]['end_time']
+            for event in camera_events[1:]:
+                new_end = max(group_end, event['end_time'])
+                if (
+                    event['start_time'] <= group_end + self.gap_seconds
+                    and new_end - current[0]['start_time'] <= self.max_span_seconds
+                ):
+                    current.append(event)
+                    group_end = new_end
+                else:
+                    groups.append(current)
+                    current, group_end = [event], event['end_time']
+            groups.append(current)
+        return groups
+
+    def record_upload(self, covered: int, separate_seconds: float, merged_seconds: float, size: int) -> int:
+        """
+        Account for an uploaded group: `separate_seconds` of footage would
+        have been uploaded one clip per event, `merged_seconds` were. Returns
+        the estimated bytes saved (at the merged clip's bitrate).
+        """
+        saved_seconds = max(0.0, separate_seconds - merged_seconds)
+        saved_bytes = int(size * saved_seconds / merged_seconds) if merged_seconds > 0 else 0
+        with self._lock:
+            self._groups += 1
+            self._events_covered += covered
+            self._seconds_saved += saved_seconds
+            self._bytes_saved += saved_bytes
+        return saved_bytes
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "gap_seconds": self.gap_seconds,
+                "groups_uploaded": self._groups,
+                "events_covered": self._events_covered,
+                "seconds_saved": round(self._seconds_saved),
+                "mb_saved": round(self._bytes_saved / 1e6, 1),
+            }
+
+
+coalescer = EventCoalescer(
+    enabled=parse_bool_env(os.getenv('COALESCE_EVENTS')),
+    gap_seconds=float_from_env('COALESCE_GAP_SECONDS', 5),
+    max_span_seconds=float_from_env('COALESCE_MAX_SPAN_SECONDS', 1800),
+)
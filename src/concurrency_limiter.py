@@ -0,0 +1,109 @@
+"""
+AIMD (additive-increase / multiplicative-decrease) concurrency limiter.
+
+Used around Frigate clip requests: every `/api/events/{id}/clip.mp4` makes
+Frigate concatenate recording segments, which is CPU- and disk-heavy on the
+NVR. The limiter starts low and
+
+  - adds roughly one slot per "window" of healthy requests (each success with
+    time-to-first-byte within the target adds ``1 / limit``),
+  - halves the limit on a timeout, a 5xx or a TTFB above the target,
+
+with a short cooldown so one burst of failures only counts as one decrease.
+Callers block in `slot()` while the number of in-flight requests has reached
+the current (integer) limit.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial: float = 1,
+        min_limit: float = 1,
+        max_limit: float = 4,
+        ttfb_target: float = 15.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 10.0,
+    ):
+        self.name = name
+        self.min_limit = max(1.0, float(min_limit))
+        self.max_limit = max(self.min_limit, float(max_limit))
+        self.ttfb_target = ttfb_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self._cond = threading.Condition()
+        self._limit = min(self.max_limit, max(self.min_limit, float(initial)))
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._last_ttfb: Optional[float] = None
+        self._decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @contextmanager
+    def slot(self):
+        """Hold one concurrency slot for the duration of the block."""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._in_flight >= int(self._limit):
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self, ttfb: float) -> None:
+        """Report a response's time-to-first-byte (seconds)."""
+        self._last_ttfb = ttfb
+        if ttfb > self.ttfb_target:
+            self.on_overload(f"slow first byte ({ttfb:.1f}s)")
+            return
+        with self._cond:
+            before = int(self._limit)
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            if int(self._limit) > before:
+                logging.debug(f"{self.name} concurrency limit raised to {int(self._limit)}")
+                self._cond.notify()
+
+    def on_overload(self, reason: str) -> None:
+        """Report a timeout / 5xx / slow response: back off multiplicatively."""
+        now = time.monotonic()
+        with self._cond:
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            before = int(self._limit)
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._decreases += 1
+        if int(self._limit) < before:
+            logging.info(f"{self.name} concurrency limit lowered to {int(self._limit)}: {reason}")
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "max_limit": int(self.max_limit),
+                "last_ttfb_seconds": round(self._last_ttfb, 2) if self._last_ttfb is not None else None,
+                "decreases": self._decreases,
+            }
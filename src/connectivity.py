@@ -0,0 +1,166 @@
+"""
+Background internet-connectivity monitor.
+
+Replaces inline `socket.create_connection()` probes on the hot paths. A daemon
+thread probes a well-known DNS endpoint (and optionally the Google Drive API
+endpoint) and keeps a cached online/offline flag with hysteresis, so a single
+dropped packet neither pauses uploads nor does a single lucky probe resume
+them. Readers call `is_online()`, which never blocks.
+
+Listeners registered via `add_listener()` are called on every transition, so
+retry loops can be woken immediately when connectivity comes back instead of
+waiting for the next scheduler tick.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.env import float_from_env, int_from_env, parse_bool_env
+
+load_dotenv()
+
+DNS_PROBE_TARGET = ('8.8.8.8', 53)
+DRIVE_PROBE_TARGET = ('www.googleapis.com', 443)
+
+
+def tcp_probe(host, port, timeout=3):
+    """
+    Quick connectivity check: TCP-connect to `host:port`.
+    Returns True if reachable within `timeout` seconds, else False.
+
+    Uses socket.create_connection with a per-call timeout so it does NOT mutate
+    the process-wide socket default timeout (unlike socket.setdefaulttimeout()).
+    The socket is closed deterministically via the context manager.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError as ex:
+        logging.debug(f"Connectivity probe to {host}:{port} failed: {ex}")
+        return False
+
+
+class ConnectivityMonitor:
+    def __init__(
+        self,
+        targets,
+        interval: float = 30.0,
+        offline_interval: float = 10.0,
+        offline_after: int = 2,
+        online_after: int = 2,
+        timeout: float = 3.0,
+    ):
+        self.targets = list(targets)
+        self.interval = interval
+        self.offline_interval = offline_interval
+        self.offline_after = max(1, offline_after)
+        self.online_after = max(1, online_after)
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        # Optimistic until the first probe: callers started before the monitor
+        # behave as if online and fail naturally if they are not.
+        self._online = True
+        self._streak = 0  # consecutive probes contradicting the current state
+        self._changed_at = time.time()
+        self._last_probe_at: Optional[float] = None
+        self._wake = threading.Event()
+        self._listeners: list[Callable[[bool], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ queries
+    def is_online(self) -> bool:
+        """Cached state; never blocks."""
+        return self._online
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.time()
+            return {
+                "online": self._online,
+                "state_age_seconds": round(now - self._changed_at),
+                "last_probe_age_seconds": (
+                    round(now - self._last_probe_at) if self._last_probe_at is not None else None
+                ),
+                "targets": [f"{host}:{port}" for host, port in self.targets],
+            }
+
+    # ------------------------------------------------------------------ control
+    def add_listener(self, callback: Callable[[bool], None]) -> None:
+        """Register ``callback(online)``, invoked on every state transition."""
+        self._listeners.append(callback)
+
+    def request_probe(self) -> None:
+        """Ask the monitor thread to probe now (e.g. after a failed upload)."""
+        self._wake.set()
+
+    def probe_once(self) -> bool:
+        return all(tcp_probe(host, port, timeout=self.timeout) for host, port in self.targets)
+
+    def start(self) -> threading.Thread:
+        if self._thread is not None:
+            return self._thread
+        # Seed the state synchronously so the first job sees a real value.
+        self._set_state(self.probe_once(), force=True)
+        self._thread = threading.Thread(target=self._run, name="connectivity-monitor", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    # --------------------------------------------------------------- internals
+    def _run(self):
+        while True:
+            # Probe faster while offline or while a transition is being confirmed.
+            fast = not self._online or self._streak > 0
+            self._wake.wait(self.offline_interval if fast else self.interval)
+            self._wake.clear()
+            try:
+                ok = self.probe_once()
+            except Exception as e:
+                logging.debug(f"Connectivity probe raised: {e}")
+                ok = False
+            self._set_state(ok)
+
+    def _set_state(self, ok: bool, force: bool = False) -> None:
+        with self._lock:
+            self._last_probe_at = time.time()
+            if ok == self._online:
+                self._streak = 0
+                return
+            self._streak += 1
+            needed = self.online_after if ok else self.offline_after
+            if not force and self._streak < needed:
+                return
+            self._online = ok
+            self._streak = 0
+            self._changed_at = time.time()
+        logging.info(f"Connectivity changed: {'online' if ok else 'offline'}")
+        for callback in list(self._listeners):
+            try:
+                callback(ok)
+            except Exception as e:
+                logging.error(f"Connectivity listener failed: {e}")
+
+
+def _build_monitor() -> ConnectivityMonitor:
+    targets = [DNS_PROBE_TARGET]
+    if parse_bool_env(os.getenv('CONNECTIVITY_PROBE_DRIVE')):
+        targets.append(DRIVE_PROBE_TARGET)
+    return ConnectivityMonitor(
+        targets,
+        interval=float_from_env('CONNECTIVITY_CHECK_INTERVAL_SECONDS', 30, minimum=1),
+        offline_interval=float_from_env('CONNECTIVITY_OFFLINE_CHECK_INTERVAL_SECONDS', 10, minimum=1),
+        offline_after=int_from_env('CONNECTIVITY_OFFLINE_AFTER', 2, minimum=1),
+        online_after=int_from_env('CONNECTIVITY_ONLINE_AFTER', 2, minimum=1),
+    )
+
+
+# Shared instance. Started by main(); until then it reports online.
+monitor = _build_monitor()
@@ -1,6 +1,7 @@
 import os
 import sqlite3
 import logging
+import time
 from dotenv import load_dotenv
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db/events.db')
@@ -20,6 +21,10 @@ DB_RETENTION_DAYS = int(
     )
 )
 
+# New events are not picked up by the retry loop before this grace period has
+# passed, so the MQTT path gets a chance to upload them first.
+NEW_EVENT_RETRY_GRACE_SECONDS = 300
+
 
 def init_db(db_path=DB_PATH):
     logging.info(f"Initializing database at {db_path}")
@@ -71,6 +76,11 @@ def init_db(db_path=DB_PATH):
         conn.close()
 
 
+def _migration_sort_key(filename):
+    prefix = filename.split('_', 1)[0].split('.', 1)[0]
+    return (int(prefix) if prefix.isdigit() else float('inf'), filename)
+
+
 def run_migrations(migrations_folder='db/migrations'):
     conn = sqlite3.connect(DB_PATH)
 
@@ -80,7 +90,8 @@ def run_migrations(migrations_folder='db/migrations'):
         cursor.execute('SELECT name FROM migrations')
         applied_migrations = set(row[0] for row in cursor.fetchall())
 
-        for filename in sorted(os.listdir(migrations_folder)):
+        # Numeric order: a plain sort would run '10_...' before '2_...'.
+        for filename in sorted(os.listdir(migrations_folder), key=_migration_sort_key):
             if filename.endswith('.py') and filename not in applied_migrations:
                 migration_path = os.path.join(migrations_folder, filename)
                 logging.info(f"Running migration: {migration_path}")
@@ -114,17 +125,26 @@ def is_event_exists(event_id, db_path=DB_PATH):
         conn.close()
 
 
-def insert_event(event_id, start_time, db_path=DB_PATH):
+def insert_event(event_id, start_time, camera=None, label=None, end_time=None, db_path=DB_PATH):
     """
-    Inserts an event into the database.
+    Inserts an event into the database. A no-op if the event is already known
+    (the snapshot lane and the upload worker can both see a new event first).
     :param event_id:
+    :param start_time:
+    :param end_time: Frigate end_time (used to estimate the transfer cost)
+    :param camera: Frigate camera name (used for upload prioritisation)
+    :param label: Frigate object label (used for upload prioritisation)
     :param db_path:
     :return:
     """
     conn = sqlite3.connect(db_path)
     try:
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO events (event_id, start_time) VALUES (?, ?)', (event_id, start_time))
+        cursor.execute(
+            'INSERT OR IGNORE INTO events (event_id, start_time, next_attempt_at, camera, label, end_time) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (event_id, start_time, time.time() + NEW_EVENT_RETRY_GRACE_SECONDS, camera, label, end_time),
+        )
         conn.commit()
     except Exception as e:
         logging.error(f"Error inserting event: {e}")
@@ -198,6 +218,9 @@ def update_event_retry(event_id, retry, last_error_kind=None, db_path=DB_PATH):
             )
         else:
             cursor.execute('UPDATE events SET retry = ? WHERE event_id = ?', (retry, event_id))
+        if retry == 0:
+            # A given-up coalesced upload no longer covers its members.
+            cursor.execute('UPDATE events SET covered_by = NULL WHERE covered_by = ? AND uploaded = 0', (event_id,))
         conn.commit()
     except Exception as e:
         logging.error(f"Error updating event retry status: {e}")
@@ -250,19 +273,182 @@ def select_event_uploaded(event_id, db_path=DB_PATH):
         conn.close()
 
 
-def select_not_uploaded_yet(db_path=DB_PATH):
+def select_snapshot_state(event_id, db_path=DB_PATH):
     """
-    Selects events that are not uploaded yet, retriable, and where created at least 5 minutes ago.
+    Selects the clip and snapshot upload state of an event.
+    :param event_id:
+    :param db_path:
+    :return: (uploaded, snapshot_uploaded, snapshot_tries), or None if the event is unknown
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT uploaded, snapshot_uploaded, snapshot_tries FROM events WHERE event_id = ?', (event_id,))
+        return cursor.fetchone()
+    except Exception as e:
+        logging.error(f"Error selecting event snapshot state: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def update_snapshot_state(event_id, snapshot_uploaded, db_path=DB_PATH):
+    """
+    Records a snapshot upload attempt. Increments snapshot_tries by 1; the
+    clip's uploaded/tries columns are left alone.
+    :param event_id:
+    :param snapshot_uploaded: 1 on success, 2 if Frigate has no snapshot, 0 on failure
     :param db_path:
-    :return:
     """
     conn = sqlite3.connect(db_path)
     try:
         cursor = conn.cursor()
         cursor.execute(
-            'SELECT event_id FROM events WHERE uploaded = 0 and created <= datetime("now", "-5 minutes") and retry = 1 ORDER BY created ASC')
-        result = cursor.fetchall()
-        return [row[0] for row in result]
+            'UPDATE events SET snapshot_uploaded = ?, snapshot_tries = snapshot_tries + 1 WHERE event_id = ?',
+            (snapshot_uploaded, event_id),
+        )
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating event snapshot state: {e}")
+    finally:
+        conn.close()
+
+
+def update_event_drive_file(event_id, md5=None, drive_account=None, drive_file_id=None, drive_parent_id=None,
+                            db_path=DB_PATH):
+    """
+    Stores what is known about an event's file on Drive after its upload.
+    :param event_id:
+    :param md5: hex digest, after Drive confirmed the same checksum (None if unknown)
+    :param drive_account: name of the Drive account holding the file
+    :param drive_file_id: Drive ID of the uploaded file
+    :param drive_parent_id: Drive ID of the folder it was uploaded into
+    :param db_path:
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE events SET md5 = COALESCE(?, md5), drive_account = ?, drive_file_id = ?, drive_parent_id = ?, '
+            'drive_drift = NULL WHERE event_id = ?',
+            (md5, drive_account, drive_file_id, drive_parent_id, event_id))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating Drive file of event {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def update_next_attempt_at(event_id, next_attempt_at, db_path=DB_PATH):
+    """
+    Schedules the next retry of an event (Unix timestamp).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE events SET next_attempt_at = ? WHERE event_id = ?', (next_attempt_at, event_id))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating next_attempt_at for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def update_next_attempt_at_many(event_ids, next_attempt_at, db_path=DB_PATH):
+    """
+    Schedules the next retry of several pending events at the same time.
+    """
+    rows = [(next_attempt_at, event_id) for event_id in event_ids]
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('UPDATE events SET next_attempt_at = ? WHERE event_id = ? AND uploaded = 0', rows)
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating next_attempt_at of {len(rows)} events: {e}")
+    finally:
+        conn.close()
+
+
+def update_event_deferred(event_id, deferred, next_attempt_at=None, db_path=DB_PATH):
+    """
+    Marks an event as deferred to an upload window (or clears the flag).
+    Does not touch `tries`: waiting for a window is not a failed attempt.
+    :param deferred: True while the event waits for the next window
+    :param next_attempt_at: optional Unix timestamp of the window opening
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        if next_attempt_at is None:
+            cursor.execute('UPDATE events SET deferred = ? WHERE event_id = ?', (1 if deferred else 0, event_id))
+        else:
+            cursor.execute(
+                'UPDATE events SET deferred = ?, next_attempt_at = ? WHERE event_id = ?',
+                (1 if deferred else 0, next_attempt_at, event_id))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating deferred flag for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def select_clip_size(event_id, db_path=DB_PATH):
+    """
+    Returns the last known clip size in bytes (HEAD or download), or None.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT clip_size FROM events WHERE event_id = ?', (event_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logging.error(f"Error selecting clip size for {event_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_next_attempt_at(db_path=DB_PATH):
+    """
+    Returns the earliest next_attempt_at among retryable pending events, or
+    None if there are none. Answered from the idx_pending_due index.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(next_attempt_at) FROM events WHERE uploaded = 0 AND retry = 1 AND covered_by IS NULL')
+        result = cursor.fetchone()
+        return result[0] if result else None
+    except Exception as e:
+        logging.error(f"Error getting next attempt time: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def select_not_uploaded_yet(now=None, db_path=DB_PATH):
+    """
+    Selects events that are not uploaded yet, retriable, and due for their next
+    attempt (next_attempt_at <= now), earliest due first. Served entirely by the
+    partial index idx_pending_due, so events still backing off cost nothing.
+    Events covered by a coalesced upload (covered_by) ride along with their leader.
+    :param now: Unix timestamp to compare against (default: current time)
+    :param db_path:
+    :return: list of (event_id, start_time, end_time, tries, camera, label, clip_size) tuples
+    """
+    if now is None:
+        now = time.time()
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT event_id, start_time, end_time, tries, camera, label, clip_size FROM events '
+            'WHERE uploaded = 0 and retry = 1 and next_attempt_at <= ? and covered_by IS NULL '
+            'ORDER BY next_attempt_at ASC',
+            (now,))
+        return cursor.fetchall()
     except Exception as e:
         logging.error(f"Error selecting not uploaded yet events: {e}")
         return []
@@ -311,6 +497,98 @@ def select_not_uploaded_yet_hard(db_path=DB_PATH):
         conn.close()
 
 
+def update_clip_availability(event_id, available, size=None, checked_at=None, db_path=DB_PATH):
+    """
+    Records the last observed clip availability for an event.
+
+    :param event_id: event id
+    :param available: True / False as observed on Frigate. None (network error)
+        is not cached — the previous observation is more useful than "unknown".
+    :param size: optional Content-Length reported by Frigate (None = keep existing)
+    :param checked_at: Unix timestamp of the observation (default: now)
+    """
+    if available is None:
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE events SET clip_available = ?, clip_checked_at = COALESCE(?, CAST(strftime("%s", "now") AS REAL)), '
+            'clip_size = COALESCE(?, clip_size) WHERE event_id = ?',
+            (1 if available else 0, checked_at, size, event_id),
+        )
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating clip availability for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def select_clip_availability(event_ids, db_path=DB_PATH):
+    """
+    Returns the cached clip availability for the given events as a dict
+    ``{event_id: (clip_available, clip_checked_at)}``. Events without a cached
+    observation map to ``(None, None)``.
+    """
+    result = {event_id: (None, None) for event_id in event_ids}
+    if not event_ids:
+        return result
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        # Chunk the IN-list to stay well below SQLite's bound-parameter limit.
+        ids = list(event_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT event_id, clip_available, clip_checked_at FROM events '
+                f'WHERE event_id IN ({placeholders})',
+                chunk,
+            )
+            for event_id, available, checked_at in cursor.fetchall():
+                result[event_id] = (available, checked_at)
+        return result
+    except Exception as e:
+        logging.error(f"Error selecting clip availability: {e}")
+        return result
+    finally:
+        conn.close()
+
+
+def get_learned_bitrates(db_path=DB_PATH):
+    """
+    Returns the observed clip bitrate in bytes per second, learned from events
+    whose clip size (HEAD or download) and duration are both known.
+    :param db_path:
+    :return: dict ``{camera: bytes_per_second}``; the key ``None`` holds the
+        bitrate across all cameras. Empty if nothing has been observed yet.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT camera, SUM(clip_size), SUM(end_time - start_time) FROM events '
+            'WHERE clip_size > 0 AND end_time > start_time '
+            'GROUP BY camera'
+        )
+        bitrates = {}
+        total_bytes = total_seconds = 0
+        for camera, size, seconds in cursor.fetchall():
+            total_bytes += size
+            total_seconds += seconds
+            if camera is not None:
+                bitrates[camera] = size / seconds
+        if total_seconds > 0:
+            bitrates[None] = total_bytes / total_seconds
+        return bitrates
+    except Exception as e:
+        logging.error(f"Error computing learned bitrates: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
 def delete_event(event_id, db_path=DB_PATH):
     """
     Permanently deletes an event from the database (e.g. when it no longer exists on Frigate).
@@ -319,6 +597,7 @@ def delete_event(event_id, db_path=DB_PATH):
     try:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM events WHERE event_id = ?', (event_id,))
+        cursor.execute('UPDATE events SET covered_by = NULL WHERE covered_by = ? AND uploaded = 0', (event_id,))
         conn.commit()
         logging.debug(f"Deleted event {event_id} from database")
     except Exception as e:
@@ -327,9 +606,469 @@ def delete_event(event_id, db_path=DB_PATH):
         conn.close()
 
 
+def select_existing_event_ids(event_ids, db_path=DB_PATH):
+    """
+    Returns the subset of `event_ids` that is already in the database, with
+    one query per 500 ids instead of one per event.
+    """
+    event_ids = list(event_ids)
+    existing = set()
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for i in range(0, len(event_ids), 500):
+            batch = event_ids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'SELECT event_id FROM events WHERE event_id IN ({placeholders})', batch)
+            existing.update(row[0] for row in cursor.fetchall())
+    except Exception as e:
+        logging.error(f"Error selecting existing events: {e}")
+    finally:
+        conn.close()
+    return existing
+
+
+def select_event_end_times(event_ids, db_path=DB_PATH):
+    """
+    Like `select_existing_event_ids()`, with each known event's end_time
+    (None while it was still in progress when recorded).
+    :return: {event_id: end_time} for the known events among `event_ids`
+    """
+    event_ids = list(event_ids)
+    known = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for i in range(0, len(event_ids), 500):
+            batch = event_ids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'SELECT event_id, end_time FROM events WHERE event_id IN ({placeholders})', batch)
+            known.update(cursor.fetchall())
+    except Exception as e:
+        logging.error(f"Error selecting known events: {e}")
+    finally:
+        conn.close()
+    return known
+
+
+def update_event_end_times(end_times, db_path=DB_PATH):
+    """
+    Records the end of events that were recorded while still in progress.
+    Rows that already have an end_time are left alone.
+    :param end_times: iterable of (event_id, end_time)
+    """
+    rows = [(end_time, event_id) for event_id, end_time in end_times]
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('UPDATE events SET end_time = ? WHERE event_id = ? AND end_time IS NULL', rows)
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating event end times: {e}")
+    finally:
+        conn.close()
+
+
+def update_events_covered_by(event_ids, leader_id, db_path=DB_PATH):
+    """
+    Marks events as covered by the coalesced upload of `leader_id`.
+    :param event_ids: member events (without the leader)
+    :param leader_id: event whose upload includes their footage
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE events SET covered_by = ? WHERE event_id = ?',
+            [(leader_id, event_id) for event_id in event_ids])
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error marking events covered by {leader_id}: {e}")
+    finally:
+        conn.close()
+
+
+def select_covered_events(leader_id, db_path=DB_PATH):
+    """
+    Returns the events covered by a coalesced upload.
+    :return: list of (event_id, start_time, end_time) tuples
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT event_id, start_time, end_time FROM events WHERE covered_by = ?', (leader_id,))
+        return cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error selecting events covered by {leader_id}: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def mark_covered_events_uploaded(leader_id, md5=None, drive_account=None, drive_file_id=None,
+                                 drive_parent_id=None, db_path=DB_PATH):
+    """
+    Marks every event covered by a coalesced upload as uploaded. The shared
+    Drive file is recorded on each of them, so the changes-feed
+    reconciliation matches the members as well as the leader.
+    :param md5: verified MD5 of the shared Drive file (None if unknown)
+    :param drive_account: name of the Drive account holding the file
+    :param drive_file_id: Drive ID of the shared file
+    :param drive_parent_id: Drive ID of its folder
+    :return: number of events updated
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE events SET uploaded = 1, tries = tries + 1, last_error_kind = NULL, md5 = ?, drive_account = ?, '
+            'drive_file_id = ?, drive_parent_id = ?, drive_drift = NULL '
+            'WHERE covered_by = ? AND uploaded = 0',
+            (md5, drive_account, drive_file_id, drive_parent_id, leader_id))
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        logging.error(f"Error marking events covered by {leader_id} as uploaded: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def select_spool_candidates(limit=50, db_path=DB_PATH):
+    """
+    Selects retryable pending events that have ended and whose clip is not in
+    the local spool yet, oldest recording first (closest to Frigate's retention).
+    :param limit: maximum number of rows
+    :return: list of (event_id, camera, start_time, end_time, clip_size) tuples
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT e.event_id, e.camera, e.start_time, e.end_time, e.clip_size FROM events e '
+            'LEFT JOIN spool s ON s.event_id = e.event_id '
+            'WHERE e.uploaded = 0 AND e.retry = 1 AND e.covered_by IS NULL AND e.end_time IS NOT NULL '
+            'AND s.event_id IS NULL '
+            'ORDER BY e.start_time ASC LIMIT ?',
+            (limit,))
+        return cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error selecting spool candidates: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def select_spool_entries(db_path=DB_PATH):
+    """
+    Returns the spool manifest as a list of (event_id, size, spooled_at, last_access, md5) tuples.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT event_id, size, spooled_at, last_access, md5 FROM spool')
+        return cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error selecting spool entries: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def insert_spool_entry(event_id, size, spooled_at=None, md5=None, db_path=DB_PATH):
+    """
+    Records a complete clip file in the spool manifest (replacing an older row).
+    :param size: file size in bytes
+    :param spooled_at: Unix timestamp (default: now); also the initial last_access
+    :param md5: hex MD5 computed while downloading (None if unknown)
+    """
+    if spooled_at is None:
+        spooled_at = time.time()
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO spool (event_id, size, spooled_at, last_access, md5) VALUES (?, ?, ?, ?, ?)',
+            (event_id, size, spooled_at, spooled_at, md5))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error inserting spool entry for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def touch_spool_entry(event_id, last_access=None, db_path=DB_PATH):
+    """
+    Updates the last access time of a spooled clip (used for LRU eviction).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE spool SET last_access = ? WHERE event_id = ?',
+            (last_access if last_access is not None else time.time(), event_id))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error touching spool entry for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def delete_spool_entry(event_id, db_path=DB_PATH):
+    """
+    Removes a clip from the spool manifest. The caller deletes the file.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM spool WHERE event_id = ?', (event_id,))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error deleting spool entry for {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def insert_event_part(event_id, part, start_ts, end_ts, md5=None, drive_account=None, drive_file_id=None,
+                      drive_parent_id=None, db_path=DB_PATH):
+    """
+    Records a progressively captured part of an event as uploaded.
+    :param part: 1-based part number
+    :param start_ts: start of the recording range (Unix timestamp)
+    :param end_ts: end of the recording range (Unix timestamp)
+    :param md5: hex MD5 of the part, verified against Drive (None if unknown)
+    :param drive_account: name of the Drive account holding the part (None if not uploaded)
+    :param drive_file_id: Drive ID of the uploaded part
+    :param drive_parent_id: Drive ID of the folder it was uploaded into
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO event_parts '
+            '(event_id, part, start_ts, end_ts, uploaded_at, md5, drive_account, drive_file_id, drive_parent_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (event_id, part, start_ts, end_ts, time.time(), md5, drive_account, drive_file_id, drive_parent_id))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error inserting part {part} of event {event_id}: {e}")
+    finally:
+        conn.close()
+
+
+def select_event_part_numbers(event_id, db_path=DB_PATH):
+    """
+    Returns the sorted part numbers already uploaded for an event (empty if
+    it was never uploaded in parts).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT part FROM event_parts WHERE event_id = ? ORDER BY part', (event_id,))
+        return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logging.error(f"Error selecting parts of event {event_id}: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def select_event_source(event_id, db_path=DB_PATH):
+    """
+    Returns ``(camera, start_time, end_time)`` of an event, or None.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT camera, start_time, end_time FROM events WHERE event_id = ?', (event_id,))
+        return cursor.fetchone()
+    except Exception as e:
+        logging.error(f"Error selecting event {event_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def select_drive_file_records(file_ids, db_path=DB_PATH):
+    """
+    Looks up uploads by Drive file ID, one query per 500 ids.
+    :param file_ids: Drive file IDs
+    :return: {file_id: (md5, drive_parent_id, drive_drift)} for the IDs of known events and parts
+    """
+    file_ids = list(file_ids)
+    records = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for i in range(0, len(file_ids), 500):
+            batch = file_ids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(
+                f'SELECT drive_file_id, md5, drive_parent_id, drive_drift FROM events '
+                f'WHERE drive_file_id IN ({placeholders}) '
+                f'UNION ALL SELECT drive_file_id, md5, drive_parent_id, drive_drift FROM event_parts '
+                f'WHERE drive_file_id IN ({placeholders})',
+                batch + batch)
+            records.update((row[0], row[1:]) for row in cursor.fetchall())
+    except Exception as e:
+        logging.error(f"Error selecting Drive file records: {e}")
+    finally:
+        conn.close()
+    return records
+
+
+def update_drive_drift(changes, db_path=DB_PATH):
+    """
+    Records how uploaded files differ from what is on Drive now.
+    :param changes: iterable of (drive_file_id, drift); drift is 'trashed', 'deleted', 'moved',
+                    'modified' or None (file is as uploaded again)
+    """
+    changes = [(drift, file_id) for file_id, drift in changes]
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('UPDATE events SET drive_drift = ? WHERE drive_file_id = ?', changes)
+        cursor.executemany('UPDATE event_parts SET drive_drift = ? WHERE drive_file_id = ?', changes)
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error updating Drive drift: {e}")
+    finally:
+        conn.close()
+
+
+def clear_drive_file(drive_file_id, db_path=DB_PATH):
+    """
+    Forgets a Drive file the application deleted itself (retention cleanup),
+    so its removal is not reported as drift.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for table in ('events', 'event_parts'):
+            cursor.execute(
+                f'UPDATE {table} SET drive_file_id = NULL, drive_parent_id = NULL, drive_drift = NULL '
+                f'WHERE drive_file_id = ?',
+                (drive_file_id,))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error clearing Drive file {drive_file_id}: {e}")
+    finally:
+        conn.close()
+
+
+def select_drive_drift_counts(db_path=DB_PATH):
+    """
+    :return: {drift: number of events and parts} for uploads that no longer match Drive
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT drive_drift, COUNT(*) FROM ('
+            '  SELECT drive_drift FROM events WHERE drive_drift IS NOT NULL'
+            '  UNION ALL SELECT drive_drift FROM event_parts WHERE drive_drift IS NOT NULL'
+            ') GROUP BY drive_drift')
+        return dict(cursor.fetchall())
+    except Exception as e:
+        logging.error(f"Error counting Drive drift: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def get_sync_cursor(source, db_path=DB_PATH):
+    """
+    :param source: feed name, e.g. 'drive_changes:<account>'
+    :return: the stored page token of `source`, or None
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT page_token FROM sync_cursors WHERE source = ?', (source,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logging.error(f"Error reading sync cursor {source}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def set_sync_cursor(source, page_token, db_path=DB_PATH):
+    """
+    Stores the position of an incremental feed.
+    :param source: feed name
+    :param page_token: position to resume from
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO sync_cursors (source, page_token, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(source) DO UPDATE SET page_token = excluded.page_token, updated_at = excluded.updated_at',
+            (source, page_token, time.time()))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error storing sync cursor {source}: {e}")
+    finally:
+        conn.close()
+
+
+def get_event_cursor(source, db_path=DB_PATH):
+    """
+    :param source: listing name, e.g. 'frigate_events'
+    :return: dict with last_start_time, last_event_id, resume_before, resume_start_time,
+             resume_event_id and resume_hold, or None if `source` has no cursor yet
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT last_start_time, last_event_id, resume_before, resume_start_time, resume_event_id, resume_hold '
+            'FROM sync_cursors WHERE source = ?', (source,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ('last_start_time', 'last_event_id', 'resume_before', 'resume_start_time', 'resume_event_id',
+                'resume_hold')
+        return dict(zip(keys, row))
+    except Exception as e:
+        logging.error(f"Error reading event cursor {source}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def save_event_cursor(source, last_start_time, last_event_id, resume_before=None, resume_start_time=None,
+                      resume_event_id=None, resume_hold=None, db_path=DB_PATH):
+    """
+    Stores the position of an event listing. The resume_* values describe a
+    sync in progress and are None once it completed.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO sync_cursors (source, last_start_time, last_event_id, resume_before, resume_start_time, '
+            'resume_event_id, resume_hold, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(source) DO UPDATE SET last_start_time = excluded.last_start_time, '
+            'last_event_id = excluded.last_event_id, resume_before = excluded.resume_before, '
+            'resume_start_time = excluded.resume_start_time, resume_event_id = excluded.resume_event_id, '
+            'resume_hold = excluded.resume_hold, updated_at = excluded.updated_at',
+            (source, last_start_time, last_event_id, resume_before, resume_start_time, resume_event_id,
+             resume_hold, time.time()))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error storing event cursor {source}: {e}")
+    finally:
+        conn.close()
+
+
 def get_latest_event_start_time(db_path=DB_PATH):
     """
     Retrieves the start_time of the most recent event from the database.
+    Only used to seed the event-listing cursor (see src/event_sync.py).
     """
     conn = sqlite3.connect(db_path)
     try:
@@ -353,6 +1092,11 @@ def get_health_stats(db_path=DB_PATH):
       - pending_1d_2d: pending events 1-2 days old
       - pending_2d_3d: pending events 2-3 days old
       - pending_gt_3d: pending events older than 3 days (critical)
+      - pending_deferred: pending events waiting for an off-peak upload
+        window. Excluded from the age buckets above; they wait on purpose.
+      - pending_by_camera: list of (camera, pending_count, oldest_age_hours)
+        for retryable pending events, most lagging camera first. Camera is
+        None for events recorded before the camera column existed.
       - oldest_pending_age_days: age in days of oldest pending event (None if none)
       - oldest_pending_event_id: id of oldest pending event (None if none)
       - total_uploaded: total successfully uploaded events ever
@@ -364,12 +1108,14 @@ def get_health_stats(db_path=DB_PATH):
         "pending_1d_2d": 0,
         "pending_2d_3d": 0,
         "pending_gt_3d": 0,
+        "pending_deferred": 0,
         "oldest_pending_age_days": None,
         "oldest_pending_event_id": None,
         "total_uploaded": 0,
         # List of (kind, count) tuples, sorted desc by count. Includes only
         # pending events (uploaded=0) with a recorded last_error_kind.
         "pending_error_kinds": [],
+        "pending_by_camera": [],
     }
     conn = sqlite3.connect(db_path)
     try:
@@ -393,30 +1139,37 @@ def get_health_stats(db_path=DB_PATH):
         stats["pending_non_retryable"] = cursor.fetchone()[0]
 
         cursor.execute(
-            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND created >= datetime('now', '-1 day')"
+            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND retry > 0 AND deferred = 1"
+        )
+        stats["pending_deferred"] = cursor.fetchone()[0]
+
+        cursor.execute(
+            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND deferred = 0 "
+            "AND created >= datetime('now', '-1 day')"
         )
         stats["pending_lt_1d"] = cursor.fetchone()[0]
 
         cursor.execute(
-            "SELECT COUNT(*) FROM events WHERE uploaded = 0 "
+            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND deferred = 0 "
             "AND created < datetime('now', '-1 day') AND created >= datetime('now', '-2 day')"
         )
         stats["pending_1d_2d"] = cursor.fetchone()[0]
 
         cursor.execute(
-            "SELECT COUNT(*) FROM events WHERE uploaded = 0 "
+            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND deferred = 0 "
             "AND created < datetime('now', '-2 day') AND created >= datetime('now', '-3 day')"
         )
         stats["pending_2d_3d"] = cursor.fetchone()[0]
 
         cursor.execute(
-            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND created < datetime('now', '-3 day')"
+            "SELECT COUNT(*) FROM events WHERE uploaded = 0 AND deferred = 0 "
+            "AND created < datetime('now', '-3 day')"
         )
         stats["pending_gt_3d"] = cursor.fetchone()[0]
 
         cursor.execute(
             "SELECT event_id, CAST((julianday('now') - julianday(created)) AS REAL) "
-            "FROM events WHERE uploaded = 0 AND retry > 0 ORDER BY created ASC LIMIT 1"
+            "FROM events WHERE uploaded = 0 AND retry > 0 AND deferred = 0 ORDER BY created ASC LIMIT 1"
         )
         row = cursor.fetchone()
         if row:
@@ -429,6 +1182,15 @@ def get_health_stats(db_path=DB_PATH):
             "GROUP BY last_error_kind ORDER BY COUNT(*) DESC"
         )
         stats["pending_error_kinds"] = [(row[0], row[1]) for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT camera, COUNT(*), (julianday('now') - julianday(MIN(created))) * 24 FROM events "
+            "WHERE uploaded = 0 AND retry > 0 "
+            "GROUP BY camera ORDER BY MIN(created) ASC"
+        )
+        stats["pending_by_camera"] = [
+            (row[0], row[1], round(row[2], 1)) for row in cursor.fetchall()
+        ]
     except Exception as e:
         logging.error(f"Error collecting health stats: {e}")
     finally:
@@ -480,6 +1242,10 @@ def cleanup_old_events(db_path=DB_PATH):
             'DELETE FROM events WHERE created <= datetime("now", ? || " days")',
             (f"-{DB_RETENTION_DAYS}",)
         )
+        cursor.execute(
+            'DELETE FROM event_parts WHERE uploaded_at <= ?',
+            (time.time() - DB_RETENTION_DAYS * 86400,)
+        )
         conn.commit()
 
         total = uploaded_deleted + pending_deleted
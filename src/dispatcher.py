@@ -0,0 +1,151 @@
+"""
+Continuous, event-driven dispatcher for the retry queue and the Frigate listing.
+
+Replaces the fixed 10-minute APScheduler interval job. A single long-running
+thread sleeps until the earliest of:
+
+  - the earliest `next_attempt_at` of a pending event (retry due),
+  - the next Frigate listing tick (catch-up for missed MQTT messages),
+  - an explicit `wake()` (connectivity recovered, Frigate circuit closed, an
+    event was (re)scheduled by the MQTT path, ...),
+
+and then dispatches work immediately. Because there is only one dispatcher
+thread, a pass that takes longer than the listing interval simply delays the
+next pass instead of being skipped (APScheduler's `max_instances`).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        retry_pending: Callable[[], None],
+        fetch_new: Callable[[], None],
+        next_due_at: Callable[[], Optional[float]],
+        can_dispatch: Callable[[], bool] = lambda: True,
+        listing_interval: float = 600.0,
+        stall_delay: float = 60.0,
+        idle_max: float = 600.0,
+    ):
+        self.retry_pending = retry_pending
+        self.fetch_new = fetch_new
+        self.next_due_at = next_due_at
+        self.can_dispatch = can_dispatch
+        self.listing_interval = listing_interval
+        # Safety net only: every path that leaves a due event alone (running
+        # event, outage) pushes its next_attempt_at forward. Should a pass
+        # still leave due events behind, wait this long so the loop cannot spin.
+        self.stall_delay = stall_delay
+        self.idle_max = idle_max
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_listing_at = 0.0
+        self._stalled_until = 0.0
+        self._blocked_until = 0.0
+        self._not_before = 0.0
+        self._last_wake_reason: Optional[str] = None
+        self._last_pass_at: Optional[float] = None
+        self._last_pass_seconds: Optional[float] = None
+        self._sleeping_until: Optional[float] = None
+
+    # ------------------------------------------------------------------ control
+    def start(self, initial_delay: float = 0.0) -> threading.Thread:
+        if self._thread is not None:
+            return self._thread
+        self._next_listing_at = time.time() + initial_delay
+        self._not_before = self._next_listing_at
+        self._thread = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self, reason: str = "signal") -> None:
+        """Dispatch as soon as possible. Cheap; safe to call from any thread."""
+        self._last_wake_reason = reason
+        # An external signal (recovery, new schedule) lifts both guards.
+        self._stalled_until = 0.0
+        self._blocked_until = 0.0
+        self._wake.set()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "running": self.is_alive(),
+            "last_pass_age_seconds": round(now - self._last_pass_at) if self._last_pass_at else None,
+            "last_pass_seconds": round(self._last_pass_seconds, 1) if self._last_pass_seconds is not None else None,
+            "next_wake_in_seconds": (
+                max(0, round(self._sleeping_until - now)) if self._sleeping_until else None
+            ),
+            "next_listing_in_seconds": max(0, round(self._next_listing_at - now)),
+            "last_wake_reason": self._last_wake_reason,
+        }
+
+    # --------------------------------------------------------------- internals
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch_once()
+            except Exception as e:
+                logging.error(f"Dispatcher pass failed: {e}", exc_info=True)
+                self._stalled_until = time.time() + self.stall_delay
+            wait = self._seconds_until_next_work()
+            self._sleeping_until = time.time() + wait
+            self._wake.wait(wait)
+            self._wake.clear()
+            self._sleeping_until = None
+
+    def _dispatch_once(self) -> None:
+        now = time.time()
+        if now < max(self._blocked_until, self._not_before):
+            return
+        retry_due = self._retry_due(now)
+        listing_due = now >= self._next_listing_at
+        if not (retry_due or listing_due):
+            return
+        if not self.can_dispatch():
+            # Offline or Frigate circuit open: the corresponding listeners
+            # wake us on recovery; until then only re-check occasionally.
+            logging.debug("Dispatcher: work is due but dispatching is blocked. Waiting for a wake-up.")
+            self._blocked_until = now + self.stall_delay
+            return
+
+        started = time.time()
+        if retry_due:
+            self.retry_pending()
+            next_due = self.next_due_at()
+            if next_due is not None and next_due <= started:
+                self._stalled_until = time.time() + self.stall_delay
+        if listing_due:
+            self._next_listing_at = started + self.listing_interval
+            self.fetch_new()
+        self._last_pass_at = started
+        self._last_pass_seconds = time.time() - started
+
+    def _retry_due(self, now: float) -> bool:
+        if now < self._stalled_until:
+            return False
+        next_due = self.next_due_at()
+        return next_due is not None and next_due <= now
+
+    def _seconds_until_next_work(self) -> float:
+        now = time.time()
+        candidates = [self._next_listing_at, now + self.idle_max]
+        next_due = self.next_due_at()
+        if next_due is not None:
+            candidates.append(max(next_due, self._stalled_until))
+        next_work = max(min(candidates), self._blocked_until, self._not_before)
+        return min(max(0.5, next_work - now), self.idle_max)
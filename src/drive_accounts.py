@@ -0,0 +1,295 @@
+"""
+Pool of Google Drive accounts for uploads (DRIVE_ACCOUNTS).
+
+Drive limits uploads per user: a daily upload quota and per-user rate limits
+(429, or 403 `userRateLimitExceeded`). A single account caps the whole
+system. DRIVE_ACCOUNTS lists several accounts as comma-separated
+`<service account file>[=<user to impersonate>]` entries (`=<user>` alone
+uses SERVICE_ACCOUNT_FILE), and uploads are spread across them. Without
+DRIVE_ACCOUNTS the pool holds the single SERVICE_ACCOUNT_FILE /
+GOOGLE_ACCOUNT_TO_IMPERSONATE account, as before.
+
+Each account has its own Drive clients (one per lane: clip uploads,
+snapshots and the changes-feed reconciliation), its own locks, its own bytes-per-day accounting and its own
+backoff state. A quota error puts only that account on hold, and the
+upload moves on to the next one. DRIVE_ACCOUNT_STRATEGY picks the account
+for each file:
+
+  - `round_robin`: the available accounts in turn.
+  - `least_throttled`: the account that was throttled longest ago (never
+    throttled first), then the one with the fewest bytes today.
+  - `camera`: each camera is pinned to one account, so its files always
+    land in the same Drive; falls back to `least_throttled` while that
+    account is on hold.
+
+The account that received a file is recorded in `events.drive_account` /
+`event_parts.drive_account`.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.rate_limiter import parse_rate
+
+load_dotenv()
+
+# 403/429 reasons that mean "this account is over a limit", not "this request is wrong".
+QUOTA_REASONS = {
+    'userRateLimitExceeded', 'rateLimitExceeded', 'uploadLimitExceeded',
+    'dailyLimitExceeded', 'quotaExceeded', 'storageQuotaExceeded',
+}
+# Reasons that will not clear within minutes.
+DAILY_REASONS = {'uploadLimitExceeded', 'dailyLimitExceeded', 'storageQuotaExceeded'}
+THROTTLE_BASE_SECONDS = 60
+THROTTLE_MAX_SECONDS = 3600
+# Background client construction at startup (see `DriveAccountPool.start_warmup()`).
+WARMUP_RETRY_SECONDS = 5
+WARMUP_MAX_RETRY_SECONDS = 300
+LANES = ('upload', 'snapshot', 'sync')
+
+
+class DriveAccount:
+    def __init__(self, name: str, service_account_file: str, subject: Optional[str] = None):
+        self.name = name
+        self.service_account_file = service_account_file
+        self.subject = subject
+        self.locks = {lane: threading.Lock() for lane in LANES}
+        self.clients: dict = {}
+        self.init_error: Optional[str] = None
+        self.bytes_today = 0
+        self.files_today = 0
+        self.day = None
+        self.throttled_until = 0.0
+        self.last_throttled_at = None
+        self.consecutive_throttles = 0
+        self.throttles = 0
+
+
+class DriveAccountPool:
+    def __init__(
+        self,
+        accounts: list,
+        strategy: str = 'round_robin',
+        daily_quota_bytes: int = 0,
+        build: Optional[Callable[[str, Optional[str]], object]] = None,
+    ):
+        if not accounts:
+            raise ValueError("At least one Drive account is required")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown Drive account strategy {strategy!r}")
+        self.accounts = accounts
+        self.strategy = strategy
+        self.daily_quota_bytes = daily_quota_bytes
+        self._build = build
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self.ready_after_seconds: Optional[float] = None
+
+    @property
+    def primary(self) -> DriveAccount:
+        return self.accounts[0]
+
+    def client(self, account: DriveAccount, lane: str = 'upload'):
+        """The account's Drive client for `lane`, built on first use."""
+        with self._build_lock:
+            if lane not in account.clients:
+                try:
+                    account.clients[lane] = self._build(account.service_account_file, account.subject)
+                except Exception as e:
+                    account.init_error = str(e)
+                    raise
+                account.init_error = None
+            return account.clients[lane]
+
+    def rebuild(self, account: DriveAccount, lane: str = 'upload') -> None:
+        """Drop the account's `lane` client; the next `client()` builds a new one."""
+        with self._build_lock:
+            account.clients.pop(lane, None)
+
+    def start_warmup(self, lane: str = 'upload') -> threading.Thread:
+        """
+        Build every account's `lane` client on a background thread, so the
+        first upload does not pay for it and a Google outage at boot does
+        not stop the process. Failed builds are retried with backoff
+        (WARMUP_RETRY_SECONDS up to WARMUP_MAX_RETRY_SECONDS) until all
+        clients exist; uploads meanwhile fail and are retried as usual.
+        """
+        if self._warmup_thread is not None:
+            return self._warmup_thread
+        started = time.monotonic()
+
+        def run():
+            delay = WARMUP_RETRY_SECONDS
+            while True:
+                for account in self.accounts:
+                    try:
+                        self.client(account, lane)
+                    except Exception:
+                        pass  # logged by the builder; kept in init_error
+                failed = [account.name for account in self.accounts if lane not in account.clients]
+                if not failed:
+                    self.ready_after_seconds = time.monotonic() - started
+                    logging.info(
+                        f"Google Drive client(s) ready for {len(self.accounts)} account(s) "
+                        f"after {self.ready_after_seconds:.1f}s."
+                    )
+                    return
+                logging.warning(
+                    f"Could not initialise Google Drive for {len(failed)} account(s); retrying in {delay}s."
+                )
+                time.sleep(delay)
+                delay = min(WARMUP_MAX_RETRY_SECONDS, delay * 2)
+
+        self._warmup_thread = threading.Thread(target=run, name="drive-init", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    # ------------------------------------------------------------ selection
+    def is_available(self, account: DriveAccount, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._roll_day(account)
+            if account.throttled_until > now:
+                return False
+            return not self.daily_quota_bytes or account.bytes_today < self.daily_quota_bytes
+
+    def pick(self, camera: Optional[str] = None, exclude=()) -> DriveAccount:
+        """
+        Choose the account for the next file. If every account is on hold,
+        returns the one whose hold ends first (the upload then fails and is
+        retried like any other Drive error).
+        """
+        now = time.time()
+        candidates = [a for a in self.accounts if a.name not in exclude and self.is_available(a, now)]
+        if not candidates:
+            pool = [a for a in self.accounts if a.name not in exclude] or self.accounts
+            return min(pool, key=lambda a: a.throttled_until)
+        if len(candidates) == 1:
+            return candidates[0]
+        return STRATEGIES[self.strategy](self, candidates, camera)
+
+    # ----------------------------------------------------------- accounting
+    def record_upload(self, account: DriveAccount, nbytes: int) -> None:
+        with self._lock:
+            self._roll_day(account)
+            account.bytes_today += nbytes
+            account.files_today += 1
+            account.consecutive_throttles = 0
+
+    def record_throttle(self, account: DriveAccount, reason: Optional[str] = None,
+                        retry_after: Optional[float] = None) -> float:
+        """Put an account on hold after a quota error. Returns the hold in seconds."""
+        now = time.time()
+        with self._lock:
+            account.consecutive_throttles += 1
+            account.throttles += 1
+            account.last_throttled_at = now
+            if reason in DAILY_REASONS:
+                hold = THROTTLE_MAX_SECONDS
+            elif retry_after:
+                hold = retry_after
+            else:
+                hold = min(THROTTLE_MAX_SECONDS, THROTTLE_BASE_SECONDS * 2 ** (account.consecutive_throttles - 1))
+            account.throttled_until = max(account.throttled_until, now + hold)
+        logging.warning(
+            f"Drive account {account.name} hit a quota limit ({reason or 'HTTP 429'}); "
+            f"not using it for {hold:.0f}s."
+        )
+        return hold
+
+    def _roll_day(self, account: DriveAccount) -> None:
+        """Reset the daily counters at UTC midnight. Holds _lock."""
+        today = datetime.now(timezone.utc).date()
+        if account.day != today:
+            account.day = today
+            account.bytes_today = 0
+            account.files_today = 0
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            # Positional names only: account names contain e-mail addresses.
+            return {
+                "strategy": self.strategy,
+                "ready_after_seconds": round(self.ready_after_seconds, 1) if self.ready_after_seconds is not None else None,
+                "accounts": [
+                    {
+                        "account": f"account{i}",
+                        "uploaded_mb_today": round(a.bytes_today / 1e6, 1),
+                        "files_today": a.files_today,
+                        "throttled_for_seconds": max(0, round(a.throttled_until - now)),
+                        "throttles": a.throttles,
+                        "client_ready": 'upload' in a.clients,
+                        "init_error": a.init_error,
+                    }
+                    for i, a in enumerate(self.accounts, start=1)
+                ],
+            }
+
+
+def _round_robin(pool: DriveAccountPool, candidates: list, camera: Optional[str]) -> DriveAccount:
+    return candidates[next(pool._round_robin) % len(candidates)]
+
+
+def _least_throttled(pool: DriveAccountPool, candidates: list, camera: Optional[str]) -> DriveAccount:
+    return min(candidates, key=lambda a: (a.last_throttled_at or 0, a.bytes_today))
+
+
+def _camera_pinned(pool: DriveAccountPool, candidates: list, camera: Optional[str]) -> DriveAccount:
+    pinned = pool.accounts[zlib.crc32((camera or '').encode()) % len(pool.accounts)]
+    if pinned in candidates:
+        return pinned
+    return _least_throttled(pool, candidates, camera)
+
+
+STRATEGIES = {
+    'round_robin': _round_robin,
+    'least_throttled': _least_throttled,
+    'camera': _camera_pinned,
+}
+
+
+def accounts_from_env(default_file: Optional[str], default_subject: Optional[str]) -> list:
+    """Parse DRIVE_ACCOUNTS, or fall back to the single default account."""
+    raw = os.getenv('DRIVE_ACCOUNTS', '').strip()
+    if not raw:
+        return [DriveAccount(default_subject or os.path.basename(default_file or ''), default_file, default_subject)]
+    accounts = []
+    for entry in filter(None, (part.strip() for part in raw.split(','))):
+        file_part, _, subject = entry.partition('=')
+        service_account_file = file_part.strip() or default_file
+        subject = subject.strip() or None
+        name = subject or os.path.basename(service_account_file)
+        if any(account.name == name for account in accounts):
+            name = f"{name}#{len(accounts) + 1}"
+        accounts.append(DriveAccount(name, service_account_file, subject))
+    return accounts
+
+
+def pool_from_env(default_file: Optional[str], default_subject: Optional[str],
+                  build: Callable[[str, Optional[str]], object]) -> DriveAccountPool:
+    """Build the pool from DRIVE_ACCOUNTS, DRIVE_ACCOUNT_STRATEGY and DRIVE_ACCOUNT_DAILY_QUOTA."""
+    strategy = os.getenv('DRIVE_ACCOUNT_STRATEGY', '').strip().lower() or 'round_robin'
+    if strategy not in STRATEGIES:
+        logging.warning(f"Invalid DRIVE_ACCOUNT_STRATEGY value '{strategy}', using round_robin.")
+        strategy = 'round_robin'
+    try:
+        daily_quota = parse_rate(os.getenv('DRIVE_ACCOUNT_DAILY_QUOTA', '0'))
+    except ValueError:
+        logging.warning(f"Invalid DRIVE_ACCOUNT_DAILY_QUOTA value '{os.getenv('DRIVE_ACCOUNT_DAILY_QUOTA')}', ignoring it.")
+        daily_quota = 0
+    return DriveAccountPool(
+        accounts_from_env(default_file, default_subject), strategy=strategy, daily_quota_bytes=daily_quota, build=build,
+    )
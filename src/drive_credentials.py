@@ -0,0 +1,152 @@
+"""
+Shared, proactively refreshed service-account credentials for Drive.
+
+Service-account access tokens live for an hour. Left to google-auth, a token
+is refreshed inside the first request after it expired: after an idle
+stretch the next upload pays for a token exchange while it holds its upload
+lock, and every Drive client (one per account and lane) does so on its own.
+
+`CredentialManager` loads one credentials object per service account file
+and impersonated user and hands that same object to every client built for
+it, so one refresh serves them all. A background thread refreshes each token
+DRIVE_TOKEN_REFRESH_MARGIN_SECONDS before it expires (0 = only on demand, as
+before). On a 401 the upload path calls `invalidate()` and rebuilds its
+client once (see `upload_file()`).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from src.env import float_from_env
+
+load_dotenv()
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+CHECK_INTERVAL_SECONDS = 30
+
+
+class _Entry:
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_seconds: Optional[float] = None
+        self.max_refresh_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+
+class CredentialManager:
+    def __init__(self, scopes: list, refresh_margin_seconds: float = 300):
+        self.scopes = scopes
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def credentials(self, service_account_file: str, subject: Optional[str] = None):
+        """The shared credentials of a service account (optionally impersonating `subject`)."""
+        key = (service_account_file, subject)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                from google.oauth2 import service_account
+                credentials = service_account.Credentials.from_service_account_file(
+                    service_account_file, scopes=self.scopes, subject=subject or None)
+                entry = self._entries[key] = _Entry(credentials)
+            return entry.credentials
+
+    def refresh(self, service_account_file: str, subject: Optional[str] = None) -> bool:
+        """Fetch a new token now. Returns False (and logs) on failure."""
+        entry = self._entries.get((service_account_file, subject))
+        if entry is None:
+            return False
+        from google.auth.transport.requests import Request
+        with entry.lock:
+            started = time.monotonic()
+            try:
+                entry.credentials.refresh(Request())
+            except Exception as e:
+                entry.failures += 1
+                entry.last_error = str(e)
+                logging.warning(f"Refreshing the Google Drive access token failed: {e}")
+                return False
+            elapsed = time.monotonic() - started
+            entry.refreshed_at = time.time()
+            entry.refreshes += 1
+            entry.last_refresh_seconds = elapsed
+            entry.max_refresh_seconds = max(entry.max_refresh_seconds, elapsed)
+            entry.last_error = None
+        logging.debug(f"Google Drive access token refreshed in {elapsed * 1000:.0f} ms.")
+        return True
+
+    def invalidate(self, service_account_file: str, subject: Optional[str] = None) -> None:
+        """Drop the current token (e.g. after a 401); the next request fetches a new one."""
+        entry = self._entries.get((service_account_file, subject))
+        if entry is not None:
+            entry.credentials.token = None
+            entry.credentials.expiry = None
+
+    def _expires_in(self, entry: _Entry) -> Optional[float]:
+        expiry = entry.credentials.expiry  # naive UTC
+        if not entry.credentials.token or expiry is None:
+            return None
+        return (expiry - datetime.utcnow()).total_seconds()
+
+    def start(self) -> Optional[threading.Thread]:
+        if self.refresh_margin_seconds <= 0 or self._thread is not None:
+            return self._thread
+        self._thread = threading.Thread(target=self._run, name="drive-token-refresh", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                keys = list(self._entries)
+            for key in keys:
+                expires_in = self._expires_in(self._entries[key])
+                if expires_in is None or expires_in <= self.refresh_margin_seconds:
+                    self.refresh(*key)
+            if self._stop.wait(CHECK_INTERVAL_SECONDS):
+                return
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "refresh_margin_seconds": self.refresh_margin_seconds,
+            # Positional names only: keys contain e-mail addresses.
+            "credentials": [
+                {
+                    "credential": f"credential{i}",
+                    "token_age_seconds": round(now - e.refreshed_at) if e.refreshed_at else None,
+                    "expires_in_seconds": round(expires_in) if (expires_in := self._expires_in(e)) is not None else None,
+                    "refreshes": e.refreshes,
+                    "failures": e.failures,
+                    "last_refresh_ms": round(e.last_refresh_seconds * 1000) if e.last_refresh_seconds is not None else None,
+                    "max_refresh_ms": round(e.max_refresh_seconds * 1000),
+                    "last_error": e.last_error,
+                }
+                for i, e in enumerate(entries, start=1)
+            ],
+        }
+
+
+credential_manager = CredentialManager(
+    scopes=SCOPES,
+    refresh_margin_seconds=float_from_env('DRIVE_TOKEN_REFRESH_MARGIN_SECONDS', 300),
+)
@@ -0,0 +1,163 @@
+"""
+Process-wide governor for Google Drive API calls.
+
+Every Drive request in src/google_drive.py (folder lookups and creation,
+resumable upload chunks, checksum clean-up deletes, the retention cleanup)
+goes through `drive_governor.call()`:
+
+  - Two token buckets sized to Drive's documented limits: queries
+    (DRIVE_API_QUERIES_PER_MINUTE, default 12000 per minute) and writes
+    (DRIVE_API_WRITES_PER_SECOND, default 3 per second sustained: folder and
+    file creation, deletes). Each request takes one query token; creates
+    and deletes also take a write token. 0 disables a bucket.
+  - A global pause. When Drive answers 429 or 403 with a rate-limit reason,
+    every thread holds its next call until the pause is over: the
+    `Retry-After` of the response if present, otherwise 1, 2, 4 ... 64 s
+    (plus jitter) for consecutive errors, as Drive's backoff guidance asks.
+    The first successful call resets the backoff. Daily / storage quota
+    reasons do not pause anything, and with several DRIVE_ACCOUNTS neither
+    does `userRateLimitExceeded`: those are per account, and the account
+    pool holds only the affected account (see src/drive_accounts.py).
+  - Per-operation counters (calls, errors, quota errors) for /status.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.env import float_from_env
+from src.rate_limiter import TokenBucket
+
+load_dotenv()
+
+# Reasons that mean "slow down", as opposed to a per-account daily quota.
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+PAUSE_BASE_SECONDS = 1
+PAUSE_MAX_SECONDS = 64
+
+
+def error_reason(error) -> Optional[str]:
+    """The `reason` of a Drive HttpError (e.g. 'userRateLimitExceeded'), or None."""
+    try:
+        content = error.content.decode('utf-8') if isinstance(error.content, bytes) else error.content
+        return json.loads(content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def retry_after(error) -> Optional[float]:
+    """Seconds from the Retry-After header of a Drive HttpError, or None."""
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def is_rate_limited(error) -> bool:
+    """True for a 429, or a 403 whose reason is a rate limit."""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return status == 429 or (status == 403 and error_reason(error) in RATE_LIMIT_REASONS)
+
+
+class DriveApiGovernor:
+    def __init__(self, queries_per_minute: float = 12000, writes_per_second: float = 3):
+        self.queries = TokenBucket('drive_api_queries', queries_per_minute / 60)
+        self.writes = TokenBucket('drive_api_writes', writes_per_second)
+
+        # False with several Drive accounts: per-user limits are left to the pool.
+        self.pause_on_user_limits = True
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._consecutive_limits = 0
+        self._pauses = 0
+        self._waited_seconds = 0.0
+        # op -> [calls, errors, rate_limited]
+        self._ops: dict = {}
+
+    def pause_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def pause(self, seconds: float, reason: str = '') -> None:
+        """Hold every Drive call for `seconds` (extends, never shortens, a running pause)."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until <= self._paused_until:
+                return
+            self._paused_until = until
+            self._pauses += 1
+        logging.warning(f"Drive API rate limit hit ({reason or 'HTTP 429'}); pausing all Drive calls for {seconds:.1f}s.")
+
+    def _wait(self, write: bool) -> None:
+        while True:
+            remaining = self.pause_remaining()
+            if remaining <= 0:
+                break
+            with self._lock:
+                self._waited_seconds += remaining
+            time.sleep(remaining)
+        self.queries.consume(1)
+        if write:
+            self.writes.consume(1)
+
+    def call(self, op: str, fn: Callable, write: bool = False):
+        """
+        Run one Drive request `fn()` (e.g. ``request.execute``) as operation
+        `op`, after the pause and the buckets allow it. Errors are re-raised
+        unchanged; rate-limit errors start or extend the global pause.
+        """
+        self._wait(write)
+        with self._lock:
+            counts = self._ops.setdefault(op, [0, 0, 0])
+            counts[0] += 1
+        try:
+            result = fn()
+        except Exception as e:
+            limited = is_rate_limited(e) and (
+                self.pause_on_user_limits or error_reason(e) != 'userRateLimitExceeded'
+            )
+            with self._lock:
+                counts[1] += 1
+                if limited:
+                    counts[2] += 1
+                    self._consecutive_limits += 1
+                    backoff = min(PAUSE_MAX_SECONDS, PAUSE_BASE_SECONDS * 2 ** (self._consecutive_limits - 1))
+            if limited:
+                self.pause(retry_after(e) or backoff + random.uniform(0, 1), error_reason(e))
+            raise
+        if self._consecutive_limits:
+            with self._lock:
+                self._consecutive_limits = 0
+        return result
+
+    def execute(self, request, op: str, write: bool = False):
+        """`call()` for a googleapiclient request object."""
+        return self.call(op, request.execute, write=write)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "queries_per_minute": round(self.queries.rate * 60),
+                "writes_per_second": self.writes.rate,
+                "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+                "pauses": self._pauses,
+                "waited_seconds": round(self._waited_seconds, 1),
+                "calls": {
+                    op: {"calls": calls, "errors": errors, "rate_limited": limited}
+                    for op, (calls, errors, limited) in sorted(self._ops.items())
+                },
+            }
+
+
+drive_governor = DriveApiGovernor(
+    queries_per_minute=float_from_env('DRIVE_API_QUERIES_PER_MINUTE', 12000),
+    writes_per_second=float_from_env('DRIVE_API_WRITES_PER_SECOND', 3),
+)
@@ -0,0 +1,185 @@
+"""
+Reconciliation of the database with Drive (DRIVE_RECONCILE_INTERVAL_MINUTES).
+
+Clips deleted or moved in Drive by hand, and folders removed while their IDs
+are still in the folder cache, are invisible to the uploader. Listing the
+whole tree to find them costs one request per 1000 files. Instead, the
+reconciler follows Drive's changes feed: the first run stores a
+`changes.startPageToken` per account in `sync_cursors`, and every later run
+reads only what changed since then (`changes.list`), checkpointing the page
+token after each page. The cost scales with the number of changes, not with
+the size of the tree.
+
+For every change it:
+
+  - drops cached folder IDs of folders that were removed, trashed, renamed
+    or moved, so the next upload looks them up (or creates them) again;
+  - sets `drive_drift` of the event or part whose uploaded file was trashed,
+    deleted, moved to another folder or modified, and clears it again when
+    the file is restored.
+
+Drift counts are reported in /status. Files the application deletes itself
+(retention cleanup) are forgotten before their removal shows up in the feed.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from src import database
+from src.drive_governor import drive_governor
+from src.env import float_from_env
+from src.google_drive import drive_accounts, get_drive_service, invalidate_folder_cache
+
+load_dotenv()
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+PAGE_SIZE = 1000
+CHANGE_FIELDS = (
+    'nextPageToken, newStartPageToken, '
+    'changes(fileId, removed, file(name, mimeType, trashed, parents, md5Checksum))'
+)
+
+
+def _drift(change: dict, record: tuple) -> Optional[str]:
+    """How the file of a change differs from the upload recorded as ``(md5, drive_parent_id, drive_drift)``."""
+    md5, parent_id, _ = record
+    file = change.get('file') or {}
+    if change.get('removed'):
+        return 'deleted'
+    if file.get('trashed'):
+        return 'trashed'
+    if md5 and file.get('md5Checksum') and file['md5Checksum'] != md5:
+        return 'modified'
+    if parent_id and file.get('parents') is not None and parent_id not in file['parents']:
+        return 'moved'
+    return None
+
+
+class DriveReconciler:
+    def __init__(self, interval_minutes: float = 60):
+        self.interval_minutes = interval_minutes
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._pages = 0
+        self._changes = 0
+        self._folders_invalidated = 0
+        self._drift_found = 0
+        self._drift: dict = {}
+        self._last_run_at: Optional[float] = None
+        self._last_seconds: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_minutes > 0
+
+    def run(self) -> None:
+        """Consume the changes feed of every Drive account."""
+        started = time.monotonic()
+        error = None
+        for account in drive_accounts.accounts:
+            try:
+                self._reconcile_account(account)
+            except Exception as e:
+                error = str(e)
+                logging.warning(f"Drive reconciliation failed for one account: {e}")
+        drift = database.select_drive_drift_counts()
+        with self._lock:
+            self._runs += 1
+            self._drift = drift
+            self._last_run_at = time.time()
+            self._last_seconds = time.monotonic() - started
+            self._last_error = error
+
+    def _reconcile_account(self, account) -> None:
+        source = f"drive_changes:{account.name}"
+        drive_service = get_drive_service(account, 'sync')
+        with account.locks['sync']:
+            token = database.get_sync_cursor(source)
+            if token is None:
+                self._reset_cursor(drive_service, source)
+                logging.info("Drive reconciliation: recorded the starting point of the changes feed.")
+                return
+            while token:
+                try:
+                    page = drive_governor.execute(
+                        drive_service.changes().list(
+                            pageToken=token, spaces='drive', pageSize=PAGE_SIZE, fields=CHANGE_FIELDS,
+                            includeItemsFromAllDrives=True, supportsAllDrives=True,
+                        ),
+                        'changes.list',
+                    )
+                except Exception as e:
+                    if getattr(getattr(e, 'resp', None), 'status', None) in (400, 404):
+                        # Page token expired or unknown: start over from now.
+                        logging.warning(f"Drive changes page token was rejected ({e}); starting a new baseline.")
+                        self._reset_cursor(drive_service, source)
+                        return
+                    raise
+                self._apply(account, page.get('changes', []))
+                token = page.get('nextPageToken')
+                # Checkpoint per page: an interrupted run resumes here.
+                database.set_sync_cursor(source, token or page['newStartPageToken'])
+                with self._lock:
+                    self._pages += 1
+
+    def _reset_cursor(self, drive_service, source: str) -> None:
+        response = drive_governor.execute(
+            drive_service.changes().getStartPageToken(supportsAllDrives=True), 'changes.getStartPageToken'
+        )
+        database.set_sync_cursor(source, response['startPageToken'])
+
+    def _apply(self, account, changes: list) -> None:
+        latest = {change['fileId']: change for change in changes if change.get('fileId')}
+        folders_invalidated = 0
+        for file_id, change in latest.items():
+            file = change.get('file') or {}
+            if change.get('removed') or file.get('trashed'):
+                folders_invalidated += invalidate_folder_cache(account, file_id)
+            elif file.get('mimeType') == FOLDER_MIME_TYPE:
+                folders_invalidated += invalidate_folder_cache(
+                    account, file_id, name=file.get('name'), parents=file.get('parents') or [],
+                )
+
+        records = database.select_drive_file_records(latest)
+        updates = []
+        for file_id, record in records.items():
+            drift = _drift(latest[file_id], record)
+            if drift != record[2]:
+                updates.append((file_id, drift))
+        if updates:
+            database.update_drive_drift(updates)
+            found = sum(1 for _, drift in updates if drift)
+            if found:
+                logging.warning(f"Drive reconciliation: {found} uploaded file(s) were changed or removed in Drive.")
+        else:
+            found = 0
+        with self._lock:
+            self._changes += len(changes)
+            self._folders_invalidated += folders_invalidated
+            self._drift_found += found
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "interval_minutes": self.interval_minutes,
+                "runs": self._runs,
+                "pages": self._pages,
+                "changes_seen": self._changes,
+                "folders_invalidated": self._folders_invalidated,
+                "drift": dict(self._drift),
+                "drift_detected": self._drift_found,
+                "last_run_at": self._last_run_at,
+                "last_run_seconds": round(self._last_seconds, 1) if self._last_seconds is not None else None,
+                "last_error": self._last_error,
+            }
+
+
+drive_reconciler = DriveReconciler(interval_minutes=float_from_env('DRIVE_RECONCILE_INTERVAL_MINUTES', 60))
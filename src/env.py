@@ -0,0 +1,45 @@
+"""
+Parsing helpers for settings read from environment variables.
+
+Settings are parsed when their module is imported. A bad value must not stop
+the process, so these helpers log a warning and fall back to the default.
+"""
+
+import logging
+import os
+
+
+def parse_bool_env(value, default=False):
+    """
+    Parses a boolean env var. Accepts the usual suspects (case-insensitive):
+      true/false, yes/no, on/off, 1/0, y/n, t/f.
+    Returns `default` for None or unrecognised values.
+    """
+    if value is None:
+        return default
+    v = value.strip().lower()
+    if v in ('1', 'true', 'yes', 'on', 'y', 't'):
+        return True
+    if v in ('0', 'false', 'no', 'off', 'n', 'f', ''):
+        return False
+    return default
+
+
+def float_from_env(name, default, minimum=0.0):
+    """Env var `name` as a float of at least `minimum`; `default` if unset, empty or invalid."""
+    value = os.getenv(name)
+    try:
+        return max(minimum, float(value or default))
+    except ValueError:
+        logging.warning(f"Invalid {name} value '{value}', using {default}.")
+        return default
+
+
+def int_from_env(name, default, minimum=0):
+    """Env var `name` as an int of at least `minimum`; `default` if unset, empty or invalid."""
+    value = os.getenv(name)
+    try:
+        return max(minimum, int(value or default))
+    except ValueError:
+        logging.warning(f"Invalid {name} value '{value}', using {default}.")
+        return default
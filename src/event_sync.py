@@ -0,0 +1,141 @@
+"""
+Incremental listing of Frigate events with a persisted cursor.
+
+The dispatcher lists new events on Frigate every FRIGATE_POLL_INTERVAL_SECONDS
+to catch events whose MQTT message was missed. The listing keeps its position
+in `sync_cursors` (source 'frigate_events') instead of deriving it from
+MAX(events.start_time) on every tick:
+
+  - Each sync lists events that started after the cursor minus
+    EVENT_SYNC_OVERLAP_SECONDS, newest first, page by page. The overlap
+    catches events Frigate reports late; events the database already knows
+    are dropped with one bulk lookup per page.
+  - Events still in progress hold the cursor at their start time (for at
+    most MAX_HOLD_SECONDS), so an event that started before the cursor but
+    ends after it is listed again once it has ended, instead of arriving
+    only through MQTT.
+  - After each page the cursor is checkpointed, together with the `before`
+    of the next page. An interrupted sync resumes at that page; the new
+    cursor is committed only when the last page has been processed.
+
+The page handler records new events in the database before a checkpoint is
+written, so after a crash the retry dispatcher still has them.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src import database
+from src.env import float_from_env
+
+load_dotenv()
+
+SOURCE = 'frigate_events'
+PAGE_SIZE = 100
+# Longest an in-progress event holds the cursor back.
+MAX_HOLD_SECONDS = 6 * 3600
+# Frigate's `before` is exclusive; stepping just past the oldest start time of
+# a page keeps events with the same start time on the next page (deduped).
+_TIE_EPSILON = 0.001
+
+
+class EventSync:
+    def __init__(self, overlap_seconds: float = 300, page_size: int = PAGE_SIZE, source: str = SOURCE):
+        self.overlap_seconds = overlap_seconds
+        self.page_size = page_size
+        self.source = source
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._resumed = 0
+        self._pages = 0
+        self._events_seen = 0
+        self._events_new = 0
+        self._watermark: Optional[float] = None
+        self._last_run_at: Optional[float] = None
+
+    def run(self, fetch_page: Callable, process_page: Callable) -> Optional[int]:
+        """
+        Run one sync. ``fetch_page(after, before, limit)`` returns a page of
+        events, newest first, or None if Frigate is unreachable;
+        ``process_page(events)`` handles a page and returns the number of
+        new events in it.
+
+        Returns the number of new events, or None if a page could not be
+        fetched (the next sync resumes at the last checkpoint).
+        """
+        cursor = database.get_event_cursor(self.source)
+        if cursor is None:
+            # First sync: continue where the MAX(start_time) watermark was.
+            cursor = {'last_start_time': database.get_latest_event_start_time() or None}
+        last_start = cursor.get('last_start_time')
+        last_id = cursor.get('last_event_id')
+        after = max(0.0, last_start - self.overlap_seconds) if last_start else None
+        before = cursor.get('resume_before')
+        high_start = cursor.get('resume_start_time') or last_start
+        high_id = cursor.get('resume_event_id') or last_id
+        hold = cursor.get('resume_hold')
+        if before is not None:
+            logging.info(f"Resuming the interrupted event listing before {before}.")
+            with self._lock:
+                self._resumed += 1
+
+        new_events = 0
+        while True:
+            page = fetch_page(after, before, self.page_size)
+            if page is None:
+                return None
+            if page:
+                new_events += process_page(page)
+                newest = max(page, key=lambda e: (e['start_time'], e['id']))
+                if high_start is None or (newest['start_time'], newest['id']) > (high_start, high_id or ''):
+                    high_start, high_id = newest['start_time'], newest['id']
+                running = [e['start_time'] for e in page if e.get('end_time') is None]
+                if running:
+                    hold = min(running + ([hold] if hold is not None else []))
+                with self._lock:
+                    self._pages += 1
+                    self._events_seen += len(page)
+            if len(page) < self.page_size:
+                break
+            oldest = page[-1]['start_time']
+            next_before = oldest + _TIE_EPSILON
+            before = next_before if before is None or next_before < before else oldest
+            database.save_event_cursor(
+                self.source, last_start, last_id,
+                resume_before=before, resume_start_time=high_start, resume_event_id=high_id, resume_hold=hold,
+            )
+
+        watermark, watermark_id = high_start, high_id
+        if hold is not None:
+            hold = max(hold, time.time() - MAX_HOLD_SECONDS)
+            if watermark is None or hold < watermark:
+                watermark, watermark_id = hold, None
+        database.save_event_cursor(self.source, watermark, watermark_id)
+        with self._lock:
+            self._runs += 1
+            self._events_new += new_events
+            self._watermark = watermark
+            self._last_run_at = time.time()
+        return new_events
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "overlap_seconds": self.overlap_seconds,
+                "watermark": self._watermark,
+                "runs": self._runs,
+                "resumed": self._resumed,
+                "pages": self._pages,
+                "events_seen": self._events_seen,
+                "events_new": self._events_new,
+                "last_run_at": self._last_run_at,
+            }
+
+
+event_sync = EventSync(overlap_seconds=float_from_env('EVENT_SYNC_OVERLAP_SECONDS', 300))
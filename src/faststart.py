@@ -0,0 +1,267 @@
+"""
+Optional faststart remux between download and upload (FASTSTART_REMUX).
+
+Frigate writes the `moov` atom (the index) at the end of its clips. Drive's
+web preview then has to fetch most of the file before it can start playing,
+which is slow on a phone when checking an alert. With the remux enabled,
+every downloaded clip is rewritten losslessly with `moov` in front of
+`mdat` before it is committed to the spool:
+
+  - `python`: a box rewriter moves `moov` behind `ftyp` and shifts the chunk
+    offsets (`stco` / `co64`) by its size. Runs as a separate worker process
+    (`python -m src.faststart`), so the copy never competes with the upload
+    threads for the GIL.
+  - `ffmpeg`: `ffmpeg -c copy -movflags +faststart` (must be on PATH).
+
+Clips that already have `moov` first, fragmented clips and clips the
+rewriter cannot handle are uploaded unchanged. The rewritten file is hashed
+while it is written, so the MD5 checked against Drive is that of the remuxed
+clip.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODES = ('off', 'python', 'ffmpeg')
+REMUX_TIMEOUT_SECONDS = 600
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_COPY_CHUNK = 1024 * 1024
+# Containers on the way from `moov` to the chunk offset tables.
+_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class FaststartRemuxer:
+    def __init__(self, mode: str = 'off'):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._remuxed = 0
+        self._unchanged = 0
+        self._failed = 0
+        self._total_seconds = 0.0
+        self._last_seconds = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def process(self, path: str) -> Optional[tuple]:
+        """
+        Rewrite `path` in place with `moov` first. Returns ``(size, md5)`` of
+        the new file, or None if it was left unchanged (already faststart,
+        unsupported layout, or the remux failed).
+        """
+        if not self.enabled:
+            return None
+        started = time.monotonic()
+        tmp_path = path + '.remux.part'
+        try:
+            if self.mode == 'ffmpeg':
+                result = _ffmpeg_remux(path, tmp_path)
+            else:
+                result = _python_remux(path, tmp_path)
+            if result is None:
+                with self._lock:
+                    self._unchanged += 1
+                return None
+            os.replace(tmp_path, path)
+        except Exception as e:
+            detail = (getattr(e, 'stderr', None) or '').strip()[-500:]
+            logging.warning(
+                f"Faststart remux of {os.path.basename(path)} failed, uploading it unchanged: {e} {detail}".rstrip()
+            )
+            _remove(tmp_path)
+            with self._lock:
+                self._failed += 1
+            return None
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._remuxed += 1
+            self._total_seconds += elapsed
+            self._last_seconds = elapsed
+        logging.debug(f"Faststart remux of {os.path.basename(path)} took {elapsed:.2f}s.")
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "remuxed": self._remuxed,
+                "unchanged": self._unchanged,
+                "failed": self._failed,
+                "avg_seconds": round(self._total_seconds / self._remuxed, 2) if self._remuxed else None,
+                "last_seconds": round(self._last_seconds, 2) if self._last_seconds is not None else None,
+            }
+
+
+def _top_level_boxes(fh, file_size):
+    """[(type, offset, size), ...] of the top-level boxes."""
+    boxes = []
+    offset = 0
+    while offset + 8 <= file_size:
+        fh.seek(offset)
+        size, box_type = struct.unpack('>I4s', fh.read(8))
+        if size == 1:
+            size, = struct.unpack('>Q', fh.read(8))
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            raise ValueError(f"invalid box size {size} at offset {offset}")
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+
+def _needs_remux(boxes) -> bool:
+    types = [box[0] for box in boxes]
+    if b'moov' not in types or b'mdat' not in types or b'moof' in types:
+        return False
+    return types.index(b'moov') > types.index(b'mdat')
+
+
+def _shift_chunk_offsets(moov: bytearray, start: int, end: int, shift: int) -> None:
+    """Add `shift` to every stco/co64 entry inside moov[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', moov, offset)
+        header = 8
+        if size == 1:
+            size, = struct.unpack_from('>Q', moov, offset + 8)
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"malformed '{box_type.decode('latin-1')}' box inside moov")
+        body = offset + header
+        if box_type in _CONTAINERS:
+            _shift_chunk_offsets(moov, body, offset + size, shift)
+        elif box_type == b'stco':
+            count, = struct.unpack_from('>I', moov, body + 4)
+            for i in range(count):
+                pos = body + 8 + 4 * i
+                value = struct.unpack_from('>I', moov, pos)[0] + shift
+                if value > 0xFFFFFFFF:
+                    raise OverflowError("32-bit chunk offsets would overflow")
+                struct.pack_into('>I', moov, pos, value)
+        elif box_type == b'co64':
+            count, = struct.unpack_from('>I', moov, body + 4)
+            for i in range(count):
+                pos = body + 8 + 8 * i
+                struct.pack_into('>Q', moov, pos, struct.unpack_from('>Q', moov, pos)[0] + shift)
+        offset += size
+
+
+def _relocate_moov(path: str, tmp_path: str) -> Optional[tuple]:
+    """
+    Worker-process side of the `python` mode: write `path` to `tmp_path`
+    as ftyp, moov, then every other box in its original order. Returns
+    ``(size, md5)`` of `tmp_path`, or None if nothing needs to be done.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as src:
+        boxes = _top_level_boxes(src, file_size)
+        if not _needs_remux(boxes) or boxes[0][0] != b'ftyp':
+            return None
+        _, moov_offset, moov_size = next(box for box in boxes if box[0] == b'moov')
+        if any(box_type == b'mdat' and offset > moov_offset for box_type, offset, _ in boxes):
+            # Media after moov would not move, so one shift does not fit all chunks.
+            return None
+        src.seek(moov_offset)
+        moov = bytearray(src.read(moov_size))
+        if moov[:4] == b'\0\0\0\0':
+            return None  # size 0 means "to end of file", which breaks once moved
+        # Media data all sits before moov, so every chunk moves by its size.
+        try:
+            _shift_chunk_offsets(moov, 0, len(moov), moov_size)
+        except OverflowError:
+            # 32-bit stco near the 4 GB mark; would need a co64 rewrite.
+            return None
+        digest = hashlib.md5()
+        with open(tmp_path, 'wb') as dst:
+            order = [boxes[0], (b'moov', None, None)] + [box for box in boxes[1:] if box[0] != b'moov']
+            for box_type, offset, size in order:
+                if offset is None:
+                    dst.write(moov)
+                    digest.update(moov)
+                    continue
+                src.seek(offset)
+                remaining = size
+                while remaining:
+                    chunk = src.read(min(_COPY_CHUNK, remaining))
+                    if not chunk:
+                        raise ValueError("file shrank while remuxing")
+                    dst.write(chunk)
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+    return file_size, digest.hexdigest()
+
+
+def _python_remux(path: str, tmp_path: str) -> Optional[tuple]:
+    """`python` mode: run `_relocate_moov()` in a worker process."""
+    completed = subprocess.run(
+        [sys.executable, '-m', 'src.faststart', path, tmp_path],
+        cwd=_REPO_ROOT, check=True, capture_output=True, text=True, timeout=REMUX_TIMEOUT_SECONDS,
+    )
+    output = completed.stdout.split()
+    return (int(output[0]), output[1]) if output else None
+
+
+def _ffmpeg_remux(path: str, tmp_path: str) -> Optional[tuple]:
+    """`ffmpeg` mode: remux with -movflags +faststart, then hash the result."""
+    with open(path, 'rb') as fh:
+        if not _needs_remux(_top_level_boxes(fh, os.path.getsize(path))):
+            return None
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found on PATH")
+    subprocess.run(
+        [ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', path,
+         '-map', '0', '-c', 'copy', '-movflags', '+faststart', '-f', 'mp4', tmp_path],
+        check=True, capture_output=True, timeout=REMUX_TIMEOUT_SECONDS,
+    )
+    digest = hashlib.md5()
+    with open(tmp_path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_COPY_CHUNK), b''):
+            digest.update(chunk)
+        os.fsync(fh.fileno())
+    return os.path.getsize(tmp_path), digest.hexdigest()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _mode_from_env() -> str:
+    mode = (os.getenv('FASTSTART_REMUX') or 'off').strip().lower()
+    if mode not in MODES:
+        logging.warning(f"Invalid FASTSTART_REMUX value '{mode}', using 'off'.")
+        return 'off'
+    return mode
+
+
+faststart = FaststartRemuxer(_mode_from_env())
+
+
+if __name__ == '__main__':
+    # Worker process of the `python` mode: prints "<size> <md5>" if rewritten.
+    remuxed = _relocate_moov(sys.argv[1], sys.argv[2])
+    if remuxed:
+        print(*remuxed)
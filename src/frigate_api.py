@@ -1,8 +1,36 @@
 import logging
+import math
 import requests
+import time
+from dotenv import load_dotenv
 from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
 from time import sleep
 
+from src.circuit_breaker import CircuitBreaker
+from src.concurrency_limiter import AIMDLimiter
+from src.env import float_from_env, int_from_env
+
+load_dotenv()
+
+# Shared circuit breaker for every Frigate call. Callers consult
+# `frigate_circuit.allow_request()` (no network I/O) instead of pinging
+# /api/version before each event; real calls below feed it their outcome.
+frigate_circuit = CircuitBreaker(
+    'frigate',
+    failure_threshold=int_from_env('FRIGATE_CIRCUIT_FAILURE_THRESHOLD', 3),
+    reset_timeout=float_from_env('FRIGATE_CIRCUIT_RESET_SECONDS', 30),
+    max_reset_timeout=float_from_env('FRIGATE_CIRCUIT_MAX_RESET_SECONDS', 600),
+)
+
+# Adaptive bound on concurrent clip.mp4 requests (downloads and HEAD probes),
+# each of which makes Frigate assemble the clip from recording segments.
+frigate_clip_limiter = AIMDLimiter(
+    'frigate_clip',
+    initial=int_from_env('FRIGATE_CLIP_CONCURRENCY_INITIAL', 1),
+    max_limit=int_from_env('FRIGATE_CLIP_CONCURRENCY_MAX', 4),
+    ttfb_target=float_from_env('FRIGATE_CLIP_TTFB_TARGET_SECONDS', 15),
+)
+
 
 class EventNotFoundError(Exception):
     """Raised when an event no longer exists on the Frigate server (HTTP 404)."""
@@ -33,8 +61,10 @@ def check_frigate_reachable(frigate_url, timeout=10):
     Default timeout is intentionally short (10 s): `/api/version` is a
     lightweight endpoint that responds in milliseconds when Frigate is alive.
     A long timeout here would only slow down the fail-fast path when the host
-    is actually unreachable. The heavier `fetch_event` / `fetch_all_events`
+    is actually unreachable. The heavier `fetch_event` / `fetch_events_page`
     calls keep their own longer timeouts.
+
+    Does NOT feed `frigate_circuit`: it is used as the breaker's active probe.
     """
     try:
         response = requests.get(f'{frigate_url}/api/version', timeout=timeout)
@@ -47,10 +77,76 @@ def generate_video_url(frigate_url, event_id):
     return f"{frigate_url}/api/events/{event_id}/clip.mp4"
 
 
+def generate_recording_url(frigate_url, camera, start_ts, end_ts):
+    """Clip of a camera's recordings between two Unix timestamps (whole seconds)."""
+    return f"{frigate_url}/api/{camera}/start/{math.floor(start_ts)}/end/{math.ceil(end_ts)}/clip.mp4"
+
+
+def check_clip_available(frigate_url, event_id, timeout=10):
+    """
+    Check if a clip is still available on Frigate via HEAD request.
+
+    Returns a tuple ``(available, size)``:
+      - ``available``: True if available, False if not (404/400), None on
+        network error or an unexpected status.
+      - ``size``: Content-Length in bytes if Frigate reported one, else None.
+    """
+    clip_url = generate_video_url(frigate_url, event_id)
+    with frigate_clip_limiter.slot():
+        started = time.monotonic()
+        try:
+            response = requests.head(clip_url, timeout=timeout)
+        except requests.RequestException as e:
+            # Only a failed connection says Frigate is down. A read timeout means
+            # it is slow assembling the clip: that is for the limiter, not the
+            # circuit (health-report probes would otherwise open it).
+            if isinstance(e, ConnectionError):
+                frigate_circuit.record_failure()
+            if isinstance(e, Timeout):
+                frigate_clip_limiter.on_overload("HEAD timeout")
+            logging.debug(f"Network error checking clip {event_id}")
+            return None, None
+        if response.status_code >= 500:
+            frigate_clip_limiter.on_overload(f"HEAD HTTP {response.status_code}")
+        else:
+            frigate_clip_limiter.on_success(time.monotonic() - started)
+    frigate_circuit.record_success()
+    if response.status_code in (200, 206):
+        content_length = response.headers.get('Content-Length')
+        size = int(content_length) if content_length and content_length.isdigit() else None
+        return True, size
+    if response.status_code in (400, 404):
+        return False, None
+    logging.debug(f"Unexpected status {response.status_code} for clip {event_id}")
+    return None, None
+
+
+def fetch_snapshot(frigate_url, event_id, timeout=30):
+    """
+    Download the snapshot.jpg of an event.
+
+    Returns the JPEG bytes, or None if Frigate has no snapshot for the event.
+    Raises FrigateUnreachableError on network errors and unexpected statuses.
+    """
+    try:
+        response = requests.get(f'{frigate_url}/api/events/{event_id}/snapshot.jpg', timeout=timeout)
+    except requests.RequestException as e:
+        if isinstance(e, (ConnectionError, Timeout)):
+            frigate_circuit.record_failure()
+        raise FrigateUnreachableError(f"Frigate unreachable: {e}")
+    frigate_circuit.record_success()
+    if response.status_code in (400, 404):
+        return None
+    if response.status_code != 200:
+        raise FrigateUnreachableError(f"Unexpected status {response.status_code} for snapshot of event {event_id}")
+    return response.content
+
+
 def fetch_event(frigate_url, event_id, retries=2, timeout=120):
     for attempt in range(retries):
         try:
             response = requests.get(f'{frigate_url}/api/events/{event_id}', timeout=timeout)
+            frigate_circuit.record_success()
             if response.status_code == 404:
                 raise EventNotFoundError(f"Event {event_id} not found on Frigate")
             response.raise_for_status()
@@ -58,6 +154,8 @@ def fetch_event(frigate_url, event_id, retries=2, timeout=120):
         except EventNotFoundError:
             raise
         except (ChunkedEncodingError, ConnectionError, Timeout, requests.HTTPError) as e:
+            if isinstance(e, (ConnectionError, Timeout)):
+                frigate_circuit.record_failure()
             logging.warning(f"Attempt {attempt + 1} failed with error: {e}")
             if attempt < retries - 1:
                 sleep(2)
@@ -66,40 +164,35 @@ def fetch_event(frigate_url, event_id, retries=2, timeout=120):
                 raise FrigateUnreachableError(f"Frigate unreachable: {e}")
 
 
-def fetch_all_events(frigate_url, after=None, batch_size=100, retries=2, timeout=120):
-    all_events = []
-    before = None
-
-    while True:
-        params = {'limit': batch_size, 'has_clip': 1}
-        if before:
-            params['before'] = before
-        elif after:
-            params['after'] = after
-
-        for attempt in range(retries):
-            try:
-                response = requests.get(f'{frigate_url}/api/events', params=params, timeout=timeout)
-                response.raise_for_status()  # Raise an HTTPError for bad responses
-                break  # If the request was successful, exit the retry loop
-            except (ChunkedEncodingError, ConnectionError) as e:
-                logging.warning(f"Attempt {attempt + 1} failed with error: {e}")
-                if attempt < retries - 1:
-                    sleep(2)  # Wait a bit before retrying
-                else:
-                    logging.error(f"All retries failed for fetching events: {e}")
-                    return None
-
-        if response.status_code == 200:
-            events = response.json()
-            if not events:
-                break  # No more events to fetch
-            all_events.extend(events)
-            before = events[-1]['start_time']
-            after = None  # Clear after the first successful fetch
-            logging.debug(f"Fetched {len(events)} events, next 'before' set to {before}")
-        else:
-            logging.error(f"Failed to fetch events: {response.status_code} {response.text}")
-            break
+def fetch_events_page(frigate_url, after=None, before=None, limit=100, retries=2, timeout=120):
+    """
+    One page of /api/events (events with a clip, newest first) with
+    `after` < start_time < `before`.
+
+    :return: list of event dicts (empty when there are no more), or None if
+             Frigate could not be reached or answered with an error
+    """
+    params = {'limit': limit, 'has_clip': 1}
+    if after:
+        params['after'] = after
+    if before:
+        params['before'] = before
 
-    return all_events
\ No newline at end of file
+    for attempt in range(retries):
+        try:
+            response = requests.get(f'{frigate_url}/api/events', params=params, timeout=timeout)
+            frigate_circuit.record_success()
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+            return response.json()
+        except requests.HTTPError as e:
+            logging.error(f"Failed to fetch events: {e}")
+            return None
+        except (ChunkedEncodingError, ConnectionError, Timeout) as e:
+            if isinstance(e, (ConnectionError, Timeout)):
+                frigate_circuit.record_failure()
+            logging.warning(f"Attempt {attempt + 1} failed with error: {e}")
+            if attempt < retries - 1:
+                sleep(2)  # Wait a bit before retrying
+            else:
+                logging.error(f"All retries failed for fetching events: {e}")
+    return None
@@ -1,32 +1,37 @@
+import hashlib
+import io
 import logging
 import os
 import ssl
 import socket
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import time
 import random
 import requests
 from dotenv import load_dotenv
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 from time import sleep
 from datetime import datetime, timedelta
 import pytz
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from src import database
-from src.frigate_api import generate_video_url, ClipNotAvailableError, ClipTooLargeError
+from src.coalescer import coalescer
+from src.drive_accounts import QUOTA_REASONS, pool_from_env
+from src.drive_credentials import credential_manager
+from src.drive_governor import drive_governor, error_reason, is_rate_limited, retry_after
+from src.faststart import faststart
+from src.mp4_check import check_mp4
+from src.rate_limiter import ThrottledReader, drive_upload_bucket, frigate_download_bucket
+from src.progressive import progressive_capture
+from src.spool import spool
+from src.frigate_api import generate_video_url, generate_recording_url, fetch_snapshot, frigate_circuit, frigate_clip_limiter, ClipNotAvailableError, ClipTooLargeError, FrigateUnreachableError
 
 load_dotenv()
 
-# Global lock to serialize Google Drive uploads. The google-auth-httplib2 stack
-# is not thread-safe; concurrent uploads from MQTT + scheduler threads cause
-# SSL record layer failures.
-upload_lock = threading.Lock()
 
 GDRIVE_RETENTION_DAYS = int(os.getenv('GDRIVE_RETENTION_DAYS', 0))
 MAX_CLIP_SIZE_RAW = os.getenv('MAX_CLIP_SIZE', '')
@@ -44,8 +49,6 @@ MAX_RETRY_DELAY = 60  # seconds
 UPLOAD_CHUNK_SIZE = 1024 * 1024 * 10  # 10MB chunks for resumable uploads
 DOWNLOAD_TIMEOUT = (60, 600)  # (connect_timeout, read_timeout) — 10min read, enough for large clips without blocking queue
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
-
 
 # --- Coarse-grained error categories for the daily health report -------------
 # Stored in the `last_error_kind` column. Keep these snake_case and source-prefixed.
@@ -60,6 +63,8 @@ ERR_DRIVE_5XX = 'drive_5xx'
 ERR_DRIVE_HTTP = 'drive_http'
 ERR_DRIVE_NETWORK = 'drive_network'
 ERR_DRIVE_OTHER = 'drive_other'
+ERR_DRIVE_CHECKSUM = 'drive_checksum_mismatch'
+ERR_CLIP_CORRUPT = 'clip_corrupt'
 ERR_UNKNOWN = 'unknown'
 
 
@@ -86,25 +91,29 @@ MAX_CLIP_SIZE_BYTES = _parse_max_clip_size(MAX_CLIP_SIZE_RAW)
 if MAX_CLIP_SIZE_BYTES > 0:
     logging.info(f"MAX_CLIP_SIZE configured: {MAX_CLIP_SIZE_RAW} ({MAX_CLIP_SIZE_BYTES} bytes)")
 
-def get_google_service():
-    """Initialize and return a Google Drive service."""
+def get_google_service(service_account_file=SERVICE_ACCOUNT_FILE, subject=GOOGLE_ACCOUNT_TO_IMPERSONATE):
+    """
+    Initialize and return a Google Drive service for one (optionally impersonated) service account.
+    The Google client libraries are imported here, off the startup path. All
+    services of one account share its credentials from `credential_manager`,
+    which keeps the access token fresh in the background.
+    """
     try:
+        from googleapiclient.discovery import build
+
         # Check if service account file exists
-        if not os.path.isfile(SERVICE_ACCOUNT_FILE):
-            logging.error(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
+        if not os.path.isfile(service_account_file):
+            logging.error(f"Service account file not found at: {service_account_file}")
             logging.error(f"Current working directory: {os.getcwd()}")
-            if os.path.exists(os.path.dirname(SERVICE_ACCOUNT_FILE)):
-                logging.error(f"Directory contents: {os.listdir(os.path.dirname(SERVICE_ACCOUNT_FILE))}")
-            raise FileNotFoundError(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
+            if os.path.exists(os.path.dirname(service_account_file)):
+                logging.error(f"Directory contents: {os.listdir(os.path.dirname(service_account_file))}")
+            raise FileNotFoundError(f"Service account file not found at: {service_account_file}")
             
         # Initialize credentials
-        if GOOGLE_ACCOUNT_TO_IMPERSONATE:
-            credentials = service_account.Credentials.from_service_account_file(
-                SERVICE_ACCOUNT_FILE, scopes=SCOPES, subject=GOOGLE_ACCOUNT_TO_IMPERSONATE)
-            logging.info(f"Using service account with impersonation: {GOOGLE_ACCOUNT_TO_IMPERSONATE}")
+        credentials = credential_manager.credentials(service_account_file, subject)
+        if subject:
+            logging.info(f"Using service account with impersonation: {subject}")
         else:
-            credentials = service_account.Credentials.from_service_account_file(
-                SERVICE_ACCOUNT_FILE, scopes=SCOPES)
             logging.info("Using service account without impersonation")
         
         # Build and return the service
@@ -115,8 +124,37 @@ def get_google_service():
         logging.error(error_msg)
         raise RuntimeError(error_msg) from e
 
-# Initialize the service
-service = get_google_service()
+# Drive accounts uploads are spread across (DRIVE_ACCOUNTS); a single
+# SERVICE_ACCOUNT_FILE account unless configured otherwise.
+drive_accounts = pool_from_env(SERVICE_ACCOUNT_FILE, GOOGLE_ACCOUNT_TO_IMPERSONATE, build=get_google_service)
+drive_governor.pause_on_user_limits = len(drive_accounts.accounts) == 1
+
+# Lock to serialize Google Drive uploads. The google-auth-httplib2 stack is
+# not thread-safe; concurrent uploads from MQTT + scheduler threads cause SSL
+# record layer failures. Every account has one per lane (see
+# src/drive_accounts.py); this is the first account's clip upload lock.
+upload_lock = drive_accounts.primary.locks['upload']
+
+
+
+def get_drive_service(account=None, lane='upload'):
+    """
+    The Drive client of `account` (default: the first one) for `lane`. Built
+    on first use and cached, so importing this module loads no credentials;
+    raises RuntimeError while the client cannot be built. See
+    `start_drive_init()` for building it ahead of the first upload.
+    """
+    return drive_accounts.client(account or drive_accounts.primary, lane)
+
+
+def start_drive_init():
+    """
+    Build the Drive clients on a background thread, retrying until Google
+    answers, and start refreshing their access tokens ahead of expiry.
+    """
+    credential_manager.start()
+    return drive_accounts.start_warmup()
+
 
 # Cache for folder IDs to avoid repeated lookups and improve resilience
 _folder_id_cache = {}
@@ -125,19 +163,24 @@ _folder_id_cache = {}
 folder_creation_lock = threading.Lock()
 
 
-def generate_filename(camera_name, start_time, event_id, label=None):
+def generate_filename(camera_name, start_time, event_id, label=None, part=None, extension='mp4'):
     utc_time = datetime.fromtimestamp(start_time, pytz.utc)
     local_time = utc_time.astimezone(pytz.timezone(TIMEZONE))
     label_part = f"{label}__" if label else ""
-    return f"{local_time.strftime('%Y-%m-%d-%H-%M-%S')}__{camera_name}__{label_part}{event_id}.mp4"
+    part_suffix = f"__part{part:02d}" if part else ""
+    return f"{local_time.strftime('%Y-%m-%d-%H-%M-%S')}__{camera_name}__{label_part}{event_id}{part_suffix}.{extension}"
 
 
-def find_or_create_folder(name, parent_id=None):
+def find_or_create_folder(name, parent_id=None, drive_service=None, account=None):
     """
     Finds a folder by name and parent_id, creating it if it doesn't exist.
     Uses a cache to avoid repeated API calls and improve resilience against network errors.
+    `account` (default: the first one) selects the Drive and the cache
+    namespace; `drive_service` defaults to its clip upload client.
     """
-    cache_key = (parent_id, name)
+    account = account or drive_accounts.primary
+    drive_service = drive_service or get_drive_service(account)
+    cache_key = (account.name, parent_id, name)
     if cache_key in _folder_id_cache:
         logging.debug(f"Found folder '{name}' in cache with ID: {_folder_id_cache[cache_key]}")
         return _folder_id_cache[cache_key]
@@ -154,7 +197,8 @@ def find_or_create_folder(name, parent_id=None):
             if parent_id:
                 query += f" and '{parent_id}' in parents"
 
-            results = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+            results = drive_governor.execute(
+                drive_service.files().list(q=query, spaces='drive', fields='files(id, name)'), 'folders.list')
             folders = results.get('files', [])
 
             if not folders:
@@ -163,7 +207,8 @@ def find_or_create_folder(name, parent_id=None):
                     'mimeType': 'application/vnd.google-apps.folder',
                     'parents': [parent_id] if parent_id else []
                 }
-                folder = service.files().create(body=folder_metadata, fields='id').execute()
+                folder = drive_governor.execute(
+                    drive_service.files().create(body=folder_metadata, fields='id'), 'folders.create', write=True)
                 folder_id = folder.get('id')
                 logging.debug(f"Created folder '{name}' with ID: {folder_id}")
                 _folder_id_cache[cache_key] = folder_id
@@ -175,17 +220,42 @@ def find_or_create_folder(name, parent_id=None):
                 return folder_id
 
         except (HttpError, socket.timeout) as error:
+            if isinstance(error, HttpError) and error.resp.status == 401:
+                raise  # upload_file() fetches a new token and retries
             logging.error(f"An error occurred while finding or creating folder '{name}': {error}")
             return None
 
 
+def invalidate_folder_cache(account, folder_id, name=None, parents=None):
+    """
+    Drop cached folder IDs that no longer hold (see src/drive_reconcile.py):
+    every entry of `folder_id` unless it still has `name` under one of
+    `parents` (None: the folder is gone), and, if it is gone, the entries of
+    its subfolders. Returns the number of entries removed.
+    """
+    with folder_creation_lock:
+        stale = [
+            key for key, cached_id in _folder_id_cache.items()
+            if key[0] == account.name and (
+                (cached_id == folder_id and (
+                    parents is None or key[2] != name or (key[1] is not None and key[1] not in parents)
+                ))
+                or (parents is None and key[1] == folder_id)
+            )
+        ]
+        for key in stale:
+            del _folder_id_cache[key]
+    return len(stale)
+
+
 def get_folder_id(drive_service, folder_name, parent_id):
     try:
         query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
         if parent_id:
             query += f" and '{parent_id}' in parents"
 
-        results = drive_service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+        results = drive_governor.execute(
+            drive_service.files().list(q=query, spaces='drive', fields='files(id, name)'), 'folders.list')
         folders = results.get('files', [])
 
         if not folders:
@@ -224,16 +294,17 @@ def cleanup_old_files_on_drive(drive_service):
         query = f"mimeType='video/mp4' and trashed=false and createdTime < '{cutoff_iso}'"
         page_token = None
         while True:
-            response = drive_service.files().list(q=query,
-                                                  spaces='drive',
-                                                  fields='nextPageToken, files(id, name, parents)',
-                                                  pageToken=page_token).execute()
+            response = drive_governor.execute(drive_service.files().list(q=query,
+                                                                         spaces='drive',
+                                                                         fields='nextPageToken, files(id, name, parents)',
+                                                                         pageToken=page_token), 'cleanup.list')
             for file in response.get('files', []):
                 file_id = file.get('id')
                 file_name = file.get('name')
                 parent_folders = file.get('parents')
                 logging.info(f"Deleting old file: {file_name} (ID: {file_id})")
-                drive_service.files().delete(fileId=file_id).execute()
+                drive_governor.execute(drive_service.files().delete(fileId=file_id), 'cleanup.delete', write=True)
+                database.clear_drive_file(file_id)
 
                 # Cleanup empty parent folders
                 if parent_folders:
@@ -251,6 +322,16 @@ def cleanup_old_files_on_drive(drive_service):
         logging.error(f'An unexpected error occurred during Google Drive cleanup: {e}')
 
 
+def cleanup_old_files_on_all_accounts():
+    """Run `cleanup_old_files_on_drive()` on every Drive account of DRIVE_ACCOUNTS."""
+    for account in drive_accounts.accounts:
+        try:
+            drive_service = get_drive_service(account)
+        except RuntimeError:
+            continue
+        cleanup_old_files_on_drive(drive_service)
+
+
 def cleanup_empty_parent_folders(drive_service, folder_id):
     """
     Recursively deletes a folder and its parents if they become empty.
@@ -258,15 +339,17 @@ def cleanup_empty_parent_folders(drive_service, folder_id):
     try:
         # Check if the folder is empty
         q = f"'{folder_id}' in parents"
-        response = drive_service.files().list(q=q, spaces='drive', fields='files(id)').execute()
+        response = drive_governor.execute(
+            drive_service.files().list(q=q, spaces='drive', fields='files(id)'), 'cleanup.list')
         if not response.get('files', []):
             # Get folder details to find its parent
-            folder_details = drive_service.files().get(fileId=folder_id, fields='name, parents').execute()
+            folder_details = drive_governor.execute(
+                drive_service.files().get(fileId=folder_id, fields='name, parents'), 'cleanup.get')
             folder_name = folder_details.get('name')
             parent_folders = folder_details.get('parents')
 
             logging.info(f"Deleting empty folder: {folder_name} (ID: {folder_id})")
-            drive_service.files().delete(fileId=folder_id).execute()
+            drive_governor.execute(drive_service.files().delete(fileId=folder_id), 'cleanup.delete', write=True)
 
             # Recursively check the parent folder
             if parent_folders:
@@ -288,13 +371,17 @@ def exponential_backoff(retries):
 
 EMPTY_VIDEO_RETRY_DELAY = 10  # seconds to wait between retries when video is 0 bytes (Frigate still writing)
 
-def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_bytes=0):
+def download_video_with_retry(video_url, dest_path, event_id=None, max_retries=5, max_size_bytes=0,
+                              record_availability=True):
     """
-    Download video with retry logic and proper timeout handling.
-
-    Returns a tuple ``(data, error_kind)``:
-      - ``(bytes, None)`` on success
-      - ``(None, ERR_*)`` on failure, with a coarse-grained category
+    Download video to `dest_path` with retry logic and proper timeout handling.
+    With `record_availability` False (partial ranges of an event) the clip
+    size is not recorded for the event.
+
+    Returns a tuple ``(size, error_kind, md5)``:
+      - ``(bytes written, None, hex MD5)`` on success; the hash is computed
+        over the chunks as they are written, without a second read pass.
+      - ``(None, ERR_*, None)`` on failure, with a coarse-grained category
         suitable for the `last_error_kind` column.
       - Raises ``ClipNotAvailableError`` (HTTP 404/400 on Frigate) and
         ``ClipTooLargeError`` (size limit exceeded) unchanged.
@@ -305,8 +392,11 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
 
     while retry_count <= max_retries:
         bytes_this_attempt = 0
+        got_response = False
         try:
-            with requests.Session() as session:
+            # The clip-limiter slot is held for the whole transfer: Frigate
+            # assembles the clip while streaming it.
+            with frigate_clip_limiter.slot(), requests.Session() as session:
                 # Configure retry strategy for the download
                 retry_strategy = Retry(
                     total=3,
@@ -318,7 +408,12 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
                 session.mount("https://", adapter)
                 session.mount("http://", adapter)
 
+                started = time.monotonic()
                 with session.get(video_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                    got_response = True
+                    frigate_circuit.record_success()
+                    if response.status_code < 500:
+                        frigate_clip_limiter.on_success(time.monotonic() - started)
                     # HTTP 404 is a definitive "clip is gone" signal from Frigate.
                     # HTTP 400 with "No recordings found" means the recordings were
                     # pruned by Frigate's retention, but the event metadata still
@@ -335,12 +430,25 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
                             )
                     response.raise_for_status()
 
-                    with tempfile.TemporaryFile() as fh:
+                    # Frigate started serving the clip: refresh the availability
+                    # cache so the daily health report doesn't have to re-probe it.
+                    if event_id and record_availability:
+                        content_length = response.headers.get('Content-Length')
+                        database.update_clip_availability(
+                            event_id, True,
+                            size=int(content_length) if content_length and content_length.isdigit() else None,
+                        )
+
+                    with open(dest_path, 'wb') as fh:
                         total_bytes = 0
                         last_log_bytes = 0
+                        digest = hashlib.md5()
                         for chunk in response.iter_content(chunk_size=8192):
                             if chunk:  # filter out keep-alive new chunks
                                 fh.write(chunk)
+                                digest.update(chunk)
+                                # Shared Frigate read limit across all downloads.
+                                frigate_download_bucket.consume(len(chunk))
                                 total_bytes += len(chunk)
                                 bytes_this_attempt += len(chunk)
                                 # Abort if the clip exceeds the configured max size
@@ -355,12 +463,14 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
                                 if total_bytes - last_log_bytes >= 50 * 1024 * 1024:
                                     logging.info(f"Download progress for {event_id}: {total_bytes / (1024*1024):.1f} MB downloaded so far...")
                                     last_log_bytes = total_bytes
-                        fh.seek(0)
-                        data = fh.read()
-                        if not data:
+                        if not total_bytes:
                             raise ValueError(f"Downloaded video is empty (0 bytes) from {video_url}")
                         logging.info(f"Download complete for {event_id}: {total_bytes / (1024*1024):.1f} MB total.")
-                        return data, None
+                        # Actual size feeds the bitrate the upload queue learns
+                        # for estimating the transfer cost of pending clips.
+                        if event_id and record_availability:
+                            database.update_clip_availability(event_id, True, size=total_bytes)
+                        return total_bytes, None, digest.hexdigest()
 
         except ValueError as e:
             last_error = e
@@ -374,6 +484,16 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
             raise
         except (requests.RequestException, ssl.SSLError, socket.timeout) as e:
             last_error = e
+            # Only a failure to get any response at all says something about
+            # Frigate's reachability; mid-stream aborts are clip-assembly issues.
+            if not got_response and isinstance(e, requests.ConnectionError):
+                frigate_circuit.record_failure()
+            # Timeouts and 5xx mean Frigate is struggling to assemble clips:
+            # let the limiter reduce the number of parallel clip requests.
+            if isinstance(e, (socket.timeout, requests.Timeout, requests.exceptions.RetryError)) or (
+                isinstance(e, requests.HTTPError) and getattr(e.response, 'status_code', 0) >= 500
+            ):
+                frigate_clip_limiter.on_overload(type(e).__name__)
             # Categorise the failure for the daily health report.
             if isinstance(e, (socket.timeout, requests.Timeout)):
                 last_error_kind = ERR_FRIGATE_DOWNLOAD_TIMEOUT
@@ -399,7 +519,69 @@ def download_video_with_retry(video_url, event_id=None, max_retries=5, max_size_
                 time.sleep(wait_time)
 
     logging.warning(f"Failed to download video for {event_id} from Frigate after {retry_count} attempts. Last error: {last_error}")
-    return None, last_error_kind
+    return None, last_error_kind, None
+
+def _coalesced_range(event_id, start_time, end_time):
+    """
+    ``(start_ts, end_ts, members)`` of a coalesced upload: the recording
+    range from the first start to the last end of the event and the events
+    it covers, padded like parts. None unless the event leads a group.
+    """
+    if end_time is None:
+        return None
+    members = database.select_covered_events(event_id)
+    if not members:
+        return None
+    padding = progressive_capture.padding_seconds
+    start_ts = min([start_time] + [member[1] for member in members]) - padding
+    end_ts = max([end_time] + [member[2] for member in members if member[2] is not None]) + padding
+    return start_ts, end_ts, members
+
+
+def _record_coalesced_upload(event_id, duration, coalesced, md5, clip_size, drive_file):
+    start_ts, end_ts, members = coalesced
+    covered = database.mark_covered_events_uploaded(
+        event_id, md5, drive_file['account'], drive_file_id=drive_file['id'], drive_parent_id=drive_file['parent_id'],
+    )
+    padding = 2 * progressive_capture.padding_seconds
+    separate_seconds = duration + padding + sum(
+        (member[2] - member[1]) + padding for member in members if member[2] is not None
+    )
+    saved = coalescer.record_upload(covered, separate_seconds, end_ts - start_ts, clip_size)
+    logging.info(
+        f"Coalesced upload of event {event_id} also covers {covered} overlapping events; "
+        f"about {saved / 1e6:.1f} MB were not uploaded twice."
+    )
+
+
+def _clip_downloader(video_url, **kwargs):
+    """
+    ``dest -> (size, error_kind, md5)`` for `spool.fetch()`: download with
+    `download_video_with_retry()` and, with FASTSTART_REMUX on, move the
+    `moov` atom to the front before the clip is committed.
+    """
+    def download(dest):
+        size, error_kind, md5 = download_video_with_retry(video_url, dest, **kwargs)
+        if size and faststart.enabled:
+            remuxed = faststart.process(dest)
+            if remuxed:
+                size, md5 = remuxed
+        return size, error_kind, md5
+    return download
+
+
+def _upload_chunk_size():
+    """
+    Resumable-upload chunk size. With a Drive upload limit set, each chunk is
+    about 2 s worth of the limit (Drive requires multiples of 256 KB), so the
+    line-rate burst between two throttled reads stays short.
+    """
+    rate = drive_upload_bucket.rate
+    if not rate:
+        return UPLOAD_CHUNK_SIZE
+    granularity = 256 * 1024
+    return min(UPLOAD_CHUNK_SIZE, max(granularity, int(rate * 2) // granularity * granularity))
+
 
 def upload_to_google_drive(event, frigate_url):
     """
@@ -412,22 +594,32 @@ def upload_to_google_drive(event, frigate_url):
       - Raises ``ClipNotAvailableError`` / ``ClipTooLargeError`` unchanged so
         the caller can apply specific handling (delete vs. mark non-retriable).
     """
-    import io  # Moved here to prevent early initialization issues
-    
     camera_name = event['camera']
     start_time = event['start_time']
     event_id = event['id']
     label = event.get('label')
+    end_time = event.get('end_time')
+    coalesced = _coalesced_range(event_id, start_time, end_time)
+    if coalesced is None and end_time is not None and progressive_capture.uses_parts(event_id, end_time - start_time):
+        return _upload_missing_parts(event, frigate_url)
     filename = generate_filename(camera_name, start_time, event_id, label)
-    year, month, day = filename.split("__")[0].split("-")[:3]
-    video_url = generate_video_url(frigate_url, event_id)
-
-    # Pre-flight size check via HEAD request when possible
-    if MAX_CLIP_SIZE_BYTES > 0:
+    if coalesced:
+        video_url = generate_recording_url(frigate_url, camera_name, coalesced[0], coalesced[1])
+    else:
+        video_url = generate_video_url(frigate_url, event_id)
+
+    # Pre-flight size check via HEAD request when possible (not needed once
+    # the clip is spooled: it was size-checked while downloading).
+    if MAX_CLIP_SIZE_BYTES > 0 and not spool.contains(event_id):
         try:
-            head_resp = requests.head(video_url, timeout=30)
+            with frigate_clip_limiter.slot():
+                head_resp = requests.head(video_url, timeout=30)
             if head_resp.status_code == 200:
                 content_length = head_resp.headers.get('Content-Length')
+                database.update_clip_availability(
+                    event_id, True,
+                    size=int(content_length) if content_length and content_length.isdigit() else None,
+                )
                 if content_length:
                     size = int(content_length)
                     if size > MAX_CLIP_SIZE_BYTES:
@@ -441,103 +633,365 @@ def upload_to_google_drive(event, frigate_url):
         except requests.RequestException:
             pass  # HEAD may not be supported, fall back to stream check
 
-    with upload_lock:
-        # Another thread may have uploaded this event while we were waiting for the lock.
-        if database.select_event_uploaded(event_id) == 1:
-            logging.info(f"Event {event_id} was already uploaded by another thread. Skipping.")
-            return True, None
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                # 1. Ensure folder structure exists
-                frigate_folder_id = find_or_create_folder(UPLOAD_DIR)
-                if not frigate_folder_id:
-                    raise Exception(f"Failed to find or create folder: {UPLOAD_DIR}")
-
-                year_folder_id = find_or_create_folder(year, frigate_folder_id)
-                if not year_folder_id:
-                    raise Exception(f"Failed to find or create folder: {year}")
-
-                month_folder_id = find_or_create_folder(month, year_folder_id)
-                if not month_folder_id:
-                    raise Exception(f"Failed to find or create folder: {month}")
-
-                day_folder_id = find_or_create_folder(day, month_folder_id)
-                if not day_folder_id:
-                    raise Exception(f"Failed to find or create folder: {day}")
-
-                # 2. Download video with retry logic
-                video_data, download_err = download_video_with_retry(
-                    video_url, event_id=event_id, max_size_bytes=MAX_CLIP_SIZE_BYTES
-                )
-                if not video_data:
-                    logging.warning(
-                        f"Failed to download video from {video_url} for {event_id} "
-                        f"(kind={download_err})"
-                    )
-                    return False, download_err or ERR_FRIGATE_DOWNLOAD_OTHER
-
-                # 3. Upload to Google Drive with resumable upload
-                media = MediaIoBaseUpload(
-                    io.BytesIO(video_data),
-                    mimetype='video/mp4',
-                    resumable=True,
-                    chunksize=UPLOAD_CHUNK_SIZE
-                )
+    # Download before taking an upload lock: the lock only protects the
+    # non-thread-safe Drive client, so one worker's Frigate download can
+    # overlap another worker's Drive upload. Parallel clip requests are bounded
+    # by frigate_clip_limiter. The clip goes through the spool: a clip the
+    # prefetcher already fetched (e.g. while offline) is not downloaded again,
+    # and Drive retries below stream the same file.
+    if database.select_event_uploaded(event_id) == 1:
+        logging.info(f"Event {event_id} was already uploaded by another thread. Skipping.")
+        return True, None
+    clip_path, download_err = spool.fetch(event_id, _clip_downloader(
+        video_url, event_id=event_id, max_size_bytes=MAX_CLIP_SIZE_BYTES, record_availability=not coalesced
+    ), ended_at=coalesced[1] if coalesced else end_time, pin=True)
+    if clip_path and not _clip_is_playable(clip_path, event_id):
+        spool.discard(event_id)
+        return False, ERR_CLIP_CORRUPT
+    clip_size = os.path.getsize(clip_path) if clip_path else 0
+    md5 = spool.md5_of(event_id)  # before open(): a disabled spool forgets the clip there
+    clip_file = spool.open(event_id) if clip_path else None
+    if clip_file is None:
+        logging.warning(
+            f"Failed to download video from {video_url} for {event_id} "
+            f"(kind={download_err})"
+        )
+        return False, download_err or ERR_FRIGATE_DOWNLOAD_OTHER
+
+    with clip_file:
+        success, error_kind, drive_file = upload_file(clip_file, filename, event_id, expected_md5=md5)
+    if success:
+        database.update_event_drive_file(
+            event_id, md5=md5, drive_account=drive_file['account'],
+            drive_file_id=drive_file['id'], drive_parent_id=drive_file['parent_id'],
+        )
+    if success and coalesced:
+        _record_coalesced_upload(event_id, end_time - start_time, coalesced, md5, clip_size, drive_file)
+    elif error_kind == ERR_DRIVE_CHECKSUM:
+        # The spooled bytes did not survive the round trip: fetch them again.
+        spool.discard(event_id)
+    return success, error_kind
+
+
+def upload_file(clip_file, filename, event_id, mimetype='video/mp4', lane='upload', throttle=True,
+                expected_md5=None):
+    """
+    Upload an open clip file as UPLOAD_DIR/<year>/<month>/<day>/<filename>
+    (date folders taken from the filename) with retry logic, to the Drive
+    account DRIVE_ACCOUNT_STRATEGY picks for the camera in the filename.
+    Serialised per account and `lane` ('upload' for clips, 'snapshot' for the
+    fast lane) and paced by DRIVE_UPLOAD_RATE_LIMIT unless `throttle` is False.
+
+    Returns ``(success, error_kind, drive_file)``, error kinds as in
+    `upload_to_google_drive()`; `drive_file` is ``{'account', 'id',
+    'parent_id'}`` of the new file on success, else None. A quota error puts the account on hold and,
+    if another account is available, the next attempt goes there right away.
+
+    The size and md5Checksum Drive reports for the new file are compared with
+    the local file and `expected_md5`; on a mismatch the file is deleted from
+    Drive again and ``ERR_DRIVE_CHECKSUM`` is returned.
+    """
+    camera = filename.split("__")[1]
+    account = drive_accounts.pick(camera)
+    throttled = set()
+    reauthorized = False
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            drive_service = get_drive_service(account, lane)
+            with account.locks[lane]:
+                response = _create_file(drive_service, account, clip_file, filename, event_id, mimetype, throttle)
+                if not _verify_upload(drive_service, response, clip_file, expected_md5, filename):
+                    return False, ERR_DRIVE_CHECKSUM, None
+            drive_accounts.record_upload(account, clip_file.seek(0, os.SEEK_END))
+            logging.info(f"Video {filename} successfully uploaded to Google Drive with ID: {response['id']}.")
+            parents = response.get('parents') or [None]
+            return True, None, {'account': account.name, 'id': response['id'], 'parent_id': parents[0]}
+
+        except HttpError as error:
+            status_code = error.resp.status
+            reason = error_reason(error)
+            if status_code == 401 and not reauthorized and attempt < MAX_RETRIES:
+                # Expired or revoked token: drop it, rebuild the client and try once more.
+                logging.warning(f"Google Drive rejected the access token uploading {filename}; refreshing it.")
+                credential_manager.invalidate(account.service_account_file, account.subject)
+                drive_accounts.rebuild(account, lane)
+                reauthorized = True
+                continue
+            if status_code == 429 or (status_code == 403 and reason in QUOTA_REASONS):
+                drive_accounts.record_throttle(account, reason, retry_after(error))
+                throttled.add(account.name)
+                other = drive_accounts.pick(camera, exclude=throttled)
+                if attempt < MAX_RETRIES and drive_accounts.is_available(other):
+                    logging.info(f"Retrying {filename} on Drive account {other.name}.")
+                    account = other
+                    continue
+            if attempt < MAX_RETRIES and (status_code in [500, 502, 503, 504] or is_rate_limited(error)):
+                if is_rate_limited(error):
+                    # drive_governor holds the next call for Retry-After / its backoff.
+                    wait_time = drive_governor.pause_remaining()
+                else:
+                    wait_time = exponential_backoff(attempt + 1)
+                    time.sleep(wait_time)
+                logging.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed with status {status_code}. "
+                                f"Retrying in {wait_time:.2f}s. Error: {error}")
+                account = drive_accounts.pick(camera)
+                continue
+            logging.warning(f"HTTP error uploading to Google Drive: {error}")
+            kind = ERR_DRIVE_5XX if status_code >= 500 else ERR_DRIVE_HTTP
+            return False, kind, None
+
+        except (requests.RequestException, ssl.SSLError, socket.timeout, socket.error) as e:
+            if attempt < MAX_RETRIES:
+                wait_time = exponential_backoff(attempt + 1)
+                logging.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed. Retrying in {wait_time:.2f}s. Error: {e}")
+                time.sleep(wait_time)
+                continue
+            logging.warning(f"Error in upload process: {e}")
+            return False, ERR_DRIVE_NETWORK, None
 
-                file_metadata = {
-                    'name': filename,
-                    'parents': [day_folder_id]
-                }
+        except Exception as e:
+            logging.warning(f"Unexpected error during upload: {e}")
+            return False, ERR_DRIVE_OTHER, None
 
-                request = service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id',
-                    supportsAllDrives=True
-                )
+    logging.warning(f"Failed to upload after {MAX_RETRIES + 1} attempts")
+    return False, ERR_DRIVE_OTHER, None
 
-                response = None
-                while response is None:
-                    status, response = request.next_chunk()
-                    if status:
-                        logging.info(f"Upload progress for {event_id}: {int(status.progress() * 100)}%")
 
-                if 'id' in response:
-                    logging.info(f"Video {filename} successfully uploaded to Google Drive with ID: {response['id']}.")
-                    return True, None
-                else:
-                    raise Exception("No file ID returned from Google Drive")
+def _create_file(drive_service, account, clip_file, filename, event_id, mimetype, throttle):
+    """One upload attempt: ensure the date folders exist, then a resumable upload. Returns Drive's response."""
+    from googleapiclient.http import MediaIoBaseUpload
 
-            except ClipNotAvailableError:
-                # The clip file is gone on Frigate. No retries, propagate to caller for DB cleanup.
-                raise
+    year, month, day = filename.split("__")[0].split("-")[:3]
 
-            except HttpError as error:
-                status_code = error.resp.status
-                if attempt < MAX_RETRIES and status_code in [500, 502, 503, 504, 429]:
-                    wait_time = exponential_backoff(attempt + 1)
-                    logging.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed with status {status_code}. "
-                                    f"Retrying in {wait_time:.2f}s. Error: {error}")
-                    time.sleep(wait_time)
-                    continue
-                logging.warning(f"HTTP error uploading to Google Drive: {error}")
-                kind = ERR_DRIVE_5XX if status_code >= 500 else ERR_DRIVE_HTTP
-                return False, kind
+    # 1. Ensure folder structure exists
+    frigate_folder_id = find_or_create_folder(UPLOAD_DIR, drive_service=drive_service, account=account)
+    if not frigate_folder_id:
+        raise Exception(f"Failed to find or create folder: {UPLOAD_DIR}")
+
+    year_folder_id = find_or_create_folder(year, frigate_folder_id, drive_service=drive_service, account=account)
+    if not year_folder_id:
+        raise Exception(f"Failed to find or create folder: {year}")
+
+    month_folder_id = find_or_create_folder(month, year_folder_id, drive_service=drive_service, account=account)
+    if not month_folder_id:
+        raise Exception(f"Failed to find or create folder: {month}")
+
+    day_folder_id = find_or_create_folder(day, month_folder_id, drive_service=drive_service, account=account)
+    if not day_folder_id:
+        raise Exception(f"Failed to find or create folder: {day}")
+
+    # 2. Upload to Google Drive with resumable upload
+    media = MediaIoBaseUpload(
+        ThrottledReader(clip_file, drive_upload_bucket) if throttle else clip_file,
+        mimetype=mimetype,
+        resumable=True,
+        chunksize=_upload_chunk_size()
+    )
+
+    file_metadata = {
+        'name': filename,
+        'parents': [day_folder_id]
+    }
+
+    request = drive_service.files().create(
+        body=file_metadata,
+        media_body=media,
+        fields='id,md5Checksum,size,parents',
+        supportsAllDrives=True
+    )
+
+    # The first chunk starts the upload (a write); the rest only send data.
+    response = None
+    first_chunk = True
+    while response is None:
+        status, response = drive_governor.call('files.upload', request.next_chunk, write=first_chunk)
+        first_chunk = False
+        if status:
+            logging.info(f"Upload progress for {event_id}: {int(status.progress() * 100)}%")
+
+    if 'id' not in response:
+        raise Exception("No file ID returned from Google Drive")
+    return response
+
+
+def _clip_is_playable(path, event_id):
+    """Check the MP4 box structure of a downloaded clip before spending Drive bytes on it."""
+    problem = check_mp4(path)
+    if problem:
+        logging.warning(f"Clip for {event_id} is corrupt ({problem}). Not uploading it.")
+        return False
+    return True
+
+
+def _verify_upload(drive_service, response, clip_file, expected_md5, filename):
+    """
+    Compare the size and MD5 Drive computed for an uploaded file with the
+    local file. A mismatching file is deleted from Drive. Drive omits
+    md5Checksum for some files; then only the size is checked.
+    """
+    local_size = clip_file.seek(0, os.SEEK_END)
+    drive_size = response.get('size')
+    drive_md5 = response.get('md5Checksum')
+    problems = []
+    if drive_size is not None and int(drive_size) != local_size:
+        problems.append(f"size {drive_size} != {local_size}")
+    if expected_md5 and drive_md5 and drive_md5 != expected_md5:
+        problems.append(f"md5 {drive_md5} != {expected_md5}")
+    if not problems:
+        return True
+    logging.error(f"Integrity check failed for {filename} on Google Drive ({', '.join(problems)}). Deleting it.")
+    try:
+        drive_governor.execute(
+            drive_service.files().delete(fileId=response['id'], supportsAllDrives=True), 'files.delete', write=True)
+    except Exception as e:
+        logging.warning(f"Could not delete mismatching file {response['id']} from Google Drive: {e}")
+    return False
 
-            except (requests.RequestException, ssl.SSLError, socket.timeout, socket.error) as e:
-                if attempt < MAX_RETRIES:
-                    wait_time = exponential_backoff(attempt + 1)
-                    logging.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed. Retrying in {wait_time:.2f}s. Error: {e}")
-                    time.sleep(wait_time)
-                    continue
-                logging.warning(f"Error in upload process: {e}")
-                return False, ERR_DRIVE_NETWORK
 
-            except Exception as e:
-                logging.warning(f"Unexpected error during upload: {e}")
-                return False, ERR_DRIVE_OTHER
+def prefetch_clip(event_id, frigate_url):
+    """
+    Fetch stage of the spool: download an event's clip into the local spool
+    without uploading it. Independent of internet/Drive reachability; a
+    single attempt, since the upload path retries with its own backoff.
 
-        logging.warning(f"Failed to upload after {MAX_RETRIES + 1} attempts")
-        return False, ERR_DRIVE_OTHER
+    Returns ``(success, error_kind)`` and raises ``ClipNotAvailableError`` /
+    ``ClipTooLargeError`` like `upload_to_google_drive()`.
+    """
+    if database.select_event_uploaded(event_id) == 1:
+        return True, None
+    camera, start_time, end_time = database.select_event_source(event_id) or (None, None, None)
+    duration = end_time - start_time if start_time is not None and end_time is not None else None
+    coalesced = _coalesced_range(event_id, start_time, end_time) if duration is not None else None
+    if coalesced:
+        video_url = generate_recording_url(frigate_url, camera, coalesced[0], coalesced[1])
+    elif progressive_capture.uses_parts(event_id, duration):
+        # Uploaded in parts straight from Frigate; the spool holds whole clips.
+        return True, None
+    else:
+        video_url = generate_video_url(frigate_url, event_id)
+    clip_path, error_kind = spool.prefetch(event_id, _clip_downloader(
+        video_url, event_id=event_id, max_retries=0, max_size_bytes=MAX_CLIP_SIZE_BYTES,
+        record_availability=not coalesced,
+    ))
+    if clip_path:
+        logging.info(f"Spooled clip for event {event_id}.")
+    return bool(clip_path), error_kind
+
+
+def upload_recording_part(event, part, start_ts, end_ts, frigate_url, max_retries=1):
+    """
+    Fetch one recording range of an event through the recordings API, upload
+    it as ``...__partNN.mp4`` and record it in `event_parts`. A staging file
+    is used instead of the spool, which holds whole clips.
 
+    Returns ``(success, error_kind)``. Raises ``ClipNotAvailableError`` (no
+    recordings in the range) and ``ClipTooLargeError`` unchanged.
+    """
+    event_id = event['id']
+    video_url = generate_recording_url(frigate_url, event['camera'], start_ts, end_ts)
+    filename = generate_filename(event['camera'], event['start_time'], event_id, event.get('label'), part=part)
+    with tempfile.TemporaryDirectory(prefix='frigate-part-') as tmp_dir:
+        dest = os.path.join(tmp_dir, filename)
+        size, error_kind, md5 = _clip_downloader(
+            video_url, event_id=f"{event_id} part {part}", max_retries=max_retries,
+            max_size_bytes=MAX_CLIP_SIZE_BYTES, record_availability=False,
+        )(dest)
+        if not size:
+            return False, error_kind or ERR_FRIGATE_DOWNLOAD_OTHER
+        if not _clip_is_playable(dest, f"{event_id} part {part}"):
+            return False, ERR_CLIP_CORRUPT
+        with open(dest, 'rb') as clip_file:
+            success, error_kind, drive_file = upload_file(clip_file, filename, event_id, expected_md5=md5)
+    if success:
+        database.insert_event_part(
+            event_id, part, start_ts, end_ts, md5=md5, drive_account=drive_file['account'],
+            drive_file_id=drive_file['id'], drive_parent_id=drive_file['parent_id'],
+        )
+        logging.info(f"Uploaded part {part} of event {event_id} ({(end_ts - start_ts) / 60:.1f} min).")
+    return success, error_kind
+
+
+def _upload_missing_parts(event, frigate_url):
+    """
+    Upload the parts of a finished event that are not on Drive yet (see
+    src/progressive.py): the tail of a progressively captured event, or all
+    segments of a long event. Up to SEGMENTED_DOWNLOAD_CONCURRENCY parts are
+    downloaded at once (each still takes a frigate_clip_limiter slot);
+    uploads stay serialised by each Drive account's upload lock. Parts that succeed are kept, so
+    a retry only fetches the ones that failed.
+
+    Returns ``(success, error_kind)``; raises ``ClipNotAvailableError`` if
+    Frigate has no recordings for any of the parts.
+    """
+    event_id = event['id']
+    missing = progressive_capture.missing_parts(event_id, event['start_time'], event['end_time'])
+    if not missing:
+        logging.info(f"All parts of event {event_id} are already uploaded.")
+        return True, None
+    logging.info(f"Uploading event {event_id} as {len(missing)} part(s) from Frigate's recordings.")
+    uploaded, unavailable, error_kinds = 0, [], []
+    too_large = None
+    workers = min(progressive_capture.split_concurrency, len(missing))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='segment') as pool:
+        futures = {
+            pool.submit(upload_recording_part, event, part, start_ts, end_ts, frigate_url, 2): (part, start_ts, end_ts)
+            for part, start_ts, end_ts in missing
+        }
+        for future in as_completed(futures):
+            part, start_ts, end_ts = futures[future]
+            try:
+                success, error_kind = future.result()
+            except ClipNotAvailableError as e:
+                unavailable.append((part, start_ts, end_ts, e))
+                continue
+            except ClipTooLargeError as e:
+                too_large = e
+                continue
+            if success:
+                uploaded += 1
+            else:
+                error_kinds.append(error_kind or ERR_UNKNOWN)
+    if too_large is not None:
+        raise too_large
+    if unavailable and len(unavailable) == len(missing) and not database.select_event_part_numbers(event_id):
+        raise unavailable[0][3]
+    for part, start_ts, end_ts, e in unavailable:
+        # A gap in the recordings (camera offline mid-event): nothing to upload.
+        logging.warning(f"No recordings for part {part} of event {event_id}, skipping it: {e}")
+        database.insert_event_part(event_id, part, start_ts, end_ts)
+    if error_kinds:
+        logging.warning(
+            f"{len(error_kinds)} of {len(missing)} parts of event {event_id} failed; "
+            f"{uploaded} uploaded. Only the failed parts are retried."
+        )
+        return False, error_kinds[0]
+    return True, None
+
+
+def upload_snapshot(event, frigate_url):
+    """
+    Snapshot fast lane: upload an event's snapshot.jpg into the clip's date
+    folder under the clip's name with a .jpg extension. Uses its own Drive
+    client and lock per Drive account (the 'snapshot' lane) and is not rate
+    limited, so it never waits behind a clip.
 
+    Returns ``(success, error_kind)``; ``(None, None)`` if Frigate has no
+    snapshot for the event.
+    """
+    event_id = event['id']
+    try:
+        data = fetch_snapshot(frigate_url, event_id)
+    except FrigateUnreachableError as e:
+        logging.warning(f"Could not fetch snapshot of event {event_id}: {e}")
+        return False, ERR_FRIGATE_DOWNLOAD_OTHER
+    if data is None:
+        return None, None
+    filename = generate_filename(event['camera'], event['start_time'], event_id, event.get('label'), extension='jpg')
+    success, error_kind, _ = upload_file(
+        io.BytesIO(data), filename, event_id,
+        mimetype='image/jpeg', lane='snapshot', throttle=False,
+        expected_md5=hashlib.md5(data).hexdigest(),
+    )
+    if success:
+        logging.info(f"Snapshot {filename} uploaded to Google Drive.")
+    return success, error_kind
@@ -1,7 +1,7 @@
 """
 Lightweight HTTP healthcheck endpoint.
 
-Exposes two endpoints:
+Exposes three endpoints:
 
   GET /health
       Liveness probe. Returns 200 OK if the core subsystems (DB + scheduler)
@@ -22,8 +22,15 @@ Exposes two endpoints:
       no Frigate URL, no Mattermost webhook, no MQTT credentials, no
       individual event IDs (which could expose surveillance timestamps).
 
+  GET /limits, POST /limits
+      Read or change the Frigate-download / Drive-upload byte-rate limits at
+      runtime, e.g. ``{"drive_upload": "2MB", "frigate_download": 0}``.
+      POST always requires the bearer token and is refused (403) when
+      HEALTHCHECK_TOKEN is not set, so an exposed port can never be used to
+      change the limits anonymously.
+
 Implementation uses only the Python stdlib (`http.server.ThreadingHTTPServer`)
-to avoid adding a new dependency for what is essentially a 2-endpoint API.
+to avoid adding a new dependency for what is essentially a 3-endpoint API.
 """
 
 from __future__ import annotations
@@ -54,6 +61,39 @@ class HealthState:
     # and so that we can re-check at request time (the underlying client
     # connection state changes over the process lifetime).
     mqtt_is_connected: Optional[Callable[[], bool]] = None
+    # Optional Frigate circuit breaker (anything with a `snapshot()` method).
+    # Reported on /status only; /health never fails on Frigate being down.
+    frigate_circuit: Any = None
+    # Optional adaptive limiter for Frigate clip requests (`snapshot()`).
+    frigate_clip_limiter: Any = None
+    # Optional connectivity monitor (anything with a `snapshot()` method).
+    connectivity: Any = None
+    # Optional upload dispatcher (anything with a `snapshot()` method).
+    dispatcher: Any = None
+    # Optional priority upload queue (anything with a `snapshot()` method).
+    upload_queue: Any = None
+    # Optional runtime-adjustable rate limits (`snapshot()` and `update(dict)`).
+    rate_limits: Any = None
+    # Optional store-and-forward clip spool (`snapshot()`).
+    spool: Any = None
+    # Optional progressive capture of running events (`snapshot()`).
+    progressive_capture: Any = None
+    # Optional snapshot fast lane (`snapshot()`).
+    snapshot_lane: Any = None
+    # Optional faststart remux stage (`snapshot()`).
+    faststart: Any = None
+    # Optional overlap coalescer (`snapshot()`).
+    coalescer: Any = None
+    # Optional Drive account pool (`snapshot()`).
+    drive_accounts: Any = None
+    # Optional Drive API governor (`snapshot()`).
+    drive_api: Any = None
+    # Optional Drive credential manager (`snapshot()`).
+    drive_tokens: Any = None
+    # Optional Drive changes-feed reconciler (`snapshot()`).
+    drive_reconcile: Any = None
+    # Optional Frigate event-listing cursor (`snapshot()`).
+    event_sync: Any = None
     # Optional bearer token guarding /status. Empty/None disables auth.
     status_token: Optional[str] = None
     # When True, /health returns 503 instead of 200 (e.g. during shutdown).
@@ -94,6 +134,17 @@ def _check_mqtt(probe: Optional[Callable[[], bool]]) -> bool:
         return False
 
 
+def _snapshot(component) -> Optional[dict]:
+    """Return `component.snapshot()`, or None if absent or failing."""
+    if component is None:
+        return None
+    try:
+        return component.snapshot()
+    except Exception as e:
+        logging.warning(f"Healthcheck snapshot failed: {e}")
+        return None
+
+
 class _SilentHandler(BaseHTTPRequestHandler):
     """
     HTTP handler with all access logs suppressed. The Docker HEALTHCHECK
@@ -183,14 +234,17 @@ class _SilentHandler(BaseHTTPRequestHandler):
             payload["checks"]["db_reason"] = db_reason
         self._send_json(200 if is_healthy else 503, payload)
 
+    def _send_unauthorized(self) -> None:
+        # Use the standard challenge so curl --user works if someone
+        # mistakenly tries basic auth.
+        self.send_response(401)
+        self.send_header("WWW-Authenticate", 'Bearer realm="status"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
     def _route_status(self) -> None:
         if not self._check_token():
-            # Use the standard challenge so curl --user works if someone
-            # mistakenly tries basic auth.
-            self.send_response(401)
-            self.send_header("WWW-Authenticate", 'Bearer realm="status"')
-            self.send_header("Content-Length", "0")
-            self.end_headers()
+            self._send_unauthorized()
             return
 
         s = self.state
@@ -218,12 +272,18 @@ class _SilentHandler(BaseHTTPRequestHandler):
             "pending_1d_2d": stats.get("pending_1d_2d", 0),
             "pending_2d_3d": stats.get("pending_2d_3d", 0),
             "pending_gt_3d": stats.get("pending_gt_3d", 0),
+            "pending_deferred": stats.get("pending_deferred", 0),
             "oldest_pending_age_days": stats.get("oldest_pending_age_days"),
             "total_uploaded": stats.get("total_uploaded", 0),
             "pending_error_kinds": [
                 {"kind": k, "count": c}
                 for k, c in stats.get("pending_error_kinds", [])
             ],
+            # Camera names and aggregate lag only, no event IDs.
+            "pending_by_camera": [
+                {"camera": cam or "unknown", "pending": n, "oldest_pending_age_hours": age}
+                for cam, n, age in stats.get("pending_by_camera", [])
+            ],
         }
 
         self._send_json(200, {
@@ -233,9 +293,62 @@ class _SilentHandler(BaseHTTPRequestHandler):
                 "scheduler": scheduler_ok,
                 "mqtt": mqtt_ok,
             },
+            "frigate_circuit": _snapshot(s.frigate_circuit),
+            "frigate_clip_limiter": _snapshot(s.frigate_clip_limiter),
+            "connectivity": _snapshot(s.connectivity),
+            "dispatcher": _snapshot(s.dispatcher),
+            "upload_queue": _snapshot(s.upload_queue),
+            "rate_limits": _snapshot(s.rate_limits),
+            "spool": _snapshot(s.spool),
+            "progressive_capture": _snapshot(s.progressive_capture),
+            "snapshot_lane": _snapshot(s.snapshot_lane),
+            "faststart": _snapshot(s.faststart),
+            "coalescer": _snapshot(s.coalescer),
+            "drive_accounts": _snapshot(s.drive_accounts),
+            "drive_api": _snapshot(s.drive_api),
+            "drive_tokens": _snapshot(s.drive_tokens),
+            "drive_reconcile": _snapshot(s.drive_reconcile),
+            "event_sync": _snapshot(s.event_sync),
             "stats": safe_stats,
         })
 
+    def _route_limits_get(self) -> None:
+        if not self._check_token():
+            self._send_unauthorized()
+            return
+        if self.state.rate_limits is None:
+            self._send_plain(404, "not found")
+            return
+        self._send_json(200, _snapshot(self.state.rate_limits) or {})
+
+    def _route_limits_post(self) -> None:
+        limits = self.state.rate_limits
+        if limits is None:
+            self._send_plain(404, "not found")
+            return
+        # Mutations are never anonymous, even if /status is left open.
+        if not (self.state.status_token or "").strip():
+            self._send_plain(403, "set HEALTHCHECK_TOKEN to change limits at runtime")
+            return
+        if not self._check_token():
+            self._send_unauthorized()
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > 4096:
+            self._send_plain(400, "expected a small JSON body")
+            return
+        try:
+            changes = json.loads(self.rfile.read(length))
+            snapshot = limits.update(changes)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError as well.
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(200, snapshot)
+
     # ------------------------------------------------------------------ verbs
     def do_GET(self):
         path = self.path.split("?", 1)[0]
@@ -243,9 +356,18 @@ class _SilentHandler(BaseHTTPRequestHandler):
             self._route_health()
         elif path == "/status":
             self._route_status()
+        elif path == "/limits":
+            self._route_limits_get()
         else:
             self._send_plain(404, "not found")
 
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/limits":
+            self._route_limits_post()
+        else:
+            self._reject_method()
+
     def do_HEAD(self):
         # Treat HEAD identically to GET — same status + headers, no body.
         # The _send_* helpers already check self.command to suppress the body.
@@ -257,7 +379,6 @@ class _SilentHandler(BaseHTTPRequestHandler):
         self.send_header("Content-Length", "0")
         self.end_headers()
 
-    do_POST = _reject_method
     do_PUT = _reject_method
     do_DELETE = _reject_method
     do_PATCH = _reject_method
@@ -0,0 +1,76 @@
+"""
+Structural check of MP4 clips before they are uploaded.
+
+Frigate occasionally serves clips whose `moov` atom is missing or cut off
+(corrupt recording segments, an aborted assembly). Such a file is
+unplayable, yet it downloads "successfully" and would be uploaded in full.
+`check_mp4()` walks only the top-level box headers, seeking over each box
+body, so it reads a few bytes per box and never touches `mdat`: a multi-GB
+clip is checked in milliseconds.
+"""
+
+import os
+import struct
+
+# Boxes allowed at the top level of a Frigate clip. Anything else is taken
+# as a sign that the walk has left the box structure (garbage or truncation).
+_TOP_LEVEL_BOXES = {
+    b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'uuid', b'meta',
+    b'moof', b'mfra', b'sidx', b'styp', b'pdin', b'prft', b'emsg',
+}
+
+
+def check_mp4(path):
+    """
+    Validate the top-level box layout of an MP4 file.
+
+    Checks that `ftyp` comes first, that `moov` and media data (`mdat`, or
+    `moof` for fragmented files) are present, that `moov` is not empty and
+    that the box sizes add up to the file size exactly.
+
+    :param path: file to check
+    :return: None if the structure is sound, else a short description of the problem
+    """
+    file_size = os.path.getsize(path)
+    seen = []
+    offset = 0
+    with open(path, 'rb') as fh:
+        while offset < file_size:
+            if file_size - offset < 8:
+                return f"{file_size - offset} trailing bytes after the last box"
+            fh.seek(offset)
+            size, box_type = struct.unpack('>I4s', fh.read(8))
+            header = 8
+            if size == 1:
+                if file_size - offset < 16:
+                    return f"truncated 64-bit header of '{_name(box_type)}' box"
+                size, = struct.unpack('>Q', fh.read(8))
+                header = 16
+            elif size == 0:
+                # Box extends to the end of the file.
+                size = file_size - offset
+            if box_type not in _TOP_LEVEL_BOXES:
+                return f"unexpected top-level box '{_name(box_type)}' at offset {offset}"
+            if size < header:
+                return f"'{_name(box_type)}' box at offset {offset} has invalid size {size}"
+            if offset + size > file_size:
+                return (f"'{_name(box_type)}' box at offset {offset} needs {size} bytes, "
+                        f"file ends after {file_size - offset} (truncated)")
+            if box_type == b'moov' and size == header:
+                return "empty 'moov' box"
+            seen.append(box_type)
+            offset += size
+
+    if not seen:
+        return "empty file"
+    if seen[0] != b'ftyp':
+        return f"file starts with '{_name(seen[0])}' instead of 'ftyp'"
+    if b'moov' not in seen:
+        return "no 'moov' box (missing index, unplayable)"
+    if b'mdat' not in seen and b'moof' not in seen:
+        return "no 'mdat' box (no media data)"
+    return None
+
+
+def _name(box_type):
+    return box_type.decode('latin-1')
@@ -0,0 +1,254 @@
+"""
+Uploading events as parts: progressive capture and segmented downloads.
+
+Normally an event is uploaded as one clip.mp4 that Frigate assembles after
+the MQTT `end` message; for a 40-minute event that takes long and is where
+timeouts and truncated downloads come from. Instead, an event can be cut
+into fixed-length parts on a grid starting PADDING_SECONDS before the event,
+each fetched through the recordings API
+(`/api/<camera>/start/<ts>/end/<ts>/clip.mp4`) and uploaded as
+`...__partNN.mp4`:
+
+  - Progressive capture (PROGRESSIVE_CAPTURE_SEGMENT_SECONDS): `new` /
+    `update` messages register a running event, and each full segment is
+    uploaded while the event is still in progress. A failed segment is
+    retried on the next tick; after MAX_PART_FAILURES failures in a row the
+    event is left to the upload at its end.
+  - Segmented download (SEGMENTED_DOWNLOAD_THRESHOLD_SECONDS): a finished
+    event longer than the threshold is fetched as parts, several at a time.
+
+Either way, when the event is uploaded after its end only the grid parts
+that are not uploaded yet are fetched (`missing_parts()`): the short tail of
+a progressively captured event, or the segments that failed last time, so a
+failure costs one segment instead of the whole clip. Uploaded parts are
+recorded in the `event_parts` table. The grid length is the progressive
+segment length when that is enabled, else SEGMENTED_DOWNLOAD_SEGMENT_SECONDS.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src import database
+from src.env import int_from_env
+
+load_dotenv()
+
+# Frigate writes 10 s recording segments and moves them out of its cache
+# shortly after; only ask for ranges that are safely on disk.
+SEGMENT_SETTLE_SECONDS = 30
+MAX_PART_FAILURES = 3
+# Active events without an update for this long are dropped (missed `end`
+# message); the regular listing still picks the event up.
+STALE_EVENT_SECONDS = 3600
+TICK_SECONDS = 15
+
+
+class ProgressiveCapture:
+    def __init__(
+        self,
+        segment_seconds: int = 0,
+        padding_seconds: int = 5,
+        max_duration: int = 0,
+        split_threshold: int = 0,
+        split_seconds: int = 600,
+        split_concurrency: int = 3,
+    ):
+        self.segment_seconds = segment_seconds
+        self.padding_seconds = padding_seconds
+        # Segmented download of finished events (0 = off).
+        self.split_threshold = split_threshold
+        self.split_seconds = split_seconds
+        self.split_concurrency = max(1, split_concurrency)
+        # Events longer than this are skipped at their end anyway
+        # (SKIP_EVENTS_LONGER_THAN_SECONDS, set by main).
+        self.max_duration = max_duration
+
+        self._cond = threading.Condition()
+        self._active: dict[str, dict] = {}
+        self._uploading: Optional[str] = None
+        self._parts_uploaded = 0
+        self._parts_failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._upload_part: Optional[Callable[[dict, int, float, float], bool]] = None
+        self._can_run: Callable[[], bool] = lambda: True
+
+    @property
+    def enabled(self) -> bool:
+        return self.segment_seconds > 0
+
+    @property
+    def part_seconds(self) -> int:
+        """Length of one grid part, shared by both modes."""
+        return self.segment_seconds or self.split_seconds
+
+    # ------------------------------------------------------------ MQTT side
+    def observe(self, event: dict) -> None:
+        """Register / refresh an in-progress event (`new` or `update` message)."""
+        if not self.enabled or not event.get('id') or event.get('start_time') is None:
+            return
+        with self._cond:
+            entry = self._active.get(event['id'])
+            if entry is None:
+                entry = self._active[event['id']] = {
+                    'id': event['id'],
+                    'camera': event.get('camera'),
+                    'label': event.get('label'),
+                    'start_time': event['start_time'],
+                    'next_part': None,
+                    'failures': 0,
+                }
+                logging.debug(f"Progressive capture: tracking event {event['id']}.")
+            entry['last_seen'] = time.time()
+
+    def finish(self, event_id: str) -> None:
+        """Stop capturing parts of an event (its `end` message arrived)."""
+        with self._cond:
+            self._active.pop(event_id, None)
+
+    # ---------------------------------------------------------- upload side
+    def part_range(self, start_time: float, part: int) -> tuple:
+        base = start_time - self.padding_seconds
+        return base + (part - 1) * self.part_seconds, base + part * self.part_seconds
+
+    def uses_parts(self, event_id: str, duration: Optional[float]) -> bool:
+        """True if a finished event is uploaded as parts instead of one clip."""
+        if self.split_threshold > 0 and duration is not None and duration > self.split_threshold:
+            return True
+        return bool(database.select_event_part_numbers(event_id))
+
+    def missing_parts(self, event_id: str, start_time: float, end_time: float) -> list:
+        """
+        ``[(part, start_ts, end_ts), ...]`` of a finished event that are not
+        uploaded yet; the last part ends PADDING_SECONDS after the event.
+        Waits for a part of this event that is being uploaded right now.
+        """
+        with self._cond:
+            while self._uploading == event_id:
+                self._cond.wait()
+        uploaded = set(database.select_event_part_numbers(event_id))
+        end = end_time + self.padding_seconds
+        missing = []
+        part = 1
+        while True:
+            start_ts, end_ts = self.part_range(start_time, part)
+            if start_ts >= end:
+                break
+            if part not in uploaded:
+                missing.append((part, start_ts, min(end_ts, end)))
+            part += 1
+        return missing
+
+    # -------------------------------------------------------------- thread
+    def start(self, upload_part: Callable[[dict, int, float, float], bool], can_run: Callable[[], bool]):
+        """
+        Start the capture thread. ``upload_part(event, part, start_ts, end_ts)``
+        fetches and uploads one segment and returns True on success;
+        ``can_run()`` gates each tick (connectivity, Frigate circuit).
+        """
+        if not self.enabled or self._thread is not None:
+            return self._thread
+        self._upload_part = upload_part
+        self._can_run = can_run
+        self._thread = threading.Thread(target=self._run, name="progressive-capture", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except Exception as e:
+                logging.error(f"Progressive capture pass failed: {e}", exc_info=True)
+            self._wake.wait(TICK_SECONDS)
+            self._wake.clear()
+
+    def _tick(self) -> None:
+        now = time.time()
+        with self._cond:
+            for event_id, entry in list(self._active.items()):
+                if now - entry['last_seen'] > STALE_EVENT_SECONDS:
+                    logging.info(f"Progressive capture: no update for event {event_id} in a while, dropping it.")
+                    del self._active[event_id]
+            entries = list(self._active.values())
+        for entry in entries:
+            if entry['failures'] >= MAX_PART_FAILURES:
+                continue
+            if entry['next_part'] is None:
+                entry['next_part'] = max(database.select_event_part_numbers(entry['id']), default=0) + 1
+            while not self._stop.is_set() and self._can_run():
+                part = entry['next_part']
+                start_ts, end_ts = self.part_range(entry['start_time'], part)
+                if end_ts + SEGMENT_SETTLE_SECONDS > time.time():
+                    break
+                if self.max_duration and end_ts - entry['start_time'] > self.max_duration:
+                    break
+                if not self._begin(entry['id']):
+                    break
+                try:
+                    ok = self._upload_part(entry, part, start_ts, end_ts)
+                finally:
+                    self._end()
+                if not ok:
+                    entry['failures'] += 1
+                    self._parts_failed += 1
+                    if entry['failures'] >= MAX_PART_FAILURES:
+                        logging.warning(
+                            f"Progressive capture: part {part} of event {entry['id']} failed "
+                            f"{entry['failures']} times. The rest is uploaded when the event ends."
+                        )
+                    break
+                entry['next_part'] = part + 1
+                entry['failures'] = 0
+                self._parts_uploaded += 1
+
+    def _begin(self, event_id: str) -> bool:
+        with self._cond:
+            if event_id not in self._active:
+                return False
+            self._uploading = event_id
+            return True
+
+    def _end(self) -> None:
+        with self._cond:
+            self._uploading = None
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "segment_seconds": self.segment_seconds,
+                "split_threshold_seconds": self.split_threshold,
+                "active_events": len(self._active),
+                "parts_uploaded": self._parts_uploaded,
+                "parts_failed": self._parts_failed,
+            }
+
+
+def _build_capture() -> ProgressiveCapture:
+    segment_seconds = int_from_env('PROGRESSIVE_CAPTURE_SEGMENT_SECONDS', 0)
+    if 0 < segment_seconds < 60:
+        logging.warning("PROGRESSIVE_CAPTURE_SEGMENT_SECONDS below 60 is not useful, using 60.")
+        segment_seconds = 60
+    return ProgressiveCapture(
+        segment_seconds=segment_seconds,
+        padding_seconds=int_from_env('PROGRESSIVE_CAPTURE_PADDING_SECONDS', 5),
+        split_threshold=int_from_env('SEGMENTED_DOWNLOAD_THRESHOLD_SECONDS', 0),
+        split_seconds=max(60, int_from_env('SEGMENTED_DOWNLOAD_SEGMENT_SECONDS', 600)),
+        split_concurrency=int_from_env('SEGMENTED_DOWNLOAD_CONCURRENCY', 3),
+    )
+
+
+progressive_capture = _build_capture()
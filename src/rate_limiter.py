@@ -0,0 +1,186 @@
+"""
+Token-bucket byte-rate limits for Frigate downloads and Drive uploads.
+
+One bucket per direction, shared by every concurrent transfer in the process,
+so the configured rate is a total and not a per-transfer limit:
+
+  - `frigate_download`: consumed in the `iter_content` loop of
+    `download_video_with_retry()` (protects the NVR's disk and LAN).
+  - `drive_upload`: consumed by `ThrottledReader` as `MediaIoBaseUpload`
+    pulls each resumable-upload chunk (protects the uplink).
+
+Consumers reserve tokens and sleep outside the lock until their reservation is
+covered, so several transfers share the rate in arrival order. A rate of 0
+disables a bucket. Limits can be changed at runtime (see
+`RateLimits.update()`, used by the healthcheck server's `/limits` endpoint).
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def parse_rate(value):
+    """
+    Parse a byte rate per second such as '2MB', '512KB', '1.5MB' or '0'.
+    Plain numbers are bytes per second. Raises ValueError on invalid input.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        if value < 0:
+            raise ValueError(f"Negative rate: {value}")
+        return int(value)
+    text = str(value).strip().upper()
+    if text.endswith('/S'):
+        text = text[:-2].strip()
+    if text in ('', '0'):
+        return 0
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*(GB|MB|KB|B)?$', text)
+    if not match:
+        raise ValueError(f"Invalid rate '{value}'")
+    num_str, unit = match.groups()
+    multipliers = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+    return int(float(num_str) * multipliers.get(unit, 1))
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float = 0, burst: float = None):
+        self.name = name
+        self._lock = threading.Lock()
+        self._rate = 0.0
+        self._burst = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._throttled_seconds = 0.0
+        self._bytes = 0
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float, burst: float = None) -> None:
+        """Change the rate (bytes/s, 0 = unlimited). Burst defaults to 1 s worth."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = float(max(0, rate))
+            self._burst = float(burst) if burst else self._rate
+            # Forgive outstanding debt so a lowered/raised limit applies now.
+            self._tokens = min(max(self._tokens, 0.0), self._burst)
+
+    def _refill(self, now: float) -> None:
+        if self._rate > 0:
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def consume(self, amount: int) -> float:
+        """Take `amount` tokens, sleeping as needed. Returns the seconds slept."""
+        if amount <= 0:
+            return 0.0
+        with self._lock:
+            self._bytes += amount
+            if self._rate <= 0:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            self._throttled_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "bytes_per_second": int(self._rate),
+                "transferred_mb": round(self._bytes / 1e6, 1),
+                "throttled_seconds": round(self._throttled_seconds, 1),
+            }
+
+
+class ThrottledReader(io.RawIOBase):
+    """
+    Seekable read-only wrapper that charges a `TokenBucket` for every byte
+    read. `MediaIoBaseUpload` reads one chunk per resumable request, so the
+    upload is paced chunk by chunk.
+    """
+
+    def __init__(self, raw, bucket: TokenBucket):
+        self._raw = raw
+        self._bucket = bucket
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self._bucket.consume(len(data))
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class RateLimits:
+    """Named set of buckets that can be inspected and changed at runtime."""
+
+    def __init__(self, buckets: dict):
+        self.buckets = dict(buckets)
+
+    def snapshot(self) -> dict:
+        return {name: bucket.snapshot() for name, bucket in self.buckets.items()}
+
+    def update(self, changes: dict) -> dict:
+        """
+        Apply ``{name: rate}`` (rates as accepted by `parse_rate`). All changes
+        are validated before any is applied. Raises ValueError on bad input.
+        """
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError("Expected a JSON object like {\"drive_upload\": \"2MB\"}")
+        parsed = {}
+        for name, value in changes.items():
+            if name not in self.buckets:
+                raise ValueError(f"Unknown limit '{name}'")
+            parsed[name] = parse_rate(value)
+        for name, rate in parsed.items():
+            self.buckets[name].set_rate(rate)
+            logging.info(f"Rate limit '{name}' set to {f'{rate / 1024:.0f} KB/s' if rate else 'unlimited'}")
+        return self.snapshot()
+
+
+def _rate_from_env(name):
+    try:
+        return parse_rate(os.getenv(name, '0'))
+    except ValueError:
+        logging.warning(f"Invalid {name} value '{os.getenv(name)}', disabling limit.")
+        return 0
+
+
+frigate_download_bucket = TokenBucket('frigate_download', _rate_from_env('FRIGATE_DOWNLOAD_RATE_LIMIT'))
+drive_upload_bucket = TokenBucket('drive_upload', _rate_from_env('DRIVE_UPLOAD_RATE_LIMIT'))
+
+limits = RateLimits({
+    'frigate_download': frigate_download_bucket,
+    'drive_upload': drive_upload_bucket,
+})
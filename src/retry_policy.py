@@ -0,0 +1,76 @@
+"""
+Per-event retry schedule.
+
+After a failed upload attempt the event's `next_attempt_at` is pushed into the
+future by an exponential backoff whose base depends on the failure category:
+transient network / Drive hiccups are retried within minutes, while Frigate
+clip-assembly problems (truncated streams, read timeouts) back off more slowly,
+with a longer base, because every retry makes Frigate re-assemble the whole clip.
+"""
+
+import random
+import time
+
+from src.env import int_from_env
+from src.google_drive import (
+    ERR_CLIP_CORRUPT,
+    ERR_DRIVE_5XX,
+    ERR_DRIVE_CHECKSUM,
+    ERR_DRIVE_HTTP,
+    ERR_DRIVE_NETWORK,
+    ERR_DRIVE_OTHER,
+    ERR_FRIGATE_DOWNLOAD_5XX,
+    ERR_FRIGATE_DOWNLOAD_EMPTY,
+    ERR_FRIGATE_DOWNLOAD_OTHER,
+    ERR_FRIGATE_DOWNLOAD_TIMEOUT,
+    ERR_FRIGATE_DOWNLOAD_TRUNCATED,
+)
+
+# Delay before the first retry, per error kind (seconds). Doubles per try.
+BASE_DELAY_BY_KIND = {
+    ERR_DRIVE_NETWORK: 60,
+    ERR_DRIVE_5XX: 120,
+    # The spooled copy is dropped, so the retry downloads the clip again.
+    ERR_DRIVE_CHECKSUM: 120,
+    ERR_FRIGATE_DOWNLOAD_EMPTY: 120,
+    ERR_FRIGATE_DOWNLOAD_5XX: 300,
+    ERR_FRIGATE_DOWNLOAD_OTHER: 300,
+    ERR_DRIVE_OTHER: 300,
+    ERR_DRIVE_HTTP: 600,
+    ERR_FRIGATE_DOWNLOAD_TIMEOUT: 900,
+    ERR_FRIGATE_DOWNLOAD_TRUNCATED: 1800,
+    # Frigate re-assembles the clip from the same segments; rarely fixes itself soon.
+    ERR_CLIP_CORRUPT: 1800,
+}
+DEFAULT_BASE_DELAY = 300
+
+# Upper bound for a single backoff step.
+RETRY_BACKOFF_MAX_SECONDS = int_from_env('RETRY_BACKOFF_MAX_SECONDS', 3600)
+
+
+def compute_backoff_seconds(tries, last_error_kind):
+    """
+    Exponential backoff with "equal jitter": the delay is drawn uniformly from
+    [d/2, d], where d = base(kind) * 2^(tries-1), capped at
+    RETRY_BACKOFF_MAX_SECONDS. The jitter spreads a backlog that failed
+    together (e.g. during an outage) instead of retrying it in one burst.
+    """
+    base = BASE_DELAY_BY_KIND.get(last_error_kind, DEFAULT_BASE_DELAY)
+    exponent = min(max(0, (tries or 1) - 1), 20)
+    delay = min(base * (2 ** exponent), RETRY_BACKOFF_MAX_SECONDS)
+    return random.uniform(delay / 2, delay)
+
+
+# An event that is still running when its retry comes up is checked again
+# after this; its 'end' message or the listing usually queues it earlier.
+IN_PROGRESS_RECHECK_SECONDS = 300
+# Events skipped during an outage are due again on recovery (see main.py);
+# this is the fallback in case no recovery signal arrives.
+OUTAGE_RECHECK_SECONDS = 600
+
+
+def compute_next_attempt_at(tries, last_error_kind, now=None):
+    """Return the Unix timestamp of the event's next retry."""
+    if now is None:
+        now = time.time()
+    return now + compute_backoff_seconds(tries, last_error_kind)
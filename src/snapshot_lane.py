@@ -0,0 +1,157 @@
+"""
+Snapshot fast lane (UPLOAD_SNAPSHOTS).
+
+A clip reaches Drive only after Frigate assembled it and it was downloaded
+and uploaded, behind whatever clip transfer is running; for an alert that is
+minutes. With the fast lane enabled, the event's snapshot.jpg is uploaded
+first, into the same date folder under the clip's name with a .jpg
+extension. The lane is its own thread with its own Drive client and lock
+per account (see `upload_snapshot()`), so it never waits for a clip upload,
+the upload queue or the Drive upload rate limit.
+
+Snapshot state is tracked in the `snapshot_uploaded` / `snapshot_tries`
+columns, separately from the clip. A failed snapshot is retried a few times
+with a growing delay and then given up; it never holds back the clip.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.env import parse_bool_env
+
+load_dotenv()
+
+MAX_SNAPSHOT_ATTEMPTS = 3
+SNAPSHOT_RETRY_DELAY_SECONDS = 30
+# While can_run() is False (offline, Frigate circuit open), check again after this.
+OFFLINE_RECHECK_SECONDS = 10
+# Finished snapshots remembered by put(), so a second put for the same event
+# (on_message, then handle_single_event) costs no DB lookup.
+RECENT_FINISHED = 1000
+
+
+class SnapshotLane:
+    def __init__(self, enabled: bool = False, max_attempts: int = MAX_SNAPSHOT_ATTEMPTS,
+                 retry_delay: float = SNAPSHOT_RETRY_DELAY_SECONDS):
+        self.enabled = enabled
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self._cond = threading.Condition()
+        # (due, seq, event_data, attempts)
+        self._heap: list = []
+        self._queued: set[str] = set()
+        self._finished: OrderedDict[str, None] = OrderedDict()
+        self._seq = itertools.count()
+        self._uploaded = 0
+        self._failed = 0
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._upload: Optional[Callable[[dict], Optional[bool]]] = None
+        self._can_run: Callable[[], bool] = lambda: True
+
+    def start(self, upload: Callable[[dict], Optional[bool]], can_run: Callable[[], bool]):
+        """
+        Start the lane thread. ``upload(event_data)`` uploads one snapshot and
+        returns True on success, False on a retryable failure and None if
+        there is nothing to upload; ``can_run()`` gates each attempt.
+        """
+        if not self.enabled or self._thread is not None:
+            return self._thread
+        self._upload = upload
+        self._can_run = can_run
+        self._thread = threading.Thread(target=self._run, name="snapshot-lane", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def put(self, event_data: dict) -> bool:
+        """
+        Queue an event's snapshot. Returns False if disabled, snapshot-less,
+        already queued or recently finished.
+        """
+        if not self.enabled or not event_data.get('has_snapshot'):
+            return False
+        event_id = event_data.get('id')
+        if not event_id or event_data.get('start_time') is None:
+            return False
+        with self._cond:
+            if event_id in self._queued or event_id in self._finished:
+                return False
+            self._queued.add(event_id)
+            self._push(time.time(), event_data, 0)
+        return True
+
+    def _push(self, due: float, event_data: dict, attempts: int) -> None:
+        """Holds _cond."""
+        heapq.heappush(self._heap, (due, next(self._seq), event_data, attempts))
+        self._cond.notify_all()
+
+    def _next(self):
+        with self._cond:
+            while not self._stop:
+                if self._heap:
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        return heapq.heappop(self._heap)
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _run(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            _, _, event_data, attempts = item
+            event_id = event_data['id']
+            if not self._can_run():
+                with self._cond:
+                    self._push(time.time() + OFFLINE_RECHECK_SECONDS, event_data, attempts)
+                continue
+            try:
+                result = self._upload(event_data)
+            except Exception as e:
+                logging.error(f"Snapshot upload of event {event_id} failed: {e}", exc_info=True)
+                result = False
+            with self._cond:
+                attempts += 1
+                if result is False and attempts < self.max_attempts:
+                    self._push(time.time() + self.retry_delay * attempts, event_data, attempts)
+                    continue
+                self._queued.discard(event_id)
+                self._finished[event_id] = None
+                if len(self._finished) > RECENT_FINISHED:
+                    self._finished.popitem(last=False)
+                if result:
+                    self._uploaded += 1
+                elif result is False:
+                    self._failed += 1
+                    logging.warning(f"Giving up on the snapshot of event {event_id} after {attempts} attempts.")
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "queued": len(self._queued),
+                "uploaded": self._uploaded,
+                "failed": self._failed,
+            }
+
+
+snapshot_lane = SnapshotLane(enabled=parse_bool_env(os.getenv('UPLOAD_SNAPSHOTS')))
@@ -0,0 +1,384 @@
+"""
+Store-and-forward spool for downloaded clips.
+
+Fetching a clip from Frigate and uploading it to Drive are two separate
+stages that meet here:
+
+  - Fetch stage: the upload path and the background `SpoolPrefetcher` pull
+    clips into SPOOL_DIR whenever Frigate is reachable, whether or not the
+    internet (or Drive) is. The prefetcher works through the pending backlog
+    of ended events, oldest recording first, and stops while the spool is
+    full. A clip spooled before its event ended is fetched again.
+  - Upload stage: `upload_to_google_drive()` streams the spooled file to
+    Drive and the clip is discarded once the event is marked uploaded. A
+    failed upload keeps the file, so retries do not hit Frigate again and a
+    clip survives Frigate's retention once it is spooled.
+
+The manifest is the `spool` table, which also keeps the MD5 computed while
+the clip was downloaded (checked against Drive after the upload). A clip is
+downloaded to `<id>.mp4.part`,
+fsync'd and atomically renamed before its row is written, so a crash can
+only leave a `.part` file (deleted on start) or a complete file without a
+row (adopted on start). When a new clip does not fit into SPOOL_MAX_SIZE the
+least recently used clips are evicted; their events stay pending and are
+fetched from Frigate again later. A clip an upload has fetched is pinned
+until the upload opens it, so it cannot be evicted in between.
+SPOOL_MAX_SIZE=0 disables the spool: clips are still staged on disk, but
+only for the duration of one transfer. The same goes for a single clip
+larger than SPOOL_MAX_SIZE, so it does not evict everything else.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from dotenv import load_dotenv
+
+from src import database
+from src.rate_limiter import parse_rate
+
+load_dotenv()
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db/spool')
+SPOOL_PREFETCH_INTERVAL_SECONDS = 30
+
+_SAFE_EVENT_ID = re.compile(r'^[\w.-]+$')
+
+
+class ClipSpool:
+    def __init__(self, directory: str, max_bytes: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._cond = threading.Condition()
+        # event_id -> [size, spooled_at, last_access, md5]
+        self._entries: dict[str, list] = {}
+        self._fetching: set[str] = set()
+        # Clips kept for one transfer only (spool disabled, or larger than max_bytes).
+        self._staged: set[str] = set()
+        # event_id -> number of fetch(pin=True) callers that have not opened it yet
+        self._pinned: dict[str, int] = {}
+        self._evictions = 0
+        self._prefetched = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ------------------------------------------------------------------ setup
+    def start(self) -> None:
+        """Create the directory and reconcile it with the manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {row[0]: list(row[1:]) for row in database.select_spool_entries()}
+        now = time.time()
+        on_disk = set()
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith('.part'):
+                logging.info(f"Removing incomplete spool file {filename}.")
+                _remove(path)
+                continue
+            if not filename.endswith('.mp4'):
+                continue
+            event_id = filename[:-len('.mp4')]
+            if not self.enabled:
+                _remove(path)
+                continue
+            on_disk.add(event_id)
+            if event_id not in manifest:
+                # Renamed into place but the row was never written: complete,
+                # but its download hash is lost.
+                size = os.path.getsize(path)
+                database.insert_spool_entry(event_id, size, now)
+                manifest[event_id] = [size, now, now, None]
+        for event_id in set(manifest) - on_disk:
+            database.delete_spool_entry(event_id)
+            del manifest[event_id]
+        for event_id in [e for e, entry in manifest.items() if entry[0] > self.max_bytes]:
+            # Staged for a transfer that was interrupted; it does not fit.
+            _remove(self.path_for(event_id))
+            database.delete_spool_entry(event_id)
+            del manifest[event_id]
+        with self._cond:
+            self._entries = manifest
+        if self.enabled:
+            logging.info(
+                f"Spool at {self.directory}: {len(manifest)} clips, "
+                f"{self.used_bytes() / 1e6:.1f} of {self.max_bytes / 1e6:.0f} MB used."
+            )
+
+    # --------------------------------------------------------------- queries
+    def path_for(self, event_id: str) -> str:
+        if not _SAFE_EVENT_ID.match(event_id):
+            raise ValueError(f"Unexpected characters in event id {event_id!r}")
+        return os.path.join(self.directory, f"{event_id}.mp4")
+
+    def contains(self, event_id: str) -> bool:
+        with self._cond:
+            return event_id in self._entries
+
+    def md5_of(self, event_id: str) -> Optional[str]:
+        """MD5 of a spooled clip as computed while downloading, or None."""
+        with self._cond:
+            entry = self._entries.get(event_id)
+            return entry[3] if entry else None
+
+    def used_bytes(self) -> int:
+        with self._cond:
+            return self._used_locked()
+
+    def _used_locked(self, exclude: Optional[str] = None) -> int:
+        return sum(
+            entry[0] for event_id, entry in self._entries.items()
+            if event_id != exclude and event_id not in self._staged
+        )
+
+    def has_room(self, nbytes: float) -> bool:
+        return self.enabled and self.used_bytes() + (nbytes or 0) <= self.max_bytes
+
+    # ------------------------------------------------------------ fetch stage
+    def fetch(self, event_id: str, downloader: Callable[[str], tuple], ended_at: Optional[float] = None,
+              pin: bool = False) -> tuple:
+        """
+        Return ``(path, None)`` for the event's clip, calling
+        ``downloader(dest_path) -> (size, error_kind, md5)`` first if it is not
+        spooled yet. Returns ``(None, error_kind)`` if the download failed.
+        A clip spooled before `ended_at` (the end of the recording) is
+        truncated: it is dropped and downloaded again. With `pin`, the
+        returned clip is not evicted until `open()` or `discard()`.
+        Concurrent calls for the same event share one download. Exceptions
+        from `downloader` propagate after the partial file is removed.
+        """
+        path = self.path_for(event_id)
+        with self._cond:
+            while event_id in self._fetching:
+                self._cond.wait()
+            entry = self._entries.get(event_id)
+            stale = entry is not None and ended_at is not None and entry[1] < ended_at
+            if entry is not None and not stale and os.path.exists(path):
+                entry[2] = time.time()
+                if pin:
+                    self._pin(event_id)
+                database.touch_spool_entry(event_id, entry[2])
+                return path, None
+            self._fetching.add(event_id)
+        if stale:
+            logging.info(f"Spooled clip of event {event_id} predates the end of the event; fetching it again.")
+            self.discard(event_id)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            part = path + '.part'
+            try:
+                size, error_kind, md5 = downloader(part)
+            except BaseException:
+                _remove(part)
+                raise
+            if not size:
+                _remove(part)
+                return None, error_kind
+            self._commit(event_id, part, path, size, md5, pin)
+            return path, None
+        finally:
+            with self._cond:
+                self._fetching.discard(event_id)
+                self._cond.notify_all()
+
+    def prefetch(self, event_id: str, downloader: Callable[[str], tuple]) -> tuple:
+        """`fetch()` for the background prefetcher; counted separately."""
+        path, error_kind = self.fetch(event_id, downloader)
+        if path:
+            with self._cond:
+                self._prefetched += 1
+        return path, error_kind
+
+    def _commit(self, event_id: str, part: str, path: str, size: int, md5: Optional[str], pin: bool) -> None:
+        with open(part, 'rb') as fh:
+            os.fsync(fh.fileno())
+        os.replace(part, path)
+        now = time.time()
+        with self._cond:
+            if not self.enabled or size > self.max_bytes:
+                if self.enabled:
+                    logging.info(
+                        f"Clip of event {event_id} ({size / 1e6:.1f} MB) is larger than SPOOL_MAX_SIZE; "
+                        f"keeping it for this transfer only."
+                    )
+                self._staged.add(event_id)
+            else:
+                self._staged.discard(event_id)
+                self._evict_for(size, keep=event_id)
+            self._entries[event_id] = [size, now, now, md5]
+            if pin:
+                self._pin(event_id)
+        database.insert_spool_entry(event_id, size, now, md5)
+
+    def _pin(self, event_id: str) -> None:
+        """Holds _cond."""
+        self._pinned[event_id] = self._pinned.get(event_id, 0) + 1
+
+    def _unpin(self, event_id: str) -> None:
+        """Holds _cond."""
+        count = self._pinned.pop(event_id, 0) - 1
+        if count > 0:
+            self._pinned[event_id] = count
+
+    def _evict_for(self, size: int, keep: str) -> None:
+        """Evict least recently used clips until `size` more bytes fit. Holds _cond."""
+        used = self._used_locked(exclude=keep)
+        victims = sorted(
+            (entry[2], event_id) for event_id, entry in self._entries.items()
+            if event_id != keep and event_id not in self._fetching
+            and event_id not in self._pinned and event_id not in self._staged
+        )
+        for _, event_id in victims:
+            if used + size <= self.max_bytes:
+                break
+            used -= self._entries.pop(event_id)[0]
+            _remove(self.path_for(event_id))
+            database.delete_spool_entry(event_id)
+            self._evictions += 1
+            logging.warning(
+                f"Spool full: evicted clip of event {event_id}. "
+                f"It will be fetched from Frigate again if still available."
+            )
+
+    # ----------------------------------------------------------- upload stage
+    def open(self, event_id: str):
+        """
+        Open a spooled clip for reading, or return None if it is gone, and
+        release the pin of `fetch(pin=True)`. A clip kept for one transfer
+        (spool disabled or clip too large) is unlinked right away; the open
+        handle keeps it readable until closed, so nothing outlives the
+        transfer.
+        """
+        with self._cond:
+            self._unpin(event_id)
+            staged = not self.enabled or event_id in self._staged
+        try:
+            fh = open(self.path_for(event_id), 'rb')
+        except FileNotFoundError:
+            return None
+        if staged:
+            self.discard(event_id)
+        return fh
+
+    def discard(self, event_id: str) -> None:
+        """Drop a clip (uploaded, given up or gone). Safe if it is not spooled."""
+        with self._cond:
+            known = self._entries.pop(event_id, None) is not None
+            self._staged.discard(event_id)
+            self._pinned.pop(event_id, None)
+        _remove(self.path_for(event_id))
+        if known or not self.enabled:
+            database.delete_spool_entry(event_id)
+
+    def prune(self, keep_ids: Iterable[str]) -> int:
+        """Discard clips of events that are no longer pending. Returns the count."""
+        keep = set(keep_ids)
+        with self._cond:
+            stale = [event_id for event_id in self._entries if event_id not in keep]
+        for event_id in stale:
+            self.discard(event_id)
+        if stale:
+            logging.info(f"Removed {len(stale)} clips of events that are no longer pending from the spool.")
+        return len(stale)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            used = self._used_locked()
+            return {
+                "enabled": self.enabled,
+                "clips": len(self._entries),
+                "used_mb": round(used / 1e6, 1),
+                "max_mb": round(self.max_bytes / 1e6),
+                "fetching": len(self._fetching),
+                "prefetched": self._prefetched,
+                "evictions": self._evictions,
+            }
+
+
+class SpoolPrefetcher:
+    """
+    Background fetch stage: every `interval` seconds (or on `wake()`), while
+    `can_run()` says Frigate is reachable, spools the clips yielded by
+    `candidates()` as ``(event_id, expected_bytes)`` until the spool is full.
+    """
+
+    def __init__(
+        self,
+        spool: ClipSpool,
+        candidates: Callable[[], Iterable[tuple]],
+        fetch: Callable[[str], None],
+        can_run: Callable[[], bool],
+        interval: float = SPOOL_PREFETCH_INTERVAL_SECONDS,
+    ):
+        self.spool = spool
+        self.candidates = candidates
+        self.fetch = fetch
+        self.can_run = can_run
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Optional[threading.Thread]:
+        if not self.spool.enabled or self._thread is not None:
+            return self._thread
+        self._thread = threading.Thread(target=self._run, name="spool-prefetcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.can_run():
+                    self._prefetch_pass()
+            except Exception as e:
+                logging.error(f"Spool prefetch pass failed: {e}", exc_info=True)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _prefetch_pass(self) -> None:
+        for event_id, expected_bytes in self.candidates():
+            if self._stop.is_set() or not self.can_run():
+                return
+            if self.spool.contains(event_id):
+                continue
+            if expected_bytes and expected_bytes > self.spool.max_bytes:
+                continue  # would only be staged for one transfer; the upload fetches it
+            if not self.spool.has_room(expected_bytes):
+                logging.debug("Spool is full; prefetching paused until clips are uploaded.")
+                return
+            self.fetch(event_id)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Could not remove spool file {path}: {e}")
+
+
+def _max_bytes_from_env() -> int:
+    try:
+        return parse_rate(os.getenv('SPOOL_MAX_SIZE', '2GB'))
+    except ValueError:
+        logging.warning(f"Invalid SPOOL_MAX_SIZE value '{os.getenv('SPOOL_MAX_SIZE')}', disabling the spool.")
+        return 0
+
+
+spool = ClipSpool(os.getenv('SPOOL_DIR') or DEFAULT_SPOOL_DIR, _max_bytes_from_env())
@@ -0,0 +1,396 @@
+"""
+Priority queue in front of the upload engine.
+
+Every producer (MQTT `end` messages, the Frigate listing, the retry dispatcher)
+puts work here instead of calling `handle_single_event()` inline; a small pool
+of worker threads drains it. Work is ordered by a score where higher means
+sooner:
+
+    score = label_weight[label]
+            - recency_weight * event_age_hours
+            - retry_weight   * tries
+            - size_weight    * estimated_gigabytes
+            + aging_weight   * hours_waited_in_queue
+
+so a fresh person-at-the-door event overtakes hours of backlog, while the
+aging term (which grows faster than the recency penalty, aging_weight >
+recency_weight) guarantees that backlog items eventually win and the queue
+drains even under a constant stream of fresh events. The size term is a
+shortest-job-first bias: one multi-hour clip no longer blocks dozens of short
+ones. The transfer size is the HEAD/download-known clip size if we have one,
+else the event duration times the bitrate learned from earlier clips.
+
+Both time-dependent terms are linear in "now" with the same slope for every
+item, so the relative order of two queued items never changes over time and a
+plain binary heap keyed by the time-independent part of the score suffices.
+
+The score orders work *within* a camera. Each camera has its own heap (lane)
+and lanes are served by smooth weighted round-robin with UPLOAD_CAMERA_SHARES,
+so one busy camera cannot starve the others; UPLOAD_CAMERA_MAX_CONCURRENCY
+optionally caps how many of a camera's events are processed at once.
+
+Shortest-job-first alone would starve long clips until Frigate prunes them.
+A second heap orders items by their retention deadline (start_time +
+FRIGATE_RETENTION_DAYS); any item within UPLOAD_DEADLINE_WINDOW_HOURS of that
+deadline is served earliest-deadline-first ahead of the score order. Items
+already past the deadline fall back to the score order (Frigate may have kept
+them anyway; a 404 on download removes them).
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.env import float_from_env
+
+load_dotenv()
+
+SOURCE_MQTT = 'mqtt'
+SOURCE_LISTING = 'listing'
+SOURCE_RETRY = 'retry'
+# Lane for events without a known camera (rows from before migration 7).
+UNKNOWN_CAMERA = 'unknown'
+
+# Used until the DB has learned a real bitrate (roughly 2 Mbit/s).
+DEFAULT_CLIP_BYTES_PER_SECOND = float_from_env('DEFAULT_CLIP_BYTES_PER_SECOND', 250000)
+# Assumed duration for events whose end_time is unknown.
+DEFAULT_CLIP_SECONDS = 30.0
+FRIGATE_RETENTION_DAYS = float_from_env('FRIGATE_RETENTION_DAYS', 14)
+UPLOAD_DEADLINE_WINDOW_HOURS = float_from_env('UPLOAD_DEADLINE_WINDOW_HOURS', 24)
+
+
+def _parse_weight_map(value, name):
+    """Parse 'person:30,car:10' into {'person': 30.0, 'car': 10.0}."""
+    weights = {}
+    if not value:
+        return weights
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            key, weight = part.rsplit(':', 1)
+            weights[key.strip()] = float(weight)
+        except ValueError:
+            logging.warning(f"Ignoring invalid entry '{part}' in {name}. Expected 'name:weight'.")
+    return weights
+
+
+@dataclass
+class PriorityWeights:
+    label: dict = field(default_factory=lambda: {'person': 30.0, 'car': 10.0})
+    recency: float = 10.0   # points lost per hour of event age
+    retry: float = 2.0      # points lost per failed attempt
+    aging: float = 20.0     # points gained per hour waited in the queue
+    size: float = 60.0      # points lost per GB of estimated transfer
+
+    @classmethod
+    def from_env(cls):
+        weights = cls()
+        if os.getenv('UPLOAD_PRIORITY_LABEL_WEIGHTS') is not None:
+            weights.label = _parse_weight_map(os.getenv('UPLOAD_PRIORITY_LABEL_WEIGHTS'), 'UPLOAD_PRIORITY_LABEL_WEIGHTS')
+        weights.recency = float_from_env('UPLOAD_PRIORITY_RECENCY_WEIGHT', weights.recency)
+        weights.retry = float_from_env('UPLOAD_PRIORITY_RETRY_WEIGHT', weights.retry)
+        weights.aging = float_from_env('UPLOAD_PRIORITY_AGING_WEIGHT', weights.aging)
+        weights.size = float_from_env('UPLOAD_PRIORITY_SIZE_WEIGHT', weights.size)
+        if weights.aging <= weights.recency:
+            logging.warning(
+                f"UPLOAD_PRIORITY_AGING_WEIGHT ({weights.aging}) should exceed "
+                f"UPLOAD_PRIORITY_RECENCY_WEIGHT ({weights.recency}), otherwise old "
+                f"backlog can starve behind a constant stream of fresh events."
+            )
+        return weights
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "recency_per_hour": self.recency,
+            "retry_per_try": self.retry,
+            "aging_per_hour": self.aging,
+            "size_per_gb": self.size,
+        }
+
+
+@dataclass
+class WorkItem:
+    event_id: str
+    source: str
+    # Full Frigate event dict when known (MQTT / listing). Retry items only
+    # carry the metadata stored in the DB and are fetched from Frigate by the
+    # worker right before processing.
+    event_data: Optional[dict] = None
+    camera: Optional[str] = None
+    label: Optional[str] = None
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    # Clip size reported by Frigate (HEAD / earlier download), if known.
+    size_bytes: Optional[int] = None
+    tries: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    # Filled in by UploadQueue.put().
+    estimated_bytes: float = 0.0
+    deadline: Optional[float] = None
+
+    @property
+    def lane(self) -> str:
+        return self.camera or UNKNOWN_CAMERA
+
+    def static_score(self, weights: PriorityWeights) -> float:
+        """Time-independent part of the score (see module docstring)."""
+        score = weights.label.get(self.label, 0.0)
+        score -= weights.retry * (self.tries or 0)
+        score -= weights.size * self.estimated_bytes / 1e9
+        # -recency * (now - start_time) / 3600  ->  +recency * start_time / 3600
+        start_time = self.start_time if self.start_time is not None else self.enqueued_at
+        score += weights.recency * start_time / 3600.0
+        # +aging * (now - enqueued_at) / 3600    ->  -aging * enqueued_at / 3600
+        score -= weights.aging * self.enqueued_at / 3600.0
+        return score
+
+    def score(self, weights: PriorityWeights, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        return self.static_score(weights) + (weights.aging - weights.recency) * now / 3600.0
+
+
+class _Lane:
+    """Per-camera heap plus weighted round-robin state."""
+
+    def __init__(self, share: float, cap: int):
+        self.heap: list = []
+        self.share = share
+        self.cap = cap  # 0 = no cap
+        self.current_weight = 0.0
+        self.in_flight = 0
+
+
+class UploadQueue:
+    def __init__(
+        self,
+        weights: Optional[PriorityWeights] = None,
+        retention_seconds: float = 14 * 86400,
+        deadline_window: float = 24 * 3600,
+        camera_shares: Optional[dict] = None,
+        camera_caps: Optional[dict] = None,
+    ):
+        self.weights = weights or PriorityWeights()
+        self.retention_seconds = retention_seconds
+        self.deadline_window = deadline_window
+        self.camera_shares = dict(camera_shares or {})
+        self.camera_caps = {k: int(v) for k, v in (camera_caps or {}).items()}
+        self._bitrates: dict = {}
+        self._lanes: dict[str, _Lane] = {}
+        self._deadline_heap: list = []
+        self._queued: dict[str, WorkItem] = {}
+        self._in_flight: dict[str, WorkItem] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers: list[threading.Thread] = []
+
+    def __len__(self):
+        with self._cond:
+            return len(self._queued)
+
+    def update_bitrates(self, bitrates: dict) -> None:
+        """Set learned bytes/second per camera (key None = all cameras)."""
+        self._bitrates = dict(bitrates or {})
+
+    def estimate_clip_bytes(self, camera: Optional[str], duration: Optional[float]) -> float:
+        """Duration x learned bitrate of `camera` (falls back to defaults)."""
+        bitrates = self._bitrates
+        bitrate = bitrates.get(camera) or bitrates.get(None) or DEFAULT_CLIP_BYTES_PER_SECOND
+        if duration is None or duration <= 0:
+            duration = DEFAULT_CLIP_SECONDS
+        return duration * bitrate
+
+    def estimate_bytes(self, item: WorkItem) -> float:
+        if item.size_bytes:
+            return float(item.size_bytes)
+        duration = None
+        if item.start_time is not None and item.end_time is not None:
+            duration = item.end_time - item.start_time
+        return self.estimate_clip_bytes(item.camera, duration)
+
+    def put(self, item: WorkItem) -> bool:
+        """
+        Enqueue `item`. Returns False if the event is already queued or being
+        processed. A queued duplicate is upgraded if the new item carries full
+        event data (e.g. MQTT beats the retry loop).
+        """
+        with self._cond:
+            if item.event_id in self._in_flight:
+                return False
+            existing = self._queued.get(item.event_id)
+            if existing is not None:
+                if existing.event_data is None and item.event_data is not None:
+                    existing.event_data = item.event_data
+                return False
+            item.estimated_bytes = self.estimate_bytes(item)
+            if item.start_time is not None and self.retention_seconds > 0:
+                item.deadline = item.start_time + self.retention_seconds
+            self._queued[item.event_id] = item
+            seq = next(self._seq)
+            heapq.heappush(self._lane(item.lane).heap, (-item.static_score(self.weights), seq, item))
+            if item.deadline is not None:
+                heapq.heappush(self._deadline_heap, (item.deadline, seq, item))
+            self._cond.notify()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[WorkItem]:
+        """Pop the next item, blocking up to `timeout` seconds."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                item = self._pop_urgent(time.time()) or self._pop_weighted()
+                if item is not None:
+                    del self._queued[item.event_id]
+                    self._in_flight[item.event_id] = item
+                    self._lanes[item.lane].in_flight += 1
+                    return item
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = _Lane(self.camera_shares.get(name, 1.0), self.camera_caps.get(name, 0))
+            self._lanes[name] = lane
+        return lane
+
+    def _is_current(self, item: WorkItem) -> bool:
+        # All heaps use lazy deletion: an entry is stale once its item was
+        # taken through another heap.
+        return self._queued.get(item.event_id) is item
+
+    def _lane_available(self, lane: _Lane) -> bool:
+        return not lane.cap or lane.in_flight < lane.cap
+
+    def _pop_urgent(self, now: float) -> Optional[WorkItem]:
+        """Earliest-deadline item inside the deadline window whose camera is not capped."""
+        heap = self._deadline_heap
+        skipped = []
+        found = None
+        while heap:
+            item_deadline, _, item = heap[0]
+            if not self._is_current(item) or item_deadline <= now:
+                heapq.heappop(heap)
+                continue
+            if item_deadline - now >= self.deadline_window:
+                break
+            entry = heapq.heappop(heap)
+            if self._lane_available(self._lanes[item.lane]):
+                found = item
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return found
+
+    def _pop_weighted(self) -> Optional[WorkItem]:
+        """Smooth weighted round-robin over non-empty, uncapped camera lanes."""
+        eligible = []
+        for lane in self._lanes.values():
+            while lane.heap and not self._is_current(lane.heap[0][2]):
+                heapq.heappop(lane.heap)
+            if lane.heap and self._lane_available(lane):
+                eligible.append(lane)
+        if not eligible:
+            return None
+        total = 0.0
+        for lane in eligible:
+            lane.current_weight += lane.share
+            total += lane.share
+        chosen = max(eligible, key=lambda lane: lane.current_weight)
+        chosen.current_weight -= total
+        return heapq.heappop(chosen.heap)[2]
+
+    def is_in_flight(self, event_id: str) -> bool:
+        with self._cond:
+            return event_id in self._in_flight
+
+    def contains(self, event_id: str) -> bool:
+        """True if the event is queued or being processed."""
+        with self._cond:
+            return event_id in self._queued or event_id in self._in_flight
+
+    def task_done(self, item: WorkItem) -> None:
+        with self._cond:
+            if self._in_flight.pop(item.event_id, None) is not None:
+                self._lanes[item.lane].in_flight -= 1
+            # A freed camera slot may unblock a worker waiting on a capped lane.
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        """Aggregate view for /status. Deliberately contains no event IDs."""
+        now = time.time()
+        with self._cond:
+            queued = list(self._queued.values())
+            in_flight = len(self._in_flight)
+            per_camera = {
+                name: {"depth": 0, "in_flight": lane.in_flight, "oldest_wait_seconds": 0,
+                       "share": lane.share, "cap": lane.cap or None}
+                for name, lane in self._lanes.items()
+            }
+        by_source = {}
+        for item in queued:
+            by_source[item.source] = by_source.get(item.source, 0) + 1
+            lane_stats = per_camera[item.lane]
+            lane_stats["depth"] += 1
+            lane_stats["oldest_wait_seconds"] = max(
+                lane_stats["oldest_wait_seconds"], round(now - item.enqueued_at)
+            )
+        urgent = sum(
+            1 for i in queued
+            if i.deadline is not None and 0 < i.deadline - now < self.deadline_window
+        )
+        return {
+            "depth": len(queued),
+            "in_flight": in_flight,
+            "by_source": by_source,
+            "near_deadline": urgent,
+            "estimated_mb": round(sum(i.estimated_bytes for i in queued) / 1e6),
+            "oldest_wait_seconds": round(max((now - i.enqueued_at for i in queued), default=0)),
+            "workers": sum(1 for t in self._workers if t.is_alive()),
+            "per_camera": {
+                name: stats for name, stats in per_camera.items()
+                if stats["depth"] or stats["in_flight"]
+            },
+            "weights": self.weights.as_dict(),
+        }
+
+    def start_workers(self, count: int, handler: Callable[[WorkItem], Any]) -> None:
+        """Start `count` daemon threads calling `handler(item)` for each item."""
+        def _run():
+            while True:
+                item = self.get()
+                try:
+                    handler(item)
+                except Exception as e:
+                    logging.error(f"Upload worker failed on event {item.event_id}: {e}", exc_info=True)
+                finally:
+                    self.task_done(item)
+
+        for i in range(max(1, count)):
+            thread = threading.Thread(target=_run, name=f"upload-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+
+# Shared instance, fed by the MQTT handler, the listing and the dispatcher.
+work_queue = UploadQueue(
+    PriorityWeights.from_env(),
+    retention_seconds=FRIGATE_RETENTION_DAYS * 86400,
+    deadline_window=UPLOAD_DEADLINE_WINDOW_HOURS * 3600,
+    camera_shares=_parse_weight_map(os.getenv('UPLOAD_CAMERA_SHARES', ''), 'UPLOAD_CAMERA_SHARES'),
+    camera_caps=_parse_weight_map(os.getenv('UPLOAD_CAMERA_MAX_CONCURRENCY', ''), 'UPLOAD_CAMERA_MAX_CONCURRENCY'),
+)
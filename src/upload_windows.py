@@ -0,0 +1,130 @@
+"""
+Time-of-day upload windows for large clips.
+
+Clips above DEFER_CLIPS_LARGER_THAN or longer than
+DEFER_EVENTS_LONGER_THAN_SECONDS are recorded as usual but only transferred
+while one of the UPLOAD_WINDOWS (e.g. ``01:00-06:00``, container time zone) is
+open. Outside a window such an event is marked `deferred` and its
+next_attempt_at is moved to the next window opening, without counting an
+attempt against MAX_RETRY_ATTEMPTS. Small clips are never deferred.
+
+This complements SKIP_EVENTS_LONGER_THAN_SECONDS, which drops long events
+outright: with both set, events between the two thresholds are kept but moved
+to off-peak hours.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from src.env import int_from_env
+from src.rate_limiter import parse_rate
+
+load_dotenv()
+
+
+def parse_windows(value):
+    """
+    Parse 'HH:MM-HH:MM[,HH:MM-HH:MM...]' into a list of (start_minute,
+    end_minute) tuples. Windows may cross midnight ('22:00-06:00'). Invalid
+    entries are logged and ignored.
+    """
+    windows = []
+    if not value:
+        return windows
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.match(r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$', part)
+        if not match:
+            logging.warning(f"Ignoring invalid upload window '{part}'. Expected 'HH:MM-HH:MM'.")
+            continue
+        sh, sm, eh, em = (int(g) for g in match.groups())
+        if sh > 23 or eh > 24 or sm > 59 or em > 59 or (eh == 24 and em):
+            logging.warning(f"Ignoring invalid upload window '{part}'.")
+            continue
+        start, end = sh * 60 + sm, eh * 60 + em
+        if start == end:
+            logging.warning(f"Ignoring empty upload window '{part}'.")
+            continue
+        windows.append((start, end))
+    return windows
+
+
+class UploadWindowPolicy:
+    def __init__(self, windows, min_bytes: int = 0, min_seconds: int = 0):
+        self.windows = list(windows)
+        self.min_bytes = min_bytes
+        self.min_seconds = min_seconds
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.windows) and (self.min_bytes > 0 or self.min_seconds > 0)
+
+    def applies_to(self, duration_seconds: Optional[float], size_bytes: Optional[float]) -> bool:
+        """True if a clip of this duration / (known or estimated) size is deferrable."""
+        if not self.enabled:
+            return False
+        if self.min_seconds > 0 and duration_seconds is not None and duration_seconds > self.min_seconds:
+            return True
+        return self.min_bytes > 0 and size_bytes is not None and size_bytes > self.min_bytes
+
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end in self.windows:
+            if start < end:
+                if start <= minute < end:
+                    return True
+            elif minute >= start or minute < end:
+                return True
+        return False
+
+    def next_open(self, now: Optional[datetime] = None) -> datetime:
+        """Start of the next window (or `now` if a window is open)."""
+        now = now or datetime.now()
+        if self.is_open(now):
+            return now
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = [
+            midnight + timedelta(days=day, minutes=start)
+            for day in (0, 1)
+            for start, _ in self.windows
+        ]
+        return min(c for c in candidates if c > now)
+
+    def describe(self) -> str:
+        if not self.windows:
+            return "(none)"
+        return ','.join(
+            f"{s // 60:02d}:{s % 60:02d}-{e // 60:02d}:{e % 60:02d}" for s, e in self.windows
+        )
+
+
+def _build_policy() -> UploadWindowPolicy:
+    try:
+        min_bytes = parse_rate(os.getenv('DEFER_CLIPS_LARGER_THAN', '0'))
+    except ValueError:
+        logging.warning(
+            f"Invalid DEFER_CLIPS_LARGER_THAN value '{os.getenv('DEFER_CLIPS_LARGER_THAN')}', "
+            f"disabling the size threshold."
+        )
+        min_bytes = 0
+    min_seconds = int_from_env('DEFER_EVENTS_LONGER_THAN_SECONDS', 0)
+    windows = parse_windows(os.getenv('UPLOAD_WINDOWS', ''))
+    if bool(windows) != bool(min_bytes or min_seconds):
+        logging.warning(
+            "Upload windows need both UPLOAD_WINDOWS and DEFER_CLIPS_LARGER_THAN / "
+            "DEFER_EVENTS_LONGER_THAN_SECONDS. Deferral is disabled."
+        )
+    return UploadWindowPolicy(windows, min_bytes=min_bytes, min_seconds=min_seconds)
+
+
+policy = _build_policy()
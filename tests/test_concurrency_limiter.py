@@ -0,0 +1,94 @@
+"""
+AIMD concurrency limits: additive increase on healthy responses, multiplicative
+decrease on overload, both kept within [min_limit, max_limit].
+"""
+
+import threading
+
+import pytest
+
+from src import concurrency_limiter
+from src.concurrency_limiter import AIMDLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(concurrency_limiter, 'time', fake)
+    return fake
+
+
+def test_initial_limit_is_clamped():
+    assert AIMDLimiter('test', initial=10, max_limit=4).limit == 4
+    assert AIMDLimiter('test', initial=0, min_limit=0).limit == 1
+
+
+def test_additive_increase_up_to_max():
+    limiter = AIMDLimiter('test', initial=1, max_limit=3, ttfb_target=5)
+    limiter.on_success(1.0)
+    assert limiter.limit == 2
+    # Each success adds 1/limit, so it takes about `limit` successes per slot.
+    limiter.on_success(1.0)
+    limiter.on_success(1.0)
+    assert limiter.limit == 2
+    limiter.on_success(1.0)
+    assert limiter.limit == 3
+    for _ in range(50):
+        limiter.on_success(1.0)
+    assert limiter.limit == 3
+
+
+def test_overload_halves_down_to_min(clock):
+    limiter = AIMDLimiter('test', initial=4, min_limit=1, max_limit=4, cooldown=10)
+    limiter.on_overload('timeout')
+    assert limiter.limit == 2
+    clock.now += 11
+    limiter.on_overload('timeout')
+    assert limiter.limit == 1
+    clock.now += 11
+    limiter.on_overload('timeout')
+    assert limiter.limit == 1
+    assert limiter.snapshot()['decreases'] == 3
+
+
+def test_cooldown_counts_a_burst_once(clock):
+    limiter = AIMDLimiter('test', initial=4, max_limit=4, cooldown=10)
+    for _ in range(5):
+        limiter.on_overload('5xx')
+    assert limiter.limit == 2
+    assert limiter.snapshot()['decreases'] == 1
+
+
+def test_slow_first_byte_counts_as_overload(clock):
+    limiter = AIMDLimiter('test', initial=4, max_limit=4, ttfb_target=5)
+    limiter.on_success(6.0)
+    assert limiter.limit == 2
+    assert limiter.snapshot()['last_ttfb_seconds'] == 6.0
+
+
+def test_slot_blocks_at_limit():
+    limiter = AIMDLimiter('test', initial=1, max_limit=2, ttfb_target=5)
+    entered = threading.Event()
+
+    def second():
+        with limiter.slot():
+            entered.set()
+
+    with limiter.slot():
+        worker = threading.Thread(target=second)
+        worker.start()
+        assert not entered.wait(0.2)
+        assert limiter.snapshot()['waiting'] == 1
+        # Raising the limit lets the waiter in while the first slot is held.
+        limiter.on_success(1.0)
+        assert entered.wait(2)
+    worker.join(2)
+    assert limiter.snapshot()['in_flight'] == 0
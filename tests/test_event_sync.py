@@ -0,0 +1,175 @@
+"""
+Event listing cursor: watermark, overlap, in-progress holds and resuming an
+interrupted sync. The database calls are replaced by an in-memory cursor and
+Frigate by a list of events.
+"""
+
+import time
+
+import pytest
+
+from src import event_sync
+from src.event_sync import MAX_HOLD_SECONDS, EventSync
+
+
+class FakeStore:
+    def __init__(self, latest_start_time=0):
+        self.cursors = {}
+        self.saves = []
+        self.latest_start_time = latest_start_time
+        self.latest_reads = 0
+
+    def get_event_cursor(self, source):
+        return dict(self.cursors[source]) if source in self.cursors else None
+
+    def save_event_cursor(self, source, last_start_time, last_event_id, resume_before=None,
+                          resume_start_time=None, resume_event_id=None, resume_hold=None):
+        row = {
+            'last_start_time': last_start_time, 'last_event_id': last_event_id,
+            'resume_before': resume_before, 'resume_start_time': resume_start_time,
+            'resume_event_id': resume_event_id, 'resume_hold': resume_hold,
+        }
+        self.cursors[source] = row
+        self.saves.append(dict(row))
+
+    def get_latest_event_start_time(self):
+        self.latest_reads += 1
+        return self.latest_start_time
+
+
+class FakeFrigate:
+    """Lists events newest first, like /api/events with after/before/limit."""
+
+    def __init__(self, events, fail_on_call=None):
+        self.events = events
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    def fetch_page(self, after, before, limit):
+        self.calls.append((after, before))
+        if self.fail_on_call == len(self.calls):
+            return None
+        matching = [
+            e for e in self.events
+            if (after is None or e['start_time'] > after) and (before is None or e['start_time'] < before)
+        ]
+        matching.sort(key=lambda e: e['start_time'], reverse=True)
+        return matching[:limit]
+
+
+class Recorder:
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, page):
+        new = [e['id'] for e in page if e['id'] not in self.seen]
+        self.seen.extend(new)
+        return len(new)
+
+
+def _event(start, end=True):
+    return {'id': f'ev-{start}', 'start_time': start, 'end_time': start + 10 if end else None}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = FakeStore()
+    for name in ('get_event_cursor', 'save_event_cursor', 'get_latest_event_start_time'):
+        monkeypatch.setattr(event_sync.database, name, getattr(fake, name))
+    return fake
+
+
+def test_first_sync_seeds_from_latest_start_time(store):
+    store.latest_start_time = 5000.0
+    frigate = FakeFrigate([_event(4000.0), _event(4800.0), _event(5100.0)])
+
+    new = EventSync(overlap_seconds=300).run(frigate.fetch_page, Recorder())
+
+    assert frigate.calls[0] == (4700.0, None)
+    assert new == 2
+    assert store.cursors['frigate_events']['last_start_time'] == 5100.0
+    assert store.cursors['frigate_events']['last_event_id'] == 'ev-5100.0'
+
+
+def test_next_sync_starts_at_watermark_minus_overlap(store):
+    store.cursors['frigate_events'] = {'last_start_time': 5100.0, 'last_event_id': 'ev-5100.0'}
+    frigate = FakeFrigate([])
+
+    assert EventSync(overlap_seconds=60).run(frigate.fetch_page, Recorder()) == 0
+
+    assert frigate.calls == [(5040.0, None)]
+    assert store.latest_reads == 0
+    assert store.cursors['frigate_events']['last_start_time'] == 5100.0
+
+
+def test_running_event_holds_the_watermark(store):
+    now = time.time()
+    store.cursors['frigate_events'] = {'last_start_time': now - 1000}
+    frigate = FakeFrigate([_event(now - 500, end=False), _event(now - 100)])
+
+    EventSync(overlap_seconds=0).run(frigate.fetch_page, Recorder())
+
+    cursor = store.cursors['frigate_events']
+    assert cursor['last_start_time'] == now - 500
+    assert cursor['last_event_id'] is None
+
+
+def test_hold_is_capped(store):
+    now = time.time()
+    old = now - MAX_HOLD_SECONDS - 3600
+    store.cursors['frigate_events'] = {'last_start_time': old - 1}
+    frigate = FakeFrigate([_event(old, end=False), _event(now - 100)])
+
+    EventSync(overlap_seconds=0).run(frigate.fetch_page, Recorder())
+
+    assert store.cursors['frigate_events']['last_start_time'] == pytest.approx(now - MAX_HOLD_SECONDS, abs=5)
+
+
+def test_pages_with_equal_start_times_are_all_listed(store):
+    store.cursors['frigate_events'] = {'last_start_time': 1.0}
+    events = [_event(100.0), _event(200.0), _event(200.0), _event(300.0)]
+    events[2]['id'] = 'ev-200-b'
+    recorder = Recorder()
+
+    EventSync(overlap_seconds=0, page_size=2).run(FakeFrigate(events).fetch_page, recorder)
+
+    assert sorted(recorder.seen) == sorted(e['id'] for e in events)
+
+
+def test_interrupted_sync_resumes_at_checkpoint(store):
+    store.cursors['frigate_events'] = {'last_start_time': 50.0, 'last_event_id': 'ev-50.0'}
+    events = [_event(float(start)) for start in range(100, 160, 10)]
+    sync = EventSync(overlap_seconds=0, page_size=2)
+    recorder = Recorder()
+
+    assert sync.run(FakeFrigate(events, fail_on_call=2).fetch_page, recorder) is None
+
+    checkpoint = store.cursors['frigate_events']
+    # The committed watermark is untouched until the listing completes.
+    assert checkpoint['last_start_time'] == 50.0
+    assert checkpoint['resume_start_time'] == 150.0
+    assert checkpoint['resume_before'] == pytest.approx(140.0 + 0.001)
+
+    frigate = FakeFrigate(events)
+    sync.run(frigate.fetch_page, recorder)
+
+    assert frigate.calls[0] == (50.0, checkpoint['resume_before'])
+    assert sorted(recorder.seen) == sorted(e['id'] for e in events)
+    final = store.cursors['frigate_events']
+    assert (final['last_start_time'], final['last_event_id']) == (150.0, 'ev-150.0')
+    assert final['resume_before'] is None
+    assert sync.snapshot()['resumed'] == 1
+
+
+def test_resume_without_watermark_does_not_reseed(store):
+    store.latest_start_time = 9999.0
+    store.cursors['frigate_events'] = {
+        'last_start_time': None, 'resume_before': 200.0, 'resume_start_time': 300.0, 'resume_event_id': 'ev-300.0',
+    }
+    frigate = FakeFrigate([_event(100.0), _event(300.0)])
+
+    EventSync(overlap_seconds=0).run(frigate.fetch_page, Recorder())
+
+    assert store.latest_reads == 0
+    assert frigate.calls == [(None, 200.0)]
+    assert store.cursors['frigate_events']['last_start_time'] == 300.0
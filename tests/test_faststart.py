@@ -0,0 +1,97 @@
+"""
+The faststart rewriter on synthetic MP4 box layouts: chunk offsets are shifted
+by the size of the relocated moov, and layouts it cannot rewrite are left alone.
+"""
+
+import hashlib
+import struct
+
+from src.faststart import _relocate_moov, _shift_chunk_offsets
+
+
+def _box(box_type, body=b''):
+    return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+
+def _moov(offsets, table=b'stco'):
+    fmt = '>Q' if table == b'co64' else '>I'
+    entries = b''.join(struct.pack(fmt, offset) for offset in offsets)
+    chunk_table = _box(table, b'\0\0\0\0' + struct.pack('>I', len(offsets)) + entries)
+    return _box(b'moov', _box(b'trak', _box(b'mdia', _box(b'minf', _box(b'stbl', chunk_table)))))
+
+
+def _chunk_offsets(data):
+    """Entries of the first stco/co64 table in `data`."""
+    for table, fmt, width in ((b'stco', '>I', 4), (b'co64', '>Q', 8)):
+        pos = data.find(table)
+        if pos != -1:
+            count, = struct.unpack_from('>I', data, pos + 8)
+            return [struct.unpack_from(fmt, data, pos + 12 + width * i)[0] for i in range(count)]
+    raise AssertionError("no chunk offset table")
+
+
+def _clip(tmp_path, table=b'stco'):
+    ftyp = _box(b'ftyp', b'isom\0\0\0\0')
+    mdat = _box(b'mdat', b'first-chunk' + b'second-chunk')
+    offsets = [len(ftyp) + 8, len(ftyp) + 8 + len(b'first-chunk')]
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(ftyp + mdat + _moov(offsets, table))
+    return path
+
+
+def _assert_chunks_readable(original, remuxed):
+    for before, after in zip(_chunk_offsets(original), _chunk_offsets(remuxed)):
+        assert remuxed[after:after + 5] == original[before:before + 5]
+
+
+def test_moves_moov_and_shifts_stco(tmp_path):
+    path = _clip(tmp_path)
+    out = tmp_path / 'out.mp4'
+    original = path.read_bytes()
+
+    size, md5 = _relocate_moov(str(path), str(out))
+
+    remuxed = out.read_bytes()
+    assert size == len(original) == len(remuxed)
+    assert md5 == hashlib.md5(remuxed).hexdigest()
+    ftyp_size, = struct.unpack_from('>I', remuxed, 0)
+    assert [remuxed[4:8], remuxed[ftyp_size + 4:ftyp_size + 8]] == [b'ftyp', b'moov']
+    moov_size = struct.unpack_from('>I', original, original.find(b'moov') - 4)[0]
+    assert _chunk_offsets(remuxed) == [o + moov_size for o in _chunk_offsets(original)]
+    _assert_chunks_readable(original, remuxed)
+
+
+def test_shifts_co64(tmp_path):
+    path = _clip(tmp_path, table=b'co64')
+    out = tmp_path / 'out.mp4'
+
+    assert _relocate_moov(str(path), str(out)) is not None
+    _assert_chunks_readable(path.read_bytes(), out.read_bytes())
+
+
+def test_leaves_faststart_clip_alone(tmp_path):
+    ftyp = _box(b'ftyp', b'isom\0\0\0\0')
+    moov = _moov([0])
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(ftyp + moov + _box(b'mdat', b'data'))
+
+    assert _relocate_moov(str(path), str(tmp_path / 'out.mp4')) is None
+
+
+def test_rejects_media_data_after_moov(tmp_path):
+    ftyp = _box(b'ftyp', b'isom\0\0\0\0')
+    first = _box(b'mdat', b'A' * 16)
+    moov = _moov([len(ftyp) + 8, len(ftyp) + len(first) + 8 + 8])
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(ftyp + first + moov + _box(b'mdat', b'B' * 16))
+
+    assert _relocate_moov(str(path), str(tmp_path / 'out.mp4')) is None
+
+
+def test_stco_overflow_raises():
+    moov = bytearray(_moov([0xFFFFFFF0]))
+    try:
+        _shift_chunk_offsets(moov, 0, len(moov), 0x100)
+    except OverflowError:
+        return
+    raise AssertionError("expected OverflowError")
@@ -0,0 +1,90 @@
+"""
+Token-bucket rate limits, driven by a fake clock so no test actually sleeps.
+"""
+
+import pytest
+
+from src import rate_limiter
+from src.rate_limiter import RateLimits, TokenBucket, parse_rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+def test_parse_rate():
+    assert parse_rate('0') == 0
+    assert parse_rate('512KB') == 512 * 1024
+    assert parse_rate('1.5MB/s') == int(1.5 * 1024 ** 2)
+    assert parse_rate('2048') == 2048
+    with pytest.raises(ValueError):
+        parse_rate('fast')
+
+
+def test_zero_rate_never_waits(clock):
+    bucket = TokenBucket('test', 0)
+    assert bucket.consume(10 ** 9) == 0.0
+    assert clock.slept == []
+
+
+def test_consume_waits_for_missing_tokens(clock):
+    bucket = TokenBucket('test', 1000)
+    # The bucket starts empty, so the first read pays for itself.
+    assert bucket.consume(500) == pytest.approx(0.5)
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_sustained_rate_matches_limit(clock):
+    bucket = TokenBucket('test', 1000)
+    start = clock.now
+    for _ in range(20):
+        bucket.consume(250)
+    assert clock.now - start == pytest.approx(5.0)
+
+
+def test_idle_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket('test', 1000, burst=2000)
+    clock.now += 60
+    assert bucket.consume(2000) == 0.0
+    assert bucket.consume(1000) == pytest.approx(1.0)
+
+
+def test_concurrent_reservations_queue_up(clock):
+    bucket = TokenBucket('test', 1000)
+    # Reservations made before either sleeper wakes: the second waits behind the first.
+    clock.sleep = lambda seconds: clock.slept.append(seconds)
+    assert bucket.consume(1000) == pytest.approx(1.0)
+    assert bucket.consume(1000) == pytest.approx(2.0)
+
+
+def test_set_rate_forgives_debt(clock):
+    bucket = TokenBucket('test', 1000)
+    clock.sleep = lambda seconds: None
+    bucket.consume(10000)
+    bucket.set_rate(2000)
+    assert bucket.consume(1000) == pytest.approx(0.5)
+
+
+def test_update_validates_all_changes_first(clock):
+    limits = RateLimits({'a': TokenBucket('a', 100), 'b': TokenBucket('b', 200)})
+    with pytest.raises(ValueError):
+        limits.update({'a': '1MB', 'b': 'bogus'})
+    assert limits.buckets['a'].rate == 100
+    snapshot = limits.update({'a': '1KB'})
+    assert snapshot['a']['bytes_per_second'] == 1024
@@ -0,0 +1,51 @@
+"""
+Retry backoff bounds: each delay stays within the jittered [d/2, d] window of
+its error kind, doubles per try and never exceeds RETRY_BACKOFF_MAX_SECONDS.
+"""
+
+from src import retry_policy
+from src.google_drive import ERR_CLIP_CORRUPT, ERR_DRIVE_NETWORK
+
+SAMPLES = 200
+
+
+def _bounds(tries, kind):
+    delays = [retry_policy.compute_backoff_seconds(tries, kind) for _ in range(SAMPLES)]
+    return min(delays), max(delays)
+
+
+def test_first_retry_uses_kind_base():
+    low, high = _bounds(1, ERR_DRIVE_NETWORK)
+    assert 30 <= low <= high <= 60
+
+
+def test_delay_doubles_per_try():
+    low, high = _bounds(3, ERR_DRIVE_NETWORK)
+    assert 120 <= low <= high <= 240
+
+
+def test_unknown_kind_uses_default_base():
+    low, high = _bounds(1, 'something_new')
+    base = retry_policy.DEFAULT_BASE_DELAY
+    assert base / 2 <= low <= high <= base
+
+
+def test_missing_tries_counts_as_first_try():
+    assert _bounds(None, ERR_DRIVE_NETWORK)[1] <= 60
+    assert _bounds(0, ERR_DRIVE_NETWORK)[1] <= 60
+
+
+def test_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(retry_policy, 'RETRY_BACKOFF_MAX_SECONDS', 1000)
+    for tries in (2, 10, 1000):
+        low, high = _bounds(tries, ERR_CLIP_CORRUPT)
+        assert 500 <= low <= high <= 1000
+
+
+def test_clip_assembly_backs_off_slower_than_network():
+    assert retry_policy.BASE_DELAY_BY_KIND[ERR_CLIP_CORRUPT] > retry_policy.BASE_DELAY_BY_KIND[ERR_DRIVE_NETWORK]
+
+
+def test_next_attempt_is_relative_to_now():
+    at = retry_policy.compute_next_attempt_at(1, ERR_DRIVE_NETWORK, now=1000.0)
+    assert 1030.0 <= at <= 1060.0
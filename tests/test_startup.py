@@ -0,0 +1,82 @@
+"""
+Startup-time benchmark: importing main and starting the Drive initialisation
+must stay fast and must not build a Drive client or load credentials. The
+Google libraries are expected to be installed (requirements.txt); the client
+build itself is stubbed out, so no credentials or network are needed.
+
+Each measurement runs in a fresh interpreter, so the imports are cold.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous bounds: they catch a client build or a network round trip on the
+# startup path, not small regressions.
+IMPORT_BUDGET_SECONDS = 5.0
+DRIVE_INIT_BUDGET_SECONDS = 0.5
+
+_SCRIPT = """
+import json, sys, threading, time
+
+started = time.perf_counter()
+import main
+from src import google_drive
+from src.drive_credentials import credential_manager
+import_seconds = time.perf_counter() - started
+clients_after_import = sum(len(a.clients) for a in google_drive.drive_accounts.accounts)
+discovery_loaded = 'googleapiclient.discovery' in sys.modules
+
+# Stub the client build: it blocks like a slow Google until released.
+release = threading.Event()
+builds = []
+def build(service_account_file, subject):
+    builds.append(service_account_file)
+    release.wait(10)
+    return object()
+google_drive.drive_accounts._build = build
+
+started = time.perf_counter()
+google_drive.start_drive_init()
+init_seconds = time.perf_counter() - started
+clients_after_init = sum(len(a.clients) for a in google_drive.drive_accounts.accounts)
+credential_manager.stop()
+release.set()
+
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "init_seconds": init_seconds,
+    "clients_after_import": clients_after_import,
+    "clients_after_init": clients_after_init,
+    "credentials_loaded": len(credential_manager._entries),
+    "discovery_loaded": discovery_loaded,
+}))
+"""
+
+
+def _measure(tmp_path):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, SERVICE_ACCOUNT_FILE=str(tmp_path / 'missing.json'))
+    env.pop('DRIVE_ACCOUNTS', None)
+    completed = subprocess.run(
+        [sys.executable, '-c', _SCRIPT], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_builds_no_drive_client(tmp_path):
+    result = _measure(tmp_path)
+    assert result["clients_after_import"] == 0
+    assert result["credentials_loaded"] == 0
+    assert not result["discovery_loaded"]
+    assert result["import_seconds"] < IMPORT_BUDGET_SECONDS, result
+
+
+def test_drive_init_does_not_block_startup(tmp_path):
+    result = _measure(tmp_path)
+    # The stubbed build is still blocked: start_drive_init() returned without waiting for it.
+    assert result["clients_after_init"] == 0
+    assert result["init_seconds"] < DRIVE_INIT_BUDGET_SECONDS, result
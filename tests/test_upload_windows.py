@@ -0,0 +1,65 @@
+"""
+Upload window parsing and open/next-open times, including windows that cross
+midnight.
+"""
+
+from datetime import datetime
+
+from src.upload_windows import UploadWindowPolicy, parse_windows
+
+
+def _policy(value):
+    return UploadWindowPolicy(parse_windows(value), min_bytes=1)
+
+
+def test_parse_windows_skips_invalid_entries():
+    assert parse_windows('01:00-06:00, 22:30-02:00,bogus,25:00-01:00,03:00-03:00,00:00-24:00') == [
+        (60, 360), (1350, 120), (0, 1440),
+    ]
+
+
+def test_same_day_window():
+    policy = _policy('01:00-06:00')
+    assert policy.is_open(datetime(2024, 5, 1, 1, 0))
+    assert policy.is_open(datetime(2024, 5, 1, 5, 59))
+    assert not policy.is_open(datetime(2024, 5, 1, 6, 0))
+    assert not policy.is_open(datetime(2024, 5, 1, 0, 59))
+
+
+def test_window_across_midnight_is_open_on_both_sides():
+    policy = _policy('22:00-06:00')
+    assert policy.is_open(datetime(2024, 5, 1, 23, 30))
+    assert policy.is_open(datetime(2024, 5, 2, 0, 0))
+    assert policy.is_open(datetime(2024, 5, 2, 5, 59))
+    assert not policy.is_open(datetime(2024, 5, 2, 6, 0))
+    assert not policy.is_open(datetime(2024, 5, 2, 21, 59))
+
+
+def test_next_open_is_now_inside_a_window():
+    now = datetime(2024, 5, 2, 3, 15)
+    assert _policy('22:00-06:00').next_open(now) == now
+
+
+def test_next_open_later_today():
+    policy = _policy('22:00-06:00')
+    assert policy.next_open(datetime(2024, 5, 2, 12, 0)) == datetime(2024, 5, 2, 22, 0)
+
+
+def test_next_open_rolls_over_to_tomorrow():
+    policy = _policy('01:00-06:00')
+    assert policy.next_open(datetime(2024, 5, 31, 23, 0)) == datetime(2024, 6, 1, 1, 0)
+
+
+def test_next_open_picks_earliest_of_several_windows():
+    policy = _policy('13:00-14:00,02:00-04:00')
+    assert policy.next_open(datetime(2024, 5, 2, 5, 0)) == datetime(2024, 5, 2, 13, 0)
+    assert policy.next_open(datetime(2024, 5, 2, 15, 0)) == datetime(2024, 5, 3, 2, 0)
+
+
+def test_policy_needs_windows_and_a_threshold():
+    assert not UploadWindowPolicy(parse_windows('01:00-06:00')).enabled
+    assert not UploadWindowPolicy([], min_seconds=60).enabled
+    policy = UploadWindowPolicy(parse_windows('01:00-06:00'), min_bytes=100, min_seconds=60)
+    assert policy.applies_to(61, None)
+    assert policy.applies_to(None, 101)
+    assert not policy.applies_to(60, 100)